@@ -0,0 +1 @@
+"""Package with the benchmarks of the pipeline."""
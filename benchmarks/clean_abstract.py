@@ -0,0 +1,86 @@
+"""Benchmark of CleanAbstract against the implementation it replaced.
+
+Usage:
+    python -m benchmarks.clean_abstract dataset --limit 2000
+"""
+
+import argparse
+import re
+import time
+
+from nltk.corpus import stopwords
+from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import word_tokenize
+
+from pipeline.dataloader import AbstractNarrationDataset, CleanAbstract
+
+
+def legacy_clean_abstract(abstract: str, lemmatize: bool) -> str:
+    """
+    The CleanAbstract.clean_abstract before the batch path, kept as the reference of
+    the output and of the speed
+
+    Arguments:
+        abstract:
+            The abstract to clean.
+        lemmatize:
+            If True, the words will be lemmatized.
+
+    Returns:
+        A string with the abstract cleaned.
+    """
+    abstract = abstract.lower()
+    abstract = abstract.replace("&lt;br/&gt;", "")
+    abstract = re.sub(r"http\S+", "", abstract)
+    abstract = re.sub(r"www\S+", "", abstract)
+    abstract = re.sub(r"[^\w\s-]", "", abstract)
+    abstract = re.sub(r"-+", "-", abstract)
+
+    words = word_tokenize(abstract)
+    words = [CleanAbstract.clean_hyphen_words(word) for word in words]
+    abstract = " ".join(words)
+
+    words = word_tokenize(abstract)
+    words = [word for word in words if word.isalnum()]
+    stop_words = set(stopwords.words("english"))
+    stop_words.update(["project", "research", "using", "support", "impact", "student"])
+    if lemmatize:
+        lemmatizer = WordNetLemmatizer()
+        cleaned_abstract = [
+            lemmatizer.lemmatize(word)
+            for word in words
+            if word.isalnum() and lemmatizer.lemmatize(word) not in stop_words
+        ]
+    else:
+        cleaned_abstract = [word for word in words if word not in stop_words]
+    return " ".join(cleaned_abstract)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("dataset", help="folder or zip archive with the XML files")
+    parser.add_argument("--limit", type=int, default=2000)
+    args = parser.parse_args()
+
+    dataset = AbstractNarrationDataset(args.dataset, None)
+    abstracts = [dataset[idx] for idx in range(min(args.limit, len(dataset)))]
+    for lemmatize in (False, True):
+        clean = CleanAbstract(lemmatize=lemmatize)
+        start = time.perf_counter()
+        expected = [legacy_clean_abstract(abstract, lemmatize) for abstract in abstracts]
+        legacy_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        cleaned = clean.clean_batch(abstracts)
+        batch_seconds = time.perf_counter() - start
+        if cleaned != expected:
+            raise AssertionError("clean_batch output differs from the legacy output")
+        print(
+            f"lemmatize={lemmatize}: "
+            f"legacy {len(abstracts) / legacy_seconds:.1f} docs/s, "
+            f"clean_batch {len(abstracts) / batch_seconds:.1f} docs/s "
+            f"({legacy_seconds / batch_seconds:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
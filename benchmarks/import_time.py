@@ -0,0 +1,73 @@
+"""Benchmark of the time it takes to import a module of the pipeline in a new process.
+
+Usage:
+    python -m benchmarks.import_time pipeline.dataloader --repeat 10 --budget-ms 50
+"""
+
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+
+def import_time_ms(module: str) -> float:
+    """
+    Import a module in a new interpreter and get the cumulative time of the import
+    reported by python -X importtime
+
+    Arguments:
+        module:
+            The name of the module to import.
+
+    Returns:
+        The time of the import in milliseconds.
+    """
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    pattern = re.compile(rf"^import time:\s+\d+ \|\s+(\d+) \| {re.escape(module)}$")
+    for line in process.stderr.splitlines():
+        match = pattern.match(line)
+        if match:
+            return int(match.group(1)) / 1000
+    raise ValueError(f"The import time of {module} was not reported")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("module", nargs="?", default="pipeline.dataloader")
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    # the first import writes the bytecode cache, it is not measured
+    import_time_ms(args.module)
+    times = [import_time_ms(args.module) for _ in range(args.repeat)]
+    median = statistics.median(times)
+    print(f"{args.module}: median {median:.1f} ms, min {min(times):.1f} ms")
+
+    # the modules that make the import slow must not be loaded by the import
+    process = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import sys, {args.module}; "
+            "print(' '.join(m for m in ('nltk', 'numpy', 'pandas', 'sqlite3') "
+            "if m in sys.modules))",
+        ],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    if process.stdout.strip():
+        print(f"heavy modules imported: {process.stdout.strip()}")
+    if args.budget_ms is not None and median > args.budget_ms:
+        sys.exit(f"the import takes more than the budget of {args.budget_ms} ms")
+
+
+if __name__ == "__main__":
+    main()
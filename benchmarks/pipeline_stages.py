@@ -0,0 +1,233 @@
+"""Benchmark of every stage of the pipeline on synthetic corpora of several sizes.
+
+Usage:
+    python -m benchmarks.pipeline_stages --sizes 1000 10000 100000 --output bench.json
+    python -m benchmarks.pipeline_stages --sizes 1000 --stages parse clean_plain
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+STAGES = (
+    "discovery",
+    "parse",
+    "clean_plain",
+    "clean_lemmatized",
+    "vectorize",
+    "lda_fit",
+    "lda_transform",
+    "top_words",
+    "kmeans_fit",
+    "kmeans_transform",
+)
+
+
+def synthetic_corpus(workdir: str, n_awards: int, seed: int = 0) -> str:
+    """
+    Get the folder of a synthetic corpus, it is generated only the first time
+
+    Arguments:
+        workdir:
+            The folder where the corpora are kept.
+        n_awards:
+            The amount of award files.
+        seed:
+            The seed of the generator.
+
+    Returns:
+        The path to the folder with the XML files.
+    """
+    from pipeline.synthetic import SyntheticAwardGenerator
+
+    path = os.path.join(workdir, f"synthetic-{n_awards}-seed{seed}")
+    # the marker is written at the end, so an interrupted generation is repeated
+    marker = os.path.join(path, ".complete")
+    if not os.path.exists(marker):
+        SyntheticAwardGenerator(seed=seed).write(path, n_awards)
+        open(marker, "w").close()
+    return path
+
+
+def run_stages(path: str, stages: list, num_workers: int = 1, n_topics: int = 9):
+    """
+    Run the stages of the pipeline in order on a corpus and time every one of them.
+    Every stage uses the output of the previous ones, so the stages before the last
+    selected one are also run, except the ones of the models that are not selected.
+
+    Arguments:
+        path:
+            The folder with the XML files.
+        stages:
+            The names of the stages to report, some of STAGES.
+        num_workers:
+            The processes used to read the files.
+        n_topics:
+            The amount of topics of the LDA model.
+
+    Returns:
+        A generator of tuples (stage, seconds, documents).
+    """
+    from sklearn.decomposition import LatentDirichletAllocation
+    from sklearn.feature_extraction.text import CountVectorizer
+
+    from pipeline.dataloader import AbstractNarrationDataset, CleanAbstract
+    from pipeline.engines import KMeansEngine
+    from pipeline.sources import open_source
+    from pipeline.topics import top_words, vocabulary_array
+
+    last_stage = max(STAGES.index(stage) for stage in stages)
+    start = time.perf_counter()
+    files = open_source(path).list_files()
+    yield "discovery", time.perf_counter() - start, len(files)
+
+    if last_stage < STAGES.index("parse"):
+        return
+    start = time.perf_counter()
+    dataset = AbstractNarrationDataset(path, None, num_workers=num_workers)
+    abstracts = list(dataset)
+    yield "parse", time.perf_counter() - start, len(abstracts)
+
+    if last_stage < STAGES.index("clean_plain"):
+        return
+    start = time.perf_counter()
+    cleaned = CleanAbstract().clean_batch(abstracts)
+    yield "clean_plain", time.perf_counter() - start, len(abstracts)
+
+    if "clean_lemmatized" in stages:
+        start = time.perf_counter()
+        CleanAbstract(lemmatize=True).clean_batch(abstracts)
+        yield "clean_lemmatized", time.perf_counter() - start, len(abstracts)
+
+    if last_stage < STAGES.index("vectorize"):
+        return
+    start = time.perf_counter()
+    vectorizer = CountVectorizer(max_features=800)
+    document_term_matrix = vectorizer.fit_transform(cleaned)
+    yield "vectorize", time.perf_counter() - start, len(cleaned)
+
+    if {"lda_fit", "lda_transform", "top_words"} & set(stages):
+        start = time.perf_counter()
+        model = LatentDirichletAllocation(
+            n_components=n_topics, learning_method="online", random_state=0
+        )
+        model.fit(document_term_matrix)
+        yield "lda_fit", time.perf_counter() - start, len(cleaned)
+
+        start = time.perf_counter()
+        doc_topic_matrix = model.transform(document_term_matrix)
+        yield "lda_transform", time.perf_counter() - start, len(cleaned)
+
+        start = time.perf_counter()
+        keys = doc_topic_matrix.argmax(axis=1)
+        vocabulary = vocabulary_array(vectorizer)
+        top_words(keys, document_term_matrix, vocabulary, 10, n_topics)
+        yield "top_words", time.perf_counter() - start, len(cleaned)
+
+    if {"kmeans_fit", "kmeans_transform"} & set(stages):
+        start = time.perf_counter()
+        engine = KMeansEngine(n_topics).fit(document_term_matrix)
+        yield "kmeans_fit", time.perf_counter() - start, len(cleaned)
+
+        start = time.perf_counter()
+        engine.transform(document_term_matrix)
+        yield "kmeans_transform", time.perf_counter() - start, len(cleaned)
+
+
+def environment() -> dict:
+    """
+    Get the description of the machine and of the versions, to compare the runs
+
+    Returns:
+        A dictionary with the versions and the hardware.
+    """
+    import numpy
+    import scipy
+    import sklearn
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "numpy": numpy.__version__,
+        "scipy": scipy.__version__,
+        "scikit-learn": sklearn.__version__,
+        "commit": commit,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--workdir",
+        default=os.path.join(tempfile.gettempdir(), "nfs-benchmarks"),
+        help="folder where the synthetic corpora are generated and kept",
+    )
+    parser.add_argument("--output", default="-", help="JSON file, - is stdout")
+    args = parser.parse_args()
+
+    results = []
+    for size in args.sizes:
+        path = synthetic_corpus(args.workdir, size, args.seed)
+        timings = {}
+        for _ in range(args.repeat):
+            for stage, seconds, documents in run_stages(
+                path, args.stages, args.num_workers
+            ):
+                timings.setdefault(stage, []).append((seconds, documents))
+        for stage in args.stages:
+            seconds = [timing for timing, _ in timings[stage]]
+            documents = timings[stage][0][1]
+            # the fastest stages can take less than the resolution of the clock
+            median = max(statistics.median(seconds), 1e-9)
+            results.append(
+                {
+                    "size": size,
+                    "stage": stage,
+                    "documents": documents,
+                    "seconds": seconds,
+                    "median_seconds": round(median, 6),
+                    "documents_per_second": round(documents / median, 1),
+                }
+            )
+            print(
+                f"{size} awards, {stage}: {median:.3f} s "
+                f"({documents / median:.0f} docs/s)",
+                file=sys.stderr,
+            )
+
+    report = {
+        "environment": environment(),
+        "config": {
+            "repeat": args.repeat,
+            "num_workers": args.num_workers,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+"""Benchmark of the recall and latency of the exact and LSH similarity search.
+
+Usage:
+    python -m benchmarks.similarity_search --sizes 10000 100000 1000000
+    python -m benchmarks.similarity_search --index models/lda --output similarity.json
+"""
+
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.pipeline_stages import environment
+
+# configurations of the LSH: tables, bits and probes
+LSH_CONFIGS = ((16, 14, 0), (16, 14, 1), (8, 16, 1), (32, 16, 0))
+
+
+def doc_topic_vectors(size: int, n_topics: int = 20, seed: int = 0) -> np.ndarray:
+    """
+    Draw vectors like the topic distributions of the abstracts: sparse, from a
+    Dirichlet distribution
+
+    Arguments:
+        size:
+            The amount of vectors.
+        n_topics:
+            The dimensions of the vectors.
+        seed:
+            The seed of the generator.
+
+    Returns:
+        An array with shape (size, n_topics).
+    """
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.full(n_topics, 0.1), size).astype(np.float32)
+
+
+def recall(found: np.ndarray, truth: np.ndarray) -> float:
+    """
+    Get the fraction of the true neighbours found
+
+    Arguments:
+        found:
+            The indices given by the approximate search, with shape (queries, k).
+        truth:
+            The indices given by the exact search, with the same shape.
+
+    Returns:
+        The average recall@k of the queries.
+    """
+    hits = [len(np.intersect1d(row, true_row)) for row, true_row in zip(found, truth)]
+    return float(np.sum(hits) / truth.size)
+
+
+def measure(index, queries: np.ndarray, k: int, probes: int = 0) -> tuple:
+    """
+    Search the neighbours of the queries one by one, as the CLI does
+
+    Arguments:
+        index:
+            The SimilarityIndex.
+        queries:
+            The query vectors.
+        k:
+            The amount of neighbours of every query.
+        probes:
+            The probes of the LSH search.
+
+    Returns:
+        A tuple (indices, milliseconds per query).
+    """
+    start = time.perf_counter()
+    found = [index.query(query, k, probes)[0][0] for query in queries]
+    milliseconds = (time.perf_counter() - start) * 1000 / len(queries)
+    return np.array(found), milliseconds
+
+
+def main():
+    from pipeline.similarity import SimilarityIndex
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument(
+        "--index", help="folder of a model with an index, used instead of --sizes"
+    )
+    parser.add_argument("--topics", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="-", help="JSON file, - is stdout")
+    args = parser.parse_args()
+
+    if args.index:
+        corpora = [SimilarityIndex.load(args.index).vectors]
+    else:
+        corpora = [
+            doc_topic_vectors(size, args.topics, args.seed) for size in args.sizes
+        ]
+    results = []
+    for vectors in corpora:
+        rng = np.random.default_rng(args.seed)
+        queries = vectors[rng.choice(len(vectors), args.queries)]
+        truth = None
+        # the exact search goes first, its results are the true neighbours
+        for n_tables, n_bits, probes in ((None, None, None),) + LSH_CONFIGS:
+            start = time.perf_counter()
+            if n_tables is None:
+                method, index = "exact", SimilarityIndex(vectors, method="exact")
+            else:
+                method, index = "lsh", SimilarityIndex(
+                    vectors, method="lsh", n_tables=n_tables, n_bits=n_bits
+                )
+            build_seconds = time.perf_counter() - start
+            found, milliseconds = measure(index, queries, args.k, probes or 0)
+            truth = found if truth is None else truth
+            found_recall = recall(found, truth)
+            results.append(
+                {
+                    "size": len(vectors),
+                    "method": method,
+                    "n_tables": n_tables,
+                    "n_bits": n_bits,
+                    "probes": probes,
+                    "build_seconds": round(build_seconds, 6),
+                    "milliseconds_per_query": round(milliseconds, 4),
+                    f"recall_at_{args.k}": round(found_recall, 4),
+                }
+            )
+            config = f" {n_tables}x{n_bits}, {probes} probes" if n_tables else ""
+            print(
+                f"{len(vectors)} vectors, {method}{config}: {milliseconds:.2f} "
+                f"ms/query, recall@{args.k} {found_recall:.3f}",
+                file=sys.stderr,
+            )
+
+    report = {
+        "environment": environment(),
+        "config": {"queries": args.queries, "k": args.k, "seed": args.seed},
+        "results": results,
+    }
+    if args.output == "-":
+        json.dump(report, sys.stdout, indent=2)
+    else:
+        with open(args.output, "w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
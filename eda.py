@@ -25,20 +25,29 @@
 
 # %%
 # include libraries to work with XML
-import matplotlib.pyplot as plt
-import xmltodict
-import os
-import re
 import json
+import os
 import random
-import pandas as pd
+import re
+import textwrap
 from collections import Counter
+
+import matplotlib.pyplot as plt
 import numpy as np
-from pipeline.dataloader import AbstractNarrationDataset, CleanAbstract
-from sklearn.feature_extraction.text import CountVectorizer
+import xmltodict
 from sklearn.decomposition import LatentDirichletAllocation
-from sklearn.manifold import TSNE
-import textwrap
+from sklearn.feature_extraction.text import CountVectorizer
+
+from pipeline.aggregate import AwardMetadataAggregator
+from pipeline.coherence import WordCooccurrence, model_coherence
+from pipeline.dataloader import AbstractNarrationDataset, CleanAbstract
+from pipeline.topics import (
+    top_words,
+    top_words_from_components,
+    topic_exemplars,
+    vocabulary_array,
+)
+from pipeline.variants import collect_variant_statistics
 
 # %% [markdown]
 # ## Dataset
@@ -47,6 +56,8 @@ import textwrap
 # %%
 # look for the dataset folder that is in the previous folder to this file
 dataset_folder = os.path.abspath(os.path.join(os.getcwd(), "dataset"))
+# columnar cache of the award records, the XML files are parsed only in the first run
+cache_path = os.path.abspath(os.path.join(os.getcwd(), "dataset_cache.npz"))
 
 
 # %%
@@ -225,26 +236,13 @@ def get_award_info_from_dict(xml_dict: dict) -> dict:
 
 
 # %% [markdown]
-# To explore the information contained in each file, we are going to count the amount of keys that are available. We are putting special attention in the `AbstractNarration` one.
+# To explore the information contained in each file, we are going to count the amount of keys that are available. We are putting special attention in the `AbstractNarration` one. All the counts of this section are computed by an `AwardMetadataAggregator` of the module `pipeline.aggregate`, which reads every file only once (in several processes with `num_workers`), takes the first element when `ProgramElement` or `Organization` are lists, and returns a DataFrame for every count. Other counts can be added with its method `register`.
 
 # %%
-# count the amount of dictionaries that have each key
-keys_count = {}
-
-# iterate over all the files in the dataset folder
-for file_name in os.listdir(dataset_folder):
-    # get the file path
-    file_path = os.path.join(dataset_folder, file_name)
-    # read the XML file
-    file_dict = get_xml_as_dict(file_path)
-    award_info = get_award_info_from_dict(file_dict)
-    # if the award_info is not empty
-    if award_info != {}:
-        for key in award_info.keys():
-            if key not in keys_count:
-                keys_count[key] = 0
-            # increase the count of the key
-            keys_count[key] += 1
+# count the keys, the programs and the directorates in a single pass over the files
+aggregator = AwardMetadataAggregator()
+aggregates = aggregator.aggregate(dataset_folder)
+keys_count = dict(zip(aggregates["keys"]["value"], aggregates["keys"]["count"]))
 
 # %%
 print(
@@ -256,91 +254,16 @@ print(f'Organization: {keys_count.get("Organization", 0)}')
 print(f'Program Element: {keys_count.get("ProgramElement", 0)}')
 
 # %%
-# count the amount of dictionaries that have each key
-programs_type_count = {}
-
-# iterate over all the files in the dataset folder
-for file_name in os.listdir(dataset_folder):
-    # get the file path
-    file_path = os.path.join(dataset_folder, file_name)
-    # read the XML file
-    file_dict = get_xml_as_dict(file_path)
-    award_info = get_award_info_from_dict(file_dict)
-    # if the award_info is not empty
-    if award_info != {}:
-        try:
-            program_element = type(award_info["ProgramElement"])
-            if program_element not in programs_type_count:
-                programs_type_count[program_element] = 0
-            # increase the count of the programs
-            programs_type_count[program_element] += 1
-        except:
-            print("ProgramElement not found")
-
-# %%
-programs_type_count
+aggregates["program_element_type"]
 
 # %% [markdown]
 # When the type of the programs count is a list of dictionaries we are going to extract the first one, and let's count the different programs that the dataset have.
 
 # %%
-# count the amount of dictionaries that have each key
-programs_count = {}
-
-# iterate over all the files in the dataset folder
-for file_name in os.listdir(dataset_folder):
-    # get the file path
-    file_path = os.path.join(dataset_folder, file_name)
-    # read the XML file
-    file_dict = get_xml_as_dict(file_path)
-    award_info = get_award_info_from_dict(file_dict)
-    # if the award_info is not empty
-    if award_info != {}:
-        try:
-            program_element_dict = award_info["ProgramElement"]
-            # review if the program_element_dict is a list
-            if isinstance(program_element_dict, list):
-                program_element_dict = program_element_dict[0]
-            program_element = program_element_dict["Text"]
-            if program_element not in programs_count:
-                programs_count[program_element] = 0
-            # increase the count of the programs
-            programs_count[program_element] += 1
-        except:
-            print("ProgramElement not found")
-
-# %%
-programs_count
-
-
-# %%
-# count the amount of dictionaries that have each key
-organization_count = {}
-
-# iterate over all the files in the dataset folder
-for file_name in os.listdir(dataset_folder):
-    # get the file path
-    file_path = os.path.join(dataset_folder, file_name)
-    # read the XML file
-    file_dict = get_xml_as_dict(file_path)
-    award_info = get_award_info_from_dict(file_dict)
-    # if the award_info is not empty
-    if award_info != {}:
-        try:
-            organization_dict = award_info["Organization"]
-            # review if the organization_dict is a list
-            if isinstance(organization_dict, list):
-                organization_dict = organization_dict[0]
-            organization_directorate = organization_dict["Directorate"]["LongName"]
-            if organization_directorate not in organization_count:
-                organization_count[organization_directorate] = 0
-            # increase the count of the programs
-            organization_count[organization_directorate] += 1
-        except:
-            print("ProgramElement not found")
-
-# %%
-organization_count
+aggregates["program"]
+
+# %%
+aggregates["directorate"]
 
 # %% [markdown]
 # ## DataLoader
@@ -351,7 +274,9 @@ organization_count
 
 # %%
 # initialize the dataset
-abstract_narration_dataset = AbstractNarrationDataset(dataset_folder, None)
+abstract_narration_dataset = AbstractNarrationDataset(
+    dataset_folder, None, cache_path=cache_path
+)
 
 # %%
 # Select a random list of abstracts
@@ -375,8 +300,8 @@ for idx in random_indexes:
 # %%
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
 from nltk.stem import WordNetLemmatizer
+from nltk.tokenize import word_tokenize
 
 # Initialize NLTK resources
 nltk.download("punkt")
@@ -427,11 +352,11 @@ def clean_abstract(abstract: str, lemmatize: bool = False) -> str:
 # %%
 # initialize the dataset including the cleaning process
 abstract_narration_clean_dataset = AbstractNarrationDataset(
-    dataset_folder, clean=CleanAbstract()
+    dataset_folder, clean=CleanAbstract(), cache_path=cache_path
 )
 # initialize the dataset including the lemmatize process
 abstract_narration_lemmatize_dataset = AbstractNarrationDataset(
-    dataset_folder, clean=CleanAbstract(lemmatize=True)
+    dataset_folder, clean=CleanAbstract(lemmatize=True), cache_path=cache_path
 )
 
 # %%
@@ -451,14 +376,14 @@ for idx in random_indexes:
 # Now that we have the classes to load the information an also to do a clean process we are going to do an exploratory analysis in terms of the amount of words that appears in the abstracts, such as the length of each one.
 
 # %%
+# clean every abstract in the three variants (raw, clean and lemmatized) in a single
+# pass, collecting the length and the word frequencies of each variant
+variant_statistics = collect_variant_statistics(abstract_narration_dataset)
+
 # calculate the length of the abstracts
-abstracts_length = [len(abstract.split()) for abstract in abstract_narration_dataset]
-abstracts_clean_length = [
-    len(abstract.split()) for abstract in abstract_narration_clean_dataset
-]
-abstracts_lemmatize_length = [
-    len(abstract.split()) for abstract in abstract_narration_lemmatize_dataset
-]
+abstracts_length = variant_statistics.length_array("raw")
+abstracts_clean_length = variant_statistics.length_array("clean")
+abstracts_lemmatize_length = variant_statistics.length_array("lemmatized")
 
 # %%
 # create a figure with 3 subplots, in each subplot include the histogram of the length of the abstracts
@@ -485,33 +410,9 @@ plt.show()
 # Once we clean the data the distribution of cleaned and lemmatized seems similar. This is due to in the cleaning process we are extracting stop words and punctuation that can extend the length of the abstracts. Now we are going to count the distinct words generated after each cleaning process to see if there is some word that repeat a lot and can be also reduced using a technique of cleaning.
 
 # %%
-# create a dictionary with the frequency of the words in all the abstracts
-words_clean_frequency = {}
-# iterate over all the abstracts
-for abstract in abstract_narration_clean_dataset:
-    # split the abstract into words
-    words = abstract.split()
-    # iterate over all the words
-    for word in words:
-        # if the word is not in the dictionary, add it
-        if word not in words_clean_frequency:
-            words_clean_frequency[word] = 0
-        # increase the frequency of the word
-        words_clean_frequency[word] += 1
-
-# %%
-# create a dataframe with the words and the frequency
-words_clean_frequency_df = pd.DataFrame(
-    {
-        "word": list(words_clean_frequency.keys()),
-        "frequency": list(words_clean_frequency.values()),
-    }
-)
-
-# sort the dataframe by the frequency
-words_clean_frequency_df = words_clean_frequency_df.sort_values(
-    "frequency", ascending=False
-)
+# create a dataframe with the words and the frequency in all the abstracts, it is
+# already sorted by the frequency
+words_clean_frequency_df = variant_statistics.frequency_frame("clean")
 
 # show the first 30 rows of the dataframe
 words_clean_frequency_df.head(30)
@@ -520,33 +421,9 @@ words_clean_frequency_df.head(30)
 # As you can note (and it was detected in the model training) there are words that for this context we can consider as stop words, that words are `["project", "research", "using", "support", "impact", "student"]`. After include that in the clean class the words related to each context improve in difference between topic and topic.
 
 # %%
-# create a dictionary with the frequency of the words in all the abstracts
-words_lemmatize_frequency = {}
-# iterate over all the abstracts
-for abstract in abstract_narration_lemmatize_dataset:
-    # split the abstract into words
-    words = abstract.split()
-    # iterate over all the words
-    for word in words:
-        # if the word is not in the dictionary, add it
-        if word not in words_lemmatize_frequency:
-            words_lemmatize_frequency[word] = 0
-        # increase the frequency of the word
-        words_lemmatize_frequency[word] += 1
-
-# %%
-# create a dataframe with the words and the frequency
-words_lemmatize_frequency_df = pd.DataFrame(
-    {
-        "word": list(words_lemmatize_frequency.keys()),
-        "frequency": list(words_lemmatize_frequency.values()),
-    }
-)
-
-# sort the dataframe by the frequency
-words_lemmatize_frequency_df = words_lemmatize_frequency_df.sort_values(
-    "frequency", ascending=False
-).reset_index(drop=True)
+# create a dataframe with the words and the frequency in all the abstracts, it is
+# already sorted by the frequency
+words_lemmatize_frequency_df = variant_statistics.frequency_frame("lemmatized")
 
 # show the first 30 rows of the dataframe
 words_lemmatize_frequency_df.head(30)
@@ -580,6 +457,13 @@ lda_model = LatentDirichletAllocation(
 )
 lda_topic_matrix = lda_model.fit_transform(abstract_term_matrix)
 
+# %% [markdown]
+# The coherence of the topics measures how often their top words appear together in the abstracts, it is a quantitative signal to compare models with different amounts of topics.
+
+# %%
+cooccurrence = WordCooccurrence(abstract_term_matrix)
+model_coherence(lda_model.components_, cooccurrence, n=10)
+
 
 # %% [markdown]
 # Define a bunch of useful functions in order to review the results and extract the most common words in each topic.
@@ -620,66 +504,39 @@ def keys_to_counts(keys: list) -> tuple:
     return (categories, counts)
 
 
-def get_top_n_words(
-    n: int,
-    keys: list,
-    document_term_matrix: np.array,
-    count_vectorizer: CountVectorizer,
-) -> list:
-    """
-    Get the top n words for each topic
-
-    Arguments:
-        n:
-            The number of words to get.
-        keys:
-            The keys of the topics for each abstract.
-        document_term_matrix:
-            The matrix with the words for each abstract.
-        count_vectorizer:
-            The CountVectorizer object.
-
-    Returns:
-        A list with the top n words for each topic.
-    """
-    # get the top n word indices
-    top_word_indices = []
-    for topic in range(n_topics):
-        temp_vector_sum = 0
-        for i in range(len(keys)):
-            if keys[i] == topic:
-                temp_vector_sum += document_term_matrix[i]
-        temp_vector_sum = temp_vector_sum.toarray()
-        top_n_word_indices = np.flip(np.argsort(temp_vector_sum)[0][-n:], 0)
-        top_word_indices.append(top_n_word_indices)
-    # get the top n words
-    top_words = []
-    for topic in top_word_indices:
-        topic_words = []
-        for index in topic:
-            temp_word_vector = np.zeros((1, document_term_matrix.shape[1]))
-            temp_word_vector[:, index] = 1
-            the_word = count_vectorizer.inverse_transform(temp_word_vector)[0][0]
-            topic_words.append(the_word.encode("ascii").decode("utf-8"))
-        top_words.append(" ".join(topic_words))
-    return top_words
-
-
 # %%
 # get the keys of the topics for each abstract
 lda_keys = get_keys(lda_topic_matrix)
 lda_categories, lda_counts = keys_to_counts(lda_keys)
 
+# %% [markdown]
+# The top words of every topic are the most frequent words of the abstracts assigned to it. The function `top_words` of the module `pipeline.topics` sums the rows of every topic with a single sparse matrix product and selects the words with `argpartition`, so it is fast even with hundreds of thousands of abstracts.
+
 # %%
 # get a sample of the top words for each topic
-top_n_words_lda = get_top_n_words(10, lda_keys, abstract_term_matrix, count_vectorizer)
+vocabulary = vocabulary_array(count_vectorizer)
+top_n_words_lda = [
+    " ".join(words)
+    for words in top_words(lda_keys, abstract_term_matrix, vocabulary, 10, n_topics)
+]
 
 for i in range(len(top_n_words_lda)):
     print("Topic {}: ".format(i + 1), top_n_words_lda[i])
 
+# %% [markdown]
+# The words can also be ranked by the model instead of the abstracts, with the weight of every word in the topics of `lda_model.components_`.
+
+# %%
+# get the words with the highest weight in every topic of the model
+for i, words in enumerate(top_words_from_components(lda_model.components_, vocabulary)):
+    print("Topic {}: ".format(i + 1), " ".join(words))
+
 # %%
 # get the top 5 words
-top_5_words = get_top_n_words(5, lda_keys, abstract_term_matrix, count_vectorizer)
+top_5_words = [
+    " ".join(words)
+    for words in top_words(lda_keys, abstract_term_matrix, vocabulary, 5, n_topics)
+]
 labels = ["Topic {}: \n".format(i) + top_5_words[i] for i in lda_categories]
 
 # create a bar plot to show the amount of abstracts for each topic and the top words
@@ -693,26 +550,27 @@ ax.set_title("LDA topic counts")
 ax.set_ylabel("Number of headlines")
 
 # %% [markdown]
-# Finally, let's get a sample of the topics generated and the content of the abstracts and also the organization.
+# Finally, let's get a sample of the topics generated and the content of the abstracts and also the organization. The function `topic_exemplars` of the module `pipeline.topics` selects the abstracts with the highest weight of every topic with `argpartition` and reads the organization and the program elements of only those awards.
 
 # %%
-# for loop to print the top 5 words for each topic
-for topic in range(len(top_5_words)):
-    # select a random index for topic 0 using keys
-    random_index = random.choice([i for i, key in enumerate(lda_keys) if key == topic])
+# get the 2 abstracts with the highest weight of every topic and the metadata of their
+# awards, read from the record cache without parsing the XML files again
+exemplars = topic_exemplars(lda_topic_matrix, abstract_narration_dataset, k=2)
 
-    print(f"The top 5 words related to the topic {topic} are: {top_5_words[topic]}")
+# %%
+# for loop to print the top 5 words for each topic
+for exemplar in exemplars.itertuples():
+    print(
+        f"The top 5 words related to the topic {exemplar.topic} are: "
+        f"{top_5_words[exemplar.topic]}"
+    )
     print(f"The abstract is:")
     # print the abstract but not allow more than 100 characters per line
-    print(textwrap.fill(abstract_narration_dataset[random_index][:240], 120))
-    xml_dict = get_xml_as_dict(
-        os.path.join(dataset_folder, abstract_narration_dataset.files[random_index])
-    )
-    abstract_dict = get_award_info_from_dict(xml_dict)
+    print(textwrap.fill(exemplar.abstract[:240], 120))
     print(f"The organization information is:")
-    print(json.dumps(abstract_dict["Organization"], indent=2))
+    print(f"{exemplar.directorate_name} - {exemplar.division_name}")
     print(f"The program element information is:")
-    print(json.dumps(abstract_dict["ProgramElement"], indent=2))
+    print(", ".join(exemplar.program_element_names))
     print()
 
 # %% [markdown]
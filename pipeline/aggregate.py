@@ -0,0 +1,204 @@
+"""Module to count the values of the award metadata in a single pass over the files."""
+
+import logging
+from collections import Counter
+from functools import partial
+
+import pandas as pd
+
+from pipeline import instrumentation
+from pipeline.extractor import StreamingAwardExtractor
+from pipeline.parallel import map_in_chunks
+from pipeline.sources import open_source
+
+# fields of the award read by the built-in aggregates
+AGGREGATION_FIELDS = ("Organization", "ProgramElement")
+
+logger = logging.getLogger(__name__)
+
+
+# class with the fields of an award where the repeatable elements are always lists
+class AwardFields:
+    def __init__(self, award_info: dict, keys: list):
+        self.award_info = award_info
+        # names of all the elements of the award, e.g. AbstractNarration
+        self.keys = keys
+        self.organizations = as_list(award_info.get("Organization"))
+        self.program_elements = as_list(award_info.get("ProgramElement"))
+
+    @property
+    def organization(self) -> dict:
+        """
+        The first Organization of the award, or an empty dictionary
+        """
+        return self.organizations[0] if self.organizations else {}
+
+    @property
+    def program_element(self) -> dict:
+        """
+        The first ProgramElement of the award, or an empty dictionary
+        """
+        return self.program_elements[0] if self.program_elements else {}
+
+
+# class that counts the values of several aggregates reading every file only once
+class AwardMetadataAggregator:
+    def __init__(self, fields: list = AGGREGATION_FIELDS, aggregates: dict = None):
+        self.fields = tuple(fields)
+        # name of every aggregate and the function that gets its values from the
+        # AwardFields of a file, see register
+        self.aggregates = dict(BUILTIN_AGGREGATES if aggregates is None else aggregates)
+        # errors found reading the files
+        self.errors = {}
+        self.files_read = 0
+
+    def register(self, name: str, function):
+        """
+        Add an aggregate that is counted in the same pass as the others
+
+        Arguments:
+            name:
+                The name of the aggregate, it is the key of its DataFrame.
+            function:
+                A function that receives the AwardFields of a file and returns the
+                value to count, a list of values to count, or None to count nothing.
+                It must be picklable (e.g. defined at the level of a module) to use
+                num_workers > 1. If it reads other fields than AGGREGATION_FIELDS, add
+                them to fields.
+        """
+        self.aggregates[name] = function
+
+    def aggregate(
+        self, dataset_folder, num_workers: int = 1, chunk_size: int = 64
+    ) -> dict:
+        """
+        Read every XML file of the dataset once and count the values of all the
+        aggregates
+
+        Arguments:
+            dataset_folder:
+                The path to a folder with XML files, the path to a zip archive, or a
+                list of those paths.
+            num_workers:
+                The amount of processes that read the files.
+            chunk_size:
+                The amount of files sent to a worker at once.
+
+        Returns:
+            A dictionary with the name of every aggregate and a DataFrame with the
+            columns value and count, sorted by count.
+        """
+        source = open_source(dataset_folder)
+        with instrumentation.timer("discovery"):
+            files = sorted(source.list_files())
+        instrumentation.count("files_scanned", len(files))
+        extractor = StreamingAwardExtractor(self.fields)
+        function = partial(_aggregate_file, extractor, source, self.aggregates)
+        counters = {name: Counter() for name in self.aggregates}
+        self.errors = {}
+        self.files_read = 0
+        results = map_in_chunks(function, files, num_workers, chunk_size)
+        for file_name, (values, error) in zip(files, results):
+            if error is not None:
+                logger.warning("Error reading %s: %s", file_name, error)
+                instrumentation.count("files_with_errors")
+                self.errors[file_name] = error
+                continue
+            self.files_read += 1
+            for name, file_values in values.items():
+                counters[name].update(file_values)
+        return {
+            name: pd.DataFrame(counter.most_common(), columns=["value", "count"])
+            for name, counter in counters.items()
+        }
+
+
+def as_list(value) -> list:
+    """
+    Get an element of the award as a list: xmltodict and the extractor return a
+    dictionary when the element appears once and a list when it is repeated
+
+    Arguments:
+        value:
+            The value of the element, None when it is missing or empty.
+
+    Returns:
+        A list with the dictionaries of the element.
+    """
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [item for item in value if item is not None]
+    return [value]
+
+
+def count_keys(award: AwardFields) -> list:
+    """
+    The names of the elements of the award
+    """
+    return award.keys
+
+
+def count_program_element_type(award: AwardFields) -> str:
+    """
+    The type of the ProgramElement of the award: dict, list or None when missing
+    """
+    program_element = award.award_info.get("ProgramElement")
+    return None if program_element is None else type(program_element).__name__
+
+
+def count_program(award: AwardFields) -> str:
+    """
+    The text of the first ProgramElement of the award
+    """
+    return award.program_element.get("Text")
+
+
+def count_directorate(award: AwardFields) -> str:
+    """
+    The name of the directorate of the first Organization of the award
+    """
+    return (award.organization.get("Directorate") or {}).get("LongName")
+
+
+def count_division(award: AwardFields) -> str:
+    """
+    The name of the division of the first Organization of the award
+    """
+    return (award.organization.get("Division") or {}).get("LongName")
+
+
+# aggregates counted by default, the ones of the exploration of the notebook
+BUILTIN_AGGREGATES = {
+    "keys": count_keys,
+    "program_element_type": count_program_element_type,
+    "program": count_program,
+    "directorate": count_directorate,
+    "division": count_division,
+}
+
+
+# function that reads one file and gets the values of every aggregate, it is sent to
+# the worker processes
+def _aggregate_file(
+    extractor: StreamingAwardExtractor, source, aggregates: dict, file_name: str
+) -> dict:
+    collect_keys = count_keys in aggregates.values()
+    with source.open(file_name) as file:
+        if collect_keys:
+            award_info, keys = extractor.extract_with_keys(file)
+        else:
+            award_info, keys = extractor.extract(file), []
+    if award_info is None:
+        return {}
+    award = AwardFields(award_info, keys)
+    values = {}
+    for name, function in aggregates.items():
+        value = function(award)
+        if value is None:
+            values[name] = []
+        elif isinstance(value, (list, tuple, set)):
+            values[name] = list(value)
+        else:
+            values[name] = [value]
+    return values
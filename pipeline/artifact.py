@@ -0,0 +1,320 @@
+"""Module with the versioned artifact of a trained topic model."""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+from sklearn.feature_extraction.text import CountVectorizer
+
+from pipeline import instrumentation
+from pipeline.dataloader import CleanAbstract
+from pipeline.engines import make_engine, restore_engine
+from pipeline.topics import top_words_from_components
+
+# version of the layout of the artifact, it changes when the files change
+ARTIFACT_FORMAT_VERSION = 1
+MANIFEST_FILE = "manifest.json"
+ARRAYS_FILE = "arrays.npz"
+# parameters of the vectorizer that are stored, the callables can not be stored
+VECTORIZER_PARAMS = (
+    "lowercase",
+    "token_pattern",
+    "ngram_range",
+    "max_df",
+    "min_df",
+    "max_features",
+    "binary",
+)
+
+
+# class with everything needed to assign topics to new abstracts: the cleaner, the
+# vectorizer and the model, an engine of pipeline.engines
+class TopicModelArtifact:
+    def __init__(
+        self,
+        clean: CleanAbstract,
+        vectorizer: CountVectorizer,
+        model,
+        manifest: dict = None,
+    ):
+        self.clean = clean
+        self.vectorizer = vectorizer
+        self.model = model
+        # information of the training: versions, corpus fingerprint and parameters
+        self.manifest = manifest or {}
+
+    @property
+    def version(self) -> str:
+        """
+        The version of the model, a hash of its vocabulary, components and cleaner
+        """
+        return self.manifest.get("model_version")
+
+    @property
+    def vocabulary(self) -> np.ndarray:
+        """
+        The word of every column of the document-term matrix
+        """
+        return np.asarray(self.vectorizer.get_feature_names_out(), dtype=str)
+
+    def transform(self, abstracts: list, cleaned: bool = False) -> np.ndarray:
+        """
+        Get the topic distribution of some abstracts
+
+        Arguments:
+            abstracts:
+                The abstracts.
+            cleaned:
+                If True, the abstracts were already cleaned with the cleaner of the
+                artifact.
+
+        Returns:
+            An array with shape (abstracts, topics).
+        """
+        if not cleaned:
+            abstracts = self.clean.clean_batch(abstracts)
+        with instrumentation.timer("vectorize"):
+            document_term_matrix = self.vectorizer.transform(abstracts)
+        with instrumentation.timer(f"{self.model.name}.transform"):
+            return self.model.transform(document_term_matrix)
+
+    def top_words(self, n: int = 10) -> np.ndarray:
+        """
+        Get the words with the highest weight in every topic of the model
+
+        Arguments:
+            n:
+                The amount of words of every topic.
+
+        Returns:
+            An array with shape (topics, n) with the words.
+        """
+        return top_words_from_components(self.model.components_, self.vocabulary, n)
+
+    def save(self, path: str):
+        """
+        Save the artifact in a folder with a JSON manifest and the arrays in a NumPy
+        file, which loads without unpickling any object
+
+        Arguments:
+            path:
+                The folder of the artifact, it is created if needed.
+        """
+        os.makedirs(path, exist_ok=True)
+        vocabulary = self.vocabulary
+        components = np.ascontiguousarray(self.model.components_)
+        engine_arrays = self.model.arrays()
+        manifest = dict(self.manifest)
+        manifest.update(
+            {
+                "format_version": ARTIFACT_FORMAT_VERSION,
+                "model_version": _model_version(
+                    vocabulary, components, self.clean, engine_arrays
+                ),
+                "cleaner": {
+                    "lemmatize": self.clean.lemmatize,
+                    "lemma_cache_size": self.clean.lemma_cache_size,
+                    "custom_stop_words": self.clean.custom_stop_words,
+                    "fingerprint": self.clean.fingerprint(),
+                },
+                "vectorizer": {
+                    name: self.vectorizer.get_params()[name]
+                    for name in VECTORIZER_PARAMS
+                },
+                "engine": self.model.name,
+                "model": self.model.get_params(),
+            }
+        )
+        manifest.setdefault("created_at", time.strftime("%Y-%m-%dT%H:%M:%S%z"))
+        # the arrays are written first, so a manifest always has its arrays
+        arrays_path = os.path.join(path, ARRAYS_FILE)
+        with open(f"{arrays_path}.tmp", "wb") as file:
+            np.savez(
+                file, vocabulary=vocabulary, components=components, **engine_arrays
+            )
+        os.replace(f"{arrays_path}.tmp", arrays_path)
+        manifest_path = os.path.join(path, MANIFEST_FILE)
+        with open(f"{manifest_path}.tmp", "w") as file:
+            json.dump(manifest, file, indent=2)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+        self.manifest = manifest
+
+    @classmethod
+    def load(cls, path: str) -> "TopicModelArtifact":
+        """
+        Load an artifact saved with save, rebuilding the vectorizer from its vocabulary
+        and the engine from its arrays, without training anything
+
+        Arguments:
+            path:
+                The folder of the artifact.
+
+        Returns:
+            A TopicModelArtifact ready to transform abstracts.
+        """
+        with open(os.path.join(path, MANIFEST_FILE)) as file:
+            manifest = json.load(file)
+        if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+            raise ValueError(
+                f"Unsupported artifact format {manifest.get('format_version')} in "
+                f"{path}, expected {ARTIFACT_FORMAT_VERSION}"
+            )
+        with np.load(os.path.join(path, ARRAYS_FILE)) as arrays:
+            vocabulary = arrays["vocabulary"]
+            components = arrays["components"]
+            engine_arrays = {
+                name: arrays[name]
+                for name in arrays.files
+                if name not in ("vocabulary", "components")
+            }
+
+        cleaner = manifest["cleaner"]
+        clean = CleanAbstract(
+            lemmatize=cleaner["lemmatize"],
+            lemma_cache_size=cleaner["lemma_cache_size"],
+            custom_stop_words=cleaner["custom_stop_words"],
+        )
+        vectorizer_params = dict(manifest["vectorizer"])
+        vectorizer_params["ngram_range"] = tuple(vectorizer_params["ngram_range"])
+        vectorizer = CountVectorizer(
+            vocabulary={word: idx for idx, word in enumerate(vocabulary.tolist())},
+            **vectorizer_params,
+        )
+        # the artifacts saved before the engines were added are LDA models
+        model = restore_engine(
+            manifest.get("engine", "lda"), manifest["model"], components, engine_arrays
+        )
+        return cls(clean, vectorizer, model, manifest)
+
+    def check_cleaner(self) -> bool:
+        """
+        Check that the cleaner gives the same output it gave in the training: the same
+        rules, stop words and NLTK versions
+
+        Returns:
+            True if the fingerprint of the cleaner is the one of the manifest.
+        """
+        expected = self.manifest.get("cleaner", {}).get("fingerprint")
+        return expected is None or expected == self.clean.fingerprint()
+
+
+def train_topic_model(
+    dataset,
+    n_topics: int = 9,
+    max_features: int = 800,
+    random_state: int = 0,
+    engine: str = "lda",
+    abstracts: list = None,
+) -> TopicModelArtifact:
+    """
+    Train the vectorizer and a topic engine, by default the LDA model of the notebook,
+    on the cleaned abstracts of a dataset
+
+    Arguments:
+        dataset:
+            The AbstractNarrationDataset, its abstracts are cleaned with its clean
+            attribute.
+        n_topics:
+            The amount of topics.
+        max_features:
+            The amount of words of the vocabulary.
+        random_state:
+            The seed of the model.
+        engine:
+            The name of the engine, a key of pipeline.engines.ENGINES, e.g. "kmeans"
+            for TF-IDF, truncated SVD and MiniBatchKMeans.
+        abstracts:
+            The cleaned abstracts of the dataset when they were already read, e.g. by
+            the deduplication, so they are not cleaned again.
+
+    Returns:
+        A TopicModelArtifact with the fingerprint of the corpus in its manifest.
+    """
+    start = time.perf_counter()
+    vectorizer = CountVectorizer(max_features=max_features)
+    # the dataset parses and cleans the abstracts while it is read, so it is read
+    # before the timer and the vectorization does not include those stages
+    if abstracts is None:
+        abstracts = list(dataset)
+    with instrumentation.timer("vectorize"):
+        document_term_matrix = vectorizer.fit_transform(abstracts)
+    model = make_engine(engine, n_topics, random_state)
+    with instrumentation.timer(f"{model.name}.fit"):
+        model.fit(document_term_matrix)
+    manifest = {
+        "corpus": corpus_manifest(dataset),
+        "training_seconds": round(time.perf_counter() - start, 3),
+        **model.scores(document_term_matrix),
+    }
+    return TopicModelArtifact(dataset.clean, vectorizer, model, manifest)
+
+
+def corpus_manifest(dataset) -> dict:
+    """
+    Get the description of the training corpus stored in the manifest
+
+    Arguments:
+        dataset:
+            The AbstractNarrationDataset or PackedCorpusDataset.
+
+    Returns:
+        A dictionary with the fingerprint, the amount of documents and the location of
+        the corpus.
+    """
+    return {
+        "fingerprint": corpus_fingerprint(dataset),
+        "documents": len(dataset),
+        "dataset_folder": getattr(dataset, "dataset_folder", None)
+        or getattr(dataset, "path", None),
+    }
+
+
+def corpus_fingerprint(dataset) -> str:
+    """
+    Get a hash of the files of a dataset and of their versions in the source, it
+    changes when a file is added, removed or modified. A PackedCorpusDataset does not
+    have the versions of the files, so only their names are hashed.
+
+    Arguments:
+        dataset:
+            The AbstractNarrationDataset or PackedCorpusDataset.
+
+    Returns:
+        A string with the hexadecimal hash.
+    """
+    return files_fingerprint(dataset.files, getattr(dataset, "source", None))
+
+
+def files_fingerprint(files: list, source=None) -> str:
+    """
+    Get a hash of some files and of their versions in a source, e.g. all the files of
+    a source before a dataset is built with them
+
+    Arguments:
+        files:
+            The names of the files.
+        source:
+            The source of the files, None hashes only their names.
+
+    Returns:
+        A string with the hexadecimal hash.
+    """
+    digest = hashlib.sha256()
+    for file_name in files:
+        stamp, size = source.stat(file_name) if source is not None else (None, None)
+        digest.update(f"{file_name}\0{stamp}\0{size}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def _model_version(
+    vocabulary: np.ndarray, components: np.ndarray, clean, engine_arrays: dict
+) -> str:
+    digest = hashlib.sha256()
+    digest.update("\0".join(vocabulary.tolist()).encode("utf-8"))
+    digest.update(components.tobytes())
+    for name in sorted(engine_arrays):
+        digest.update(np.ascontiguousarray(engine_arrays[name]).tobytes())
+    digest.update(clean.fingerprint().encode("utf-8"))
+    return digest.hexdigest()[:16]
@@ -0,0 +1,235 @@
+"""Module with the on-disk columnar cache of the award records."""
+
+import os
+
+import numpy as np
+
+from pipeline import instrumentation
+from pipeline.extractor import RECORD_FIELDS
+
+
+# class that stores a column of optional strings as one UTF-8 buffer plus offsets
+class StringColumn:
+    def __init__(self, data: np.ndarray, offsets: np.ndarray, valid: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+        self.valid = valid
+
+    def __len__(self):
+        return len(self.valid)
+
+    def __getitem__(self, idx: int) -> str:
+        if not self.valid[idx]:
+            return None
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return str(self.data[start:end], "utf-8")
+
+    def get_bytes(self, idx: int) -> memoryview:
+        """
+        Get the UTF-8 bytes of a value without copying them
+
+        Arguments:
+            idx:
+                The index of the value in the column.
+
+        Returns:
+            A memoryview over the buffer of the column, or None for a missing value.
+        """
+        if not self.valid[idx]:
+            return None
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.data[start:end].data
+
+    @classmethod
+    def from_values(cls, values: list) -> "StringColumn":
+        """
+        Build a column from a list of strings, where None is stored as a missing value
+
+        Arguments:
+            values:
+                The strings (or None) to store in the column.
+
+        Returns:
+            A StringColumn with the values encoded.
+        """
+        encoded = [b"" if value is None else value.encode("utf-8") for value in values]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        np.cumsum([len(value) for value in encoded], out=offsets[1:])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        valid = np.array([value is not None for value in values], dtype=bool)
+        return cls(data, offsets, valid)
+
+    def to_arrays(self, name: str) -> dict:
+        """
+        Get the arrays of the column keyed by the names used in the bundle
+
+        Arguments:
+            name:
+                The name of the column.
+
+        Returns:
+            A dictionary with the data, offsets and valid arrays of the column.
+        """
+        return {
+            f"{name}__data": self.data,
+            f"{name}__offsets": self.offsets,
+            f"{name}__valid": self.valid,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays, name: str) -> "StringColumn":
+        """
+        Build a column from the arrays stored in a bundle
+
+        Arguments:
+            arrays:
+                A mapping with the arrays of the bundle (e.g. the result of np.load).
+            name:
+                The name of the column.
+
+        Returns:
+            A StringColumn with the arrays of the column.
+        """
+        return cls(
+            arrays[f"{name}__data"],
+            arrays[f"{name}__offsets"],
+            arrays[f"{name}__valid"],
+        )
+
+
+# class that keeps the award records of a dataset source in a columnar NumPy bundle
+class AwardRecordCache:
+    def __init__(self, cache_path: str):
+        self.cache_path = cache_path
+        self.files = []
+        self.columns = {}
+        self.__index = {}
+        self.__stats = {}
+
+    def __len__(self):
+        return len(self.files)
+
+    def __contains__(self, file_name: str) -> bool:
+        return file_name in self.__index
+
+    def get(self, file_name: str, field: str) -> str:
+        """
+        Get a field of the award record stored for a file
+
+        Arguments:
+            file_name:
+                The name of the file in the dataset source.
+            field:
+                The field to get, one of RECORD_FIELDS.
+
+        Returns:
+            The value of the field, or None if the award does not have it.
+        """
+        return self.columns[field][self.__index[file_name]]
+
+    def get_record(self, file_name: str) -> dict:
+        """
+        Get the award record stored for a file
+
+        Arguments:
+            file_name:
+                The name of the file in the dataset source.
+
+        Returns:
+            A dictionary with the fields in RECORD_FIELDS.
+        """
+        row = self.__index[file_name]
+        return {field: self.columns[field][row] for field in RECORD_FIELDS}
+
+    def load(self) -> bool:
+        """
+        Load the bundle from the cache path
+
+        Returns:
+            True if the bundle was loaded, False if it does not exist or it was written
+            with other fields.
+        """
+        if not os.path.exists(self.cache_path):
+            return False
+        with np.load(self.cache_path) as arrays:
+            if "stamp" not in arrays or any(
+                f"{field}__valid" not in arrays for field in RECORD_FIELDS
+            ):
+                return False
+            files = StringColumn.from_arrays(arrays, "files")
+            stamps = arrays["stamp"]
+            sizes = arrays["size"]
+            columns = {
+                field: StringColumn.from_arrays(arrays, field)
+                for field in RECORD_FIELDS
+            }
+        self.files = [files[i] for i in range(len(files))]
+        self.columns = columns
+        self.__index = {file_name: i for i, file_name in enumerate(self.files)}
+        self.__stats = {
+            file_name: (int(stamps[i]), int(sizes[i]))
+            for i, file_name in enumerate(self.files)
+        }
+        return True
+
+    def sync(self, source, files: list, read_records) -> int:
+        """
+        Make the cache match the files of the dataset source. Files whose stamp (mtime,
+        or CRC-32 for zip members) or size changed, and new files, are parsed again with
+        read_records; the others are reused from the bundle. The bundle is rewritten
+        only when something changed.
+
+        Arguments:
+            source:
+                The source with the XML files, see pipeline.sources.
+            files:
+                The names of the XML files in the source.
+            read_records:
+                Function that receives a list of file names and returns the award record
+                of each one as a dictionary with the fields in RECORD_FIELDS.
+
+        Returns:
+            The amount of files that were parsed.
+        """
+        self.load()
+        stats = {file_name: source.stat(file_name) for file_name in files}
+
+        stale_files = [f for f in files if self.__stats.get(f) != stats[f]]
+        instrumentation.count("record_cache.hits", len(files) - len(stale_files))
+        instrumentation.count("record_cache.misses", len(stale_files))
+        if not stale_files and len(files) == len(self.files):
+            return 0
+        parsed_records = dict(zip(stale_files, read_records(stale_files)))
+        records = [
+            parsed_records[f] if f in parsed_records else self.get_record(f)
+            for f in files
+        ]
+
+        self.files = list(files)
+        self.columns = {
+            field: StringColumn.from_values([record[field] for record in records])
+            for field in RECORD_FIELDS
+        }
+        self.__index = {file_name: i for i, file_name in enumerate(self.files)}
+        self.__stats = stats
+        self.save()
+        return len(stale_files)
+
+    def save(self):
+        """
+        Write the bundle to the cache path. The bundle is written to a temporary file
+        first, so a failure never leaves a half written cache.
+        """
+        arrays = StringColumn.from_values(self.files).to_arrays("files")
+        arrays["stamp"] = np.array(
+            [self.__stats[file_name][0] for file_name in self.files], dtype=np.int64
+        )
+        arrays["size"] = np.array(
+            [self.__stats[file_name][1] for file_name in self.files], dtype=np.int64
+        )
+        for field in RECORD_FIELDS:
+            arrays.update(self.columns[field].to_arrays(field))
+        temporary_path = f"{self.cache_path}.tmp"
+        with open(temporary_path, "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(temporary_path, self.cache_path)
@@ -0,0 +1,205 @@
+"""Module with the persistent cache of cleaned abstracts."""
+
+import hashlib
+import os
+import sqlite3
+import time
+
+from pipeline import instrumentation
+
+
+# class that stores cleaned abstracts in SQLite, with least recently used eviction
+class CleanedAbstractCache:
+    def __init__(self, path: str, max_bytes: int = 2**30):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.__connection = None
+        self.__pid = None
+        self.__accessed = []
+        self.__written_bytes = 0
+
+    def __getstate__(self):
+        # every process opens its own connection to the same file
+        return {"path": self.path, "max_bytes": self.max_bytes}
+
+    def __setstate__(self, state: dict):
+        self.__init__(state["path"], state["max_bytes"])
+
+    def get(self, key: str) -> str:
+        """
+        Get a cleaned abstract
+
+        Arguments:
+            key:
+                The key given by cache_key.
+
+        Returns:
+            The cleaned abstract, or None if it is not in the cache.
+        """
+        row = self.connection.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        # the access times are written in batches, they are only used for eviction
+        self.__accessed.append(key)
+        if len(self.__accessed) >= 256:
+            self.flush()
+        return row[0]
+
+    def put(self, key: str, value: str):
+        """
+        Store a cleaned abstract, evicting the least recently used ones when the cache
+        grows over max_bytes
+
+        Arguments:
+            key:
+                The key given by cache_key.
+            value:
+                The cleaned abstract.
+        """
+        size = len(value.encode("utf-8"))
+        with self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)",
+                (key, value, size, time.time_ns()),
+            )
+        self.__written_bytes += size
+        if self.__written_bytes >= self.max_bytes // 16:
+            self.evict()
+
+    def flush(self):
+        """
+        Write the access times of the entries read since the last flush
+        """
+        if not self.__accessed:
+            return
+        now = time.time_ns()
+        with self.connection:
+            self.connection.executemany(
+                "UPDATE entries SET last_access = ? WHERE key = ?",
+                [(now, key) for key in self.__accessed],
+            )
+        self.__accessed = []
+
+    def evict(self):
+        """
+        Delete the least recently used entries until the cache uses less than 90% of
+        max_bytes
+        """
+        self.flush()
+        self.__written_bytes = 0
+        total = self.size()
+        target = self.max_bytes * 9 // 10
+        if total <= self.max_bytes:
+            return
+        with self.connection:
+            rows = self.connection.execute(
+                "SELECT key, size FROM entries ORDER BY last_access"
+            ).fetchall()
+            keys = []
+            for key, size in rows:
+                if total <= target:
+                    break
+                keys.append((key,))
+                total -= size
+            self.connection.executemany("DELETE FROM entries WHERE key = ?", keys)
+
+    def size(self) -> int:
+        """
+        Get the bytes used by the cleaned abstracts of the cache
+
+        Returns:
+            The sum of the UTF-8 sizes of the values.
+        """
+        row = self.connection.execute("SELECT SUM(size) FROM entries").fetchone()
+        return row[0] or 0
+
+    def close(self):
+        """
+        Write the pending access times and close the connection
+        """
+        if self.__connection is not None:
+            self.flush()
+            self.__connection.close()
+            self.__connection = None
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        """
+        The connection to the SQLite file, opened the first time it is used
+        """
+        if self.__connection is None or self.__pid != os.getpid():
+            self.__connection = sqlite3.connect(self.path, timeout=60)
+            self.__pid = os.getpid()
+            # the write-ahead log lets several processes read while one writes
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, "
+                "value TEXT NOT NULL, size INTEGER NOT NULL, last_access INTEGER)"
+            )
+        return self.__connection
+
+
+# class with the interface of CleanAbstract that cleans through the cache
+class CachedCleanAbstract:
+    def __init__(self, clean, cache: CleanedAbstractCache):
+        self.clean = clean
+        self.cache = cache
+        self.fingerprint = clean.fingerprint()
+
+    def clean_abstract(self, abstract: str) -> str:
+        """
+        Get the cleaned abstract from the cache, cleaning and storing it when it is not
+        there
+
+        Arguments:
+            abstract:
+                The abstract to clean.
+
+        Returns:
+            A string with the abstract cleaned.
+        """
+        key = cache_key(abstract, self.fingerprint)
+        cleaned_abstract = self.cache.get(key)
+        if cleaned_abstract is None:
+            instrumentation.count("clean_cache.misses")
+            cleaned_abstract = self.clean.clean_abstract(abstract)
+            self.cache.put(key, cleaned_abstract)
+        else:
+            instrumentation.count("clean_cache.hits")
+        return cleaned_abstract
+
+    def clean_batch(self, abstracts) -> list:
+        """
+        Clean several abstracts through the cache
+
+        Arguments:
+            abstracts:
+                An iterable with the abstracts to clean.
+
+        Returns:
+            A list with the abstracts cleaned, in the same order.
+        """
+        return [self.clean_abstract(abstract) for abstract in abstracts]
+
+
+def cache_key(abstract: str, fingerprint: str) -> str:
+    """
+    Get the key of a cleaned abstract: the hash of the abstract and the fingerprint of
+    the cleaner, so a change in the cleaner only misses the entries of that cleaner
+
+    Arguments:
+        abstract:
+            The abstract without cleaning.
+        fingerprint:
+            The fingerprint of the cleaner, see CleanAbstract.fingerprint.
+
+    Returns:
+        A string with the hexadecimal key.
+    """
+    digest = hashlib.sha256(fingerprint.encode("utf-8"))
+    digest.update(b"\0")
+    digest.update(abstract.encode("utf-8"))
+    return digest.hexdigest()
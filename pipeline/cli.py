@@ -0,0 +1,515 @@
+"""Command line interface to train, inspect and run the topic models.
+
+Usage:
+    nfs-topics train dataset --output models/lda --topics 9
+    nfs-topics train dataset --output models/kmeans --engine kmeans --topics 20
+    nfs-topics predict models/lda dataset/2021.zip --output predictions.csv
+    nfs-topics inspect models/lda
+    nfs-topics serve models/lda --port 8080 --max-wait-ms 5
+    nfs-topics sweep dataset --topics 5 9 15 20 --num-workers 4
+    nfs-topics index models/lda dataset
+    nfs-topics similar models/lda 2000000.xml --k 20
+    nfs-topics map models/lda dataset --output topic_map.png
+    nfs-topics --metrics metrics.prom train dataset --output models/lda
+"""
+
+import argparse
+import csv
+import json
+import sys
+import time
+
+from pipeline import instrumentation
+from pipeline.parallel import chunked
+
+
+def main(argv: list = None):
+    parser = argparse.ArgumentParser(
+        prog="nfs-topics", description=__doc__.splitlines()[0]
+    )
+    parser.add_argument(
+        "--metrics",
+        default=None,
+        help="write the time of every stage and the counters to this file, in the "
+        "Prometheus format when it ends with .prom and as JSON otherwise",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    train_parser = commands.add_parser("train", help="train and save a topic model")
+    train_parser.add_argument("dataset", nargs="+", help="folders or zip archives")
+    train_parser.add_argument("--output", required=True, help="folder of the model")
+    train_parser.add_argument("--topics", type=int, default=9)
+    train_parser.add_argument("--max-features", type=int, default=800)
+    train_parser.add_argument("--lemmatize", action="store_true")
+    train_parser.add_argument("--random-state", type=int, default=0)
+    train_parser.add_argument(
+        "--engine",
+        choices=["lda", "kmeans"],
+        default="lda",
+        help="LDA, or TF-IDF, truncated SVD and MiniBatchKMeans (faster)",
+    )
+    train_parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="train with mini-batches, without the matrix of the corpus in memory",
+    )
+    train_parser.add_argument("--batch-size", type=int, default=1024)
+    train_parser.add_argument("--passes", type=int, default=10)
+    train_parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help="train only on one abstract of every group of near-duplicates",
+    )
+    _add_dedup_arguments(train_parser)
+    _add_dataset_arguments(train_parser)
+    train_parser.set_defaults(function=train)
+
+    predict_parser = commands.add_parser(
+        "predict", help="assign topics to the awards of a dataset with a saved model"
+    )
+    predict_parser.add_argument("model", help="folder of the model")
+    predict_parser.add_argument("dataset", nargs="+", help="folders or zip archives")
+    predict_parser.add_argument("--output", default="-", help="CSV file, - is stdout")
+    predict_parser.add_argument("--batch-size", type=int, default=1024)
+    predict_parser.add_argument(
+        "--dedup-threshold",
+        type=float,
+        default=None,
+        help="transform one abstract of every group of near-duplicates and give its "
+        "topics to the others",
+    )
+    _add_dedup_arguments(predict_parser)
+    _add_dataset_arguments(predict_parser)
+    predict_parser.set_defaults(function=predict)
+
+    inspect_parser = commands.add_parser(
+        "inspect", help="show the manifest and the top words of a saved model"
+    )
+    inspect_parser.add_argument("model", help="folder of the model")
+    inspect_parser.add_argument("--words", type=int, default=10)
+    inspect_parser.set_defaults(function=inspect)
+
+    serve_parser = commands.add_parser(
+        "serve", help="serve the topics of a saved model over HTTP"
+    )
+    serve_parser.add_argument("model", help="folder of the model")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8080)
+    serve_parser.add_argument("--max-batch-size", type=int, default=64)
+    serve_parser.add_argument("--max-wait-ms", type=float, default=5)
+    serve_parser.add_argument("--words", type=int, default=10)
+    serve_parser.set_defaults(function=serve)
+
+    sweep_parser = commands.add_parser(
+        "sweep", help="compare models with different amounts of topics and priors"
+    )
+    sweep_parser.add_argument("dataset", nargs="+", help="folders or zip archives")
+    sweep_parser.add_argument("--topics", type=int, nargs="+", default=[5, 9, 15, 20])
+    sweep_parser.add_argument("--doc-topic-prior", type=float, nargs="+", default=None)
+    sweep_parser.add_argument(
+        "--topic-word-prior", type=float, nargs="+", default=None
+    )
+    sweep_parser.add_argument("--max-features", type=int, default=800)
+    sweep_parser.add_argument("--lemmatize", action="store_true")
+    sweep_parser.add_argument("--random-state", type=int, default=0)
+    sweep_parser.add_argument("--output", default=None, help="CSV file of the results")
+    _add_dataset_arguments(sweep_parser)
+    sweep_parser.set_defaults(function=sweep)
+
+    index_parser = commands.add_parser(
+        "index", help="build the similarity index of a dataset next to a saved model"
+    )
+    index_parser.add_argument("model", help="folder of the model")
+    index_parser.add_argument("dataset", nargs="+", help="folders or zip archives")
+    index_parser.add_argument(
+        "--method", choices=["auto", "exact", "lsh"], default="auto"
+    )
+    index_parser.add_argument("--tables", type=int, default=16)
+    index_parser.add_argument("--bits", type=int, default=14)
+    index_parser.add_argument("--batch-size", type=int, default=1024)
+    _add_dataset_arguments(index_parser)
+    index_parser.set_defaults(function=index)
+
+    similar_parser = commands.add_parser(
+        "similar", help="find the awards most similar to some awards or abstracts"
+    )
+    similar_parser.add_argument("model", help="folder of the model and its index")
+    similar_parser.add_argument("files", nargs="*", help="files of the indexed awards")
+    similar_parser.add_argument(
+        "--abstract", action="append", default=[], help="text of an abstract"
+    )
+    similar_parser.add_argument("--k", type=int, default=20)
+    similar_parser.add_argument("--probes", type=int, default=0)
+    similar_parser.set_defaults(function=similar)
+
+    map_parser = commands.add_parser(
+        "map", help="draw the 2D topic map of a dataset, the coordinates are cached"
+    )
+    map_parser.add_argument("model", help="folder of the model")
+    map_parser.add_argument("dataset", nargs="+", help="folders or zip archives")
+    map_parser.add_argument("--output", default="topic_map.png", help="image file")
+    map_parser.add_argument("--max-tsne-points", type=int, default=10000)
+    map_parser.add_argument("--perplexity", type=float, default=30.0)
+    map_parser.add_argument("--words", type=int, default=3)
+    map_parser.add_argument("--random-state", type=int, default=0)
+    map_parser.add_argument("--batch-size", type=int, default=1024)
+    _add_dataset_arguments(map_parser)
+    map_parser.set_defaults(function=topic_map)
+
+    args = parser.parse_args(argv)
+    if args.metrics:
+        instrumentation.enable()
+    try:
+        args.function(args)
+    finally:
+        if args.metrics:
+            instrumentation.write_metrics(args.metrics)
+
+
+def train(args: argparse.Namespace):
+    """
+    Train a topic model on the cleaned abstracts of a dataset and save its artifact
+    """
+    from pipeline.artifact import train_topic_model
+    from pipeline.dataloader import CleanAbstract
+    from pipeline.training import train_streaming_lda
+
+    if args.streaming and args.engine != "lda":
+        sys.exit("Only the lda engine can be trained with --streaming")
+    dataset = _open_dataset(args, CleanAbstract(lemmatize=args.lemmatize))
+    clusters = None
+    abstracts = None
+    if args.dedup_threshold is not None:
+        from pipeline.dedup import deduplicate_dataset
+
+        # the cleaned abstracts are kept to train with them, unless the training is
+        # streaming because they do not fit in memory
+        if not args.streaming:
+            abstracts = list(dataset)
+        dataset, clusters = deduplicate_dataset(
+            dataset,
+            abstracts,
+            threshold=args.dedup_threshold,
+            max_shingle_df=args.dedup_max_shingle_df,
+        )
+        if abstracts is not None:
+            abstracts = [abstracts[idx] for idx in clusters.representatives]
+    if args.streaming:
+        artifact = train_streaming_lda(
+            dataset,
+            args.topics,
+            max_features=args.max_features,
+            batch_size=args.batch_size,
+            passes=args.passes,
+            random_state=args.random_state,
+        )
+    else:
+        artifact = train_topic_model(
+            dataset,
+            args.topics,
+            args.max_features,
+            args.random_state,
+            args.engine,
+            abstracts,
+        )
+    if clusters is not None:
+        artifact.manifest["deduplication"] = {
+            "threshold": args.dedup_threshold,
+            "max_shingle_df": args.dedup_max_shingle_df,
+            **clusters.to_dict(),
+        }
+    artifact.save(args.output)
+    print(
+        f"Model {artifact.version} trained on {len(dataset)} abstracts in "
+        f"{artifact.manifest['training_seconds']} s, saved in {args.output}",
+        file=sys.stderr,
+    )
+
+
+def predict(args: argparse.Namespace):
+    """
+    Write the topic distribution of every award of a dataset with a saved model
+    """
+    from pipeline.artifact import TopicModelArtifact
+
+    artifact = TopicModelArtifact.load(args.model)
+    if not artifact.check_cleaner():
+        print(
+            "Warning: the cleaner does not match the one of the training (stop words "
+            "or NLTK versions changed), the topics can differ",
+            file=sys.stderr,
+        )
+    dataset = _open_dataset(args, artifact.clean)
+    n_topics = artifact.model.components_.shape[0]
+    output = sys.stdout if args.output == "-" else open(args.output, "w", newline="")
+    try:
+        writer = csv.writer(output)
+        writer.writerow(
+            ["file", "topic"] + [f"topic_{topic}" for topic in range(n_topics)]
+        )
+        files = iter(dataset.files)
+        # the abstracts are cleaned by the dataset, in its process pool
+        batches = (
+            artifact.transform(abstracts, cleaned=True)
+            for abstracts in chunked(dataset, args.batch_size)
+        )
+        if args.dedup_threshold is not None:
+            batches = [_predict_deduplicated(artifact, dataset, args)]
+        for doc_topic_matrix in batches:
+            for weights in doc_topic_matrix:
+                writer.writerow(
+                    [next(files), int(weights.argmax())]
+                    + [f"{weight:.6f}" for weight in weights]
+                )
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+
+def inspect(args: argparse.Namespace):
+    """
+    Print the manifest and the top words of every topic of a saved model
+    """
+    from pipeline.artifact import TopicModelArtifact
+
+    artifact = TopicModelArtifact.load(args.model)
+    print(json.dumps(artifact.manifest, indent=2))
+    for topic, words in enumerate(artifact.top_words(args.words)):
+        print(f"Topic {topic}: {' '.join(words)}")
+
+
+def serve(args: argparse.Namespace):
+    """
+    Serve the topics of a saved model over HTTP until the process is interrupted
+    """
+    from pipeline.artifact import TopicModelArtifact
+    from pipeline.service import TopicInferenceService, make_server
+
+    artifact = TopicModelArtifact.load(args.model)
+    # the resources of the cleaner are loaded before the first request
+    artifact.transform([""])
+    service = TopicInferenceService(
+        artifact, args.max_batch_size, args.max_wait_ms, args.words
+    )
+    server = make_server(service, args.host, args.port)
+    print(
+        f"Serving model {artifact.version} on http://{args.host}:"
+        f"{server.server_address[1]}",
+        file=sys.stderr,
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+
+def sweep(args: argparse.Namespace):
+    """
+    Fit a model for every amount of topics and priors on one document-term matrix and
+    print their perplexity, coherence and time
+    """
+    from pipeline.dataloader import CleanAbstract
+    from pipeline.sweep import sweep_dataset
+
+    dataset = _open_dataset(args, CleanAbstract(lemmatize=args.lemmatize))
+    start = time.perf_counter()
+    results, _ = sweep_dataset(
+        dataset,
+        args.max_features,
+        n_components=args.topics,
+        doc_topic_priors=args.doc_topic_prior or [None],
+        topic_word_priors=args.topic_word_prior or [None],
+        num_workers=args.num_workers,
+        random_state=args.random_state,
+    )
+    print(results.to_string(index=False))
+    print(
+        f"Swept {len(results)} models on {len(dataset)} abstracts in "
+        f"{time.perf_counter() - start:.3f} s",
+        file=sys.stderr,
+    )
+    if args.output:
+        results.to_csv(args.output, index=False)
+
+
+def index(args: argparse.Namespace):
+    """
+    Build the similarity index of the topic distributions of a dataset and save it in
+    the folder of the model
+    """
+    from pipeline.artifact import TopicModelArtifact
+    from pipeline.similarity import build_topic_index
+
+    artifact = TopicModelArtifact.load(args.model)
+    dataset = _open_dataset(args, artifact.clean)
+    similarity_index = build_topic_index(
+        artifact,
+        dataset,
+        args.batch_size,
+        method=args.method,
+        n_tables=args.tables,
+        n_bits=args.bits,
+    )
+    similarity_index.save(args.model)
+    print(
+        f"Indexed {len(similarity_index)} abstracts with {similarity_index.method} "
+        f"search in {args.model}",
+        file=sys.stderr,
+    )
+
+
+def similar(args: argparse.Namespace):
+    """
+    Print the awards of the index most similar to some indexed awards or abstracts
+    """
+    from pipeline.artifact import TopicModelArtifact
+    from pipeline.similarity import SimilarityIndex
+
+    similarity_index = SimilarityIndex.load(args.model)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["query", "rank", "file", "score"])
+    if args.files:
+        positions = {label: idx for idx, label in enumerate(similarity_index.labels)}
+        missing = [file_name for file_name in args.files if file_name not in positions]
+        if missing:
+            sys.exit(f"Files not in the index: {', '.join(missing)}")
+        found, scores = similarity_index.query_documents(
+            [positions[file_name] for file_name in args.files], args.k, args.probes
+        )
+        _write_similar(writer, similarity_index, args.files, found, scores)
+    if args.abstract:
+        artifact = TopicModelArtifact.load(args.model)
+        if similarity_index.metadata.get("model_version") != artifact.version:
+            sys.exit("The index was built with another version of the model")
+        found, scores = similarity_index.query(
+            artifact.transform(args.abstract), args.k, args.probes
+        )
+        queries = [f"abstract {idx}" for idx in range(len(args.abstract))]
+        _write_similar(writer, similarity_index, queries, found, scores)
+
+
+def topic_map(args: argparse.Namespace):
+    """
+    Draw the topic map of a dataset, with the coordinates cached in the folder of the
+    model
+    """
+    import os
+
+    from pipeline.artifact import TopicModelArtifact, files_fingerprint
+    from pipeline.projection import (
+        PROJECTIONS_FOLDER,
+        load_projection,
+        plot_topic_map,
+        project_dataset,
+        projection_key,
+    )
+    from pipeline.sources import open_source
+
+    artifact = TopicModelArtifact.load(args.model)
+    cache_dir = os.path.join(args.model, PROJECTIONS_FOLDER)
+    config = {
+        "max_tsne_points": args.max_tsne_points,
+        "perplexity": args.perplexity,
+        "random_state": args.random_state,
+    }
+    # the cache is keyed by the files of the source, so a cached map is drawn without
+    # parsing nor transforming the dataset
+    dataset_source = open_source(args.dataset)
+    fingerprint = files_fingerprint(dataset_source.list_files(), dataset_source)
+    key = projection_key(artifact.version, fingerprint, config)
+    projection = load_projection(cache_dir, key)
+    if projection is None:
+        dataset = _open_dataset(args, artifact.clean)
+        projection = project_dataset(
+            artifact, dataset, cache_dir, args.batch_size, fingerprint, **config
+        )
+    start = time.perf_counter()
+    topic_names = [" ".join(words) for words in artifact.top_words(args.words)]
+    plot_topic_map(
+        projection["coordinates"], projection["topics"], args.output, topic_names
+    )
+    source = "cached" if projection["cached"] else "projected"
+    print(
+        f"Topic map of {len(projection['coordinates'])} abstracts ({source} in "
+        f"{projection['seconds']:.3f} s, drawn in {time.perf_counter() - start:.3f} "
+        f"s) saved in {args.output}",
+        file=sys.stderr,
+    )
+
+
+def _write_similar(writer, similarity_index, queries: list, found, scores):
+    for query, indices, query_scores in zip(queries, found, scores):
+        for rank, (idx, score) in enumerate(zip(indices, query_scores)):
+            if idx >= 0:
+                label = similarity_index.labels[idx]
+                writer.writerow([query, rank + 1, label, f"{score:.6f}"])
+
+
+def _predict_deduplicated(artifact, dataset, args: argparse.Namespace):
+    # only the representatives are transformed, every file gets the topics of its own
+    import numpy as np
+
+    from pipeline.dedup import deduplicate_dataset
+
+    # the abstracts are cleaned once, for the signatures and for the model
+    abstracts = list(dataset)
+    _, clusters = deduplicate_dataset(
+        dataset,
+        abstracts,
+        threshold=args.dedup_threshold,
+        max_shingle_df=args.dedup_max_shingle_df,
+    )
+    representatives = [abstracts[idx] for idx in clusters.representatives]
+    doc_topic_matrices = [
+        artifact.transform(batch, cleaned=True)
+        for batch in chunked(representatives, args.batch_size)
+    ]
+    n_topics = artifact.model.components_.shape[0]
+    doc_topic_matrix = (
+        np.vstack(doc_topic_matrices) if doc_topic_matrices else np.empty((0, n_topics))
+    )
+    print(
+        f"{clusters.n_duplicates} near-duplicate abstracts take the topics of "
+        f"{len(clusters.clusters())} representatives",
+        file=sys.stderr,
+    )
+    return clusters.expand(doc_topic_matrix)
+
+
+def _add_dedup_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument(
+        "--dedup-max-shingle-df",
+        type=float,
+        default=0.5,
+        help="with --dedup-threshold, ignore the shingles in more than this fraction "
+        "of the abstracts, e.g. the NSF boilerplate (1 keeps them all)",
+    )
+
+
+def _add_dataset_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--num-workers", type=int, default=1)
+    parser.add_argument("--cache-path", default=None, help="columnar cache file")
+    parser.add_argument("--clean-cache", default=None, help="SQLite cleaned cache")
+
+
+def _open_dataset(args: argparse.Namespace, clean):
+    from pipeline.clean_cache import CleanedAbstractCache
+    from pipeline.dataloader import AbstractNarrationDataset
+
+    return AbstractNarrationDataset(
+        args.dataset,
+        clean,
+        cache_path=args.cache_path,
+        num_workers=args.num_workers,
+        clean_cache=(
+            CleanedAbstractCache(args.clean_cache) if args.clean_cache else None
+        ),
+    )
+
+
+if __name__ == "__main__":
+    main()
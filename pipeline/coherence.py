@@ -0,0 +1,208 @@
+"""Module to measure the coherence of the topics of a model (UMass, NPMI and C_v)."""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from pipeline.topics import top_word_indices
+
+COHERENCE_MEASURES = ("umass", "npmi", "c_v")
+# added to the probabilities of the pairs of words that never appear together
+EPSILON = 1e-12
+
+
+# class with the amount of documents where every pair of words appears, computed
+# from the binarized document-term matrix only for the words that are asked, and
+# kept to be reused by every measure and every model of the same matrix
+class WordCooccurrence:
+    def __init__(self, document_term_matrix):
+        # the documents are the context of the words, a word appears or not
+        self.present = sparse.csc_matrix(document_term_matrix, dtype=np.float64)
+        self.present.data[:] = 1
+        self.present.eliminate_zeros()
+        self.n_documents = self.present.shape[0]
+        # the words with counts, their position in the counts and the counts
+        self.words = np.empty(0, dtype=np.int64)
+        self.__positions = {}
+        self.__counts = np.empty((0, 0))
+
+    def counts(self, top_words: np.ndarray) -> np.ndarray:
+        """
+        Get the amount of documents where every pair of the top words of every topic
+        appears, the diagonal is the amount of documents of every word
+
+        Arguments:
+            top_words:
+                An array with shape (topics, n) with the columns of the words.
+
+        Returns:
+            An array with shape (topics, n, n).
+        """
+        top_words = np.asarray(top_words, dtype=np.int64)
+        self.__add_words(np.unique(top_words))
+        positions = np.vectorize(self.__positions.get, otypes=[np.int64])(top_words)
+        if positions.size == 0:
+            return np.zeros(top_words.shape + top_words.shape[-1:])
+        return self.__counts[positions[:, :, np.newaxis], positions[:, np.newaxis, :]]
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __add_words(self, words: np.ndarray):
+        new_words = np.setdiff1d(words, self.words)
+        if not len(new_words):
+            return
+        # only the products of the new words with every word are computed
+        words = np.concatenate([self.words, new_words])
+        new_present = self.present[:, new_words]
+        new_counts = (new_present.T @ self.present[:, words]).toarray()
+        counts = np.zeros((len(words), len(words)))
+        n_old = len(self.words)
+        counts[:n_old, :n_old] = self.__counts
+        counts[n_old:, :] = new_counts
+        counts[:n_old, n_old:] = new_counts[:, :n_old].T
+        self.words = words
+        self.__positions = {word: idx for idx, word in enumerate(words.tolist())}
+        self.__counts = counts
+
+
+def umass_coherence(cooccurrence: WordCooccurrence, top_words) -> np.ndarray:
+    """
+    Get the UMass coherence of every topic: the mean of log((D(wi, wj) + 1) / D(wj))
+    over the pairs of top words where wj ranks higher than wi
+
+    Arguments:
+        cooccurrence:
+            The WordCooccurrence of the document-term matrix.
+        top_words:
+            An array with shape (topics, n) with the columns of the words, from the
+            highest weight to the lowest.
+
+    Returns:
+        An array with the coherence of every topic, higher is more coherent.
+    """
+    counts = cooccurrence.counts(top_words)
+    document_frequency = np.diagonal(counts, axis1=1, axis2=2)
+    scores = np.log(
+        (counts + 1) / np.maximum(document_frequency, 1)[:, np.newaxis, :]
+    )
+    return _mean_of_pairs(scores)
+
+
+def npmi_coherence(cooccurrence: WordCooccurrence, top_words) -> np.ndarray:
+    """
+    Get the NPMI coherence of every topic: the mean of the normalized pointwise mutual
+    information of the pairs of top words, with the documents as the context
+
+    Arguments:
+        cooccurrence:
+            The WordCooccurrence of the document-term matrix.
+        top_words:
+            An array with shape (topics, n) with the columns of the words.
+
+    Returns:
+        An array with the coherence of every topic, between -1 and 1.
+    """
+    return _mean_of_pairs(_npmi(cooccurrence.counts(top_words), cooccurrence))
+
+
+def cv_coherence(cooccurrence: WordCooccurrence, top_words) -> np.ndarray:
+    """
+    Get the C_v coherence of every topic: the mean cosine similarity between the NPMI
+    vector of every top word and the sum of the NPMI vectors of the topic
+
+    Arguments:
+        cooccurrence:
+            The WordCooccurrence of the document-term matrix.
+        top_words:
+            An array with shape (topics, n) with the columns of the words.
+
+    Returns:
+        An array with the coherence of every topic, between 0 and 1 for most topics.
+    """
+    npmi = _npmi(cooccurrence.counts(top_words), cooccurrence)
+    topic_vectors = npmi.sum(axis=1, keepdims=True)
+    norms = np.linalg.norm(npmi, axis=2) * np.linalg.norm(topic_vectors, axis=2)
+    similarity = (npmi * topic_vectors).sum(axis=2) / np.maximum(norms, EPSILON)
+    return similarity.mean(axis=1)
+
+
+def topic_coherence(
+    cooccurrence: WordCooccurrence, top_words, measures=COHERENCE_MEASURES
+) -> pd.DataFrame:
+    """
+    Get the coherence measures of every topic, sharing the counts of the words
+
+    Arguments:
+        cooccurrence:
+            The WordCooccurrence of the document-term matrix.
+        top_words:
+            An array with shape (topics, n) with the columns of the words.
+        measures:
+            The names of the measures, some of COHERENCE_MEASURES.
+
+    Returns:
+        A DataFrame with a row per topic and a column per measure.
+    """
+    functions = {
+        "umass": umass_coherence,
+        "npmi": npmi_coherence,
+        "c_v": cv_coherence,
+    }
+    unknown = set(measures) - set(functions)
+    if unknown:
+        raise ValueError(f"Unknown coherence measures: {sorted(unknown)}")
+    return pd.DataFrame(
+        {measure: functions[measure](cooccurrence, top_words) for measure in measures}
+    )
+
+
+def model_coherence(
+    components: np.ndarray,
+    cooccurrence: WordCooccurrence,
+    n: int = 10,
+    measures=COHERENCE_MEASURES,
+) -> dict:
+    """
+    Get the mean coherence of the topics of a model, with its top n words
+
+    Arguments:
+        components:
+            The weight of every word in every topic, e.g. lda_model.components_.
+        cooccurrence:
+            The WordCooccurrence of the document-term matrix of the model.
+        n:
+            The amount of top words of every topic.
+        measures:
+            The names of the measures, some of COHERENCE_MEASURES.
+
+    Returns:
+        A dictionary with the mean of every measure over the topics.
+    """
+    top_words = top_word_indices(components, n)
+    coherence = topic_coherence(cooccurrence, top_words, measures)
+    return {measure: float(coherence[measure].mean()) for measure in measures}
+
+
+def _npmi(counts: np.ndarray, cooccurrence: WordCooccurrence) -> np.ndarray:
+    probability = counts / max(cooccurrence.n_documents, 1)
+    word_probability = np.diagonal(probability, axis1=1, axis2=2)
+    joint = probability + EPSILON
+    pmi = np.log(
+        joint
+        / np.maximum(
+            word_probability[:, :, np.newaxis] * word_probability[:, np.newaxis, :],
+            EPSILON,
+        )
+    )
+    return pmi / -np.log(joint)
+
+
+def _mean_of_pairs(scores: np.ndarray) -> np.ndarray:
+    # the pairs (i, j) with j ranked before i, the lower triangle without diagonal
+    n = scores.shape[-1]
+    if n < 2:
+        return np.zeros(scores.shape[0])
+    rows, columns = np.tril_indices(n, k=-1)
+    return scores[:, rows, columns].mean(axis=1)
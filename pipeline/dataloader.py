@@ -1,24 +1,83 @@
 """Module for loading data from the dataset."""
 
+import copy
+import hashlib
+import json
+import logging
 import re
-import xmltodict
-import os
-import nltk
-from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from nltk.stem import WordNetLemmatizer
+from functools import lru_cache, partial
+
+from pipeline import instrumentation, resources
+from pipeline.extractor import (
+    METADATA_FIELDS,
+    RECORD_FIELDS,
+    StreamingAwardExtractor,
+)
+from pipeline.parallel import FileProcessingError, map_in_chunks
+from pipeline.prefetch import PrefetchingSource
+from pipeline.sources import open_source
+
+# NLTK, NumPy, xmltodict and SQLite are imported the first time they are needed, so
+# importing this module is fast and has no side effects
+
+
+# regular expressions used to clean the abstracts, compiled once
+URLS_PATTERN = re.compile(r"http\S+")
+WEBSITES_PATTERN = re.compile(r"www\S+")
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s-]")
+HYPHENS_PATTERN = re.compile(r"-+")
+# stop words found in the EDA that are added to the english ones
+CUSTOM_STOP_WORDS = ["project", "research", "using", "support", "impact", "student"]
+# version of the cleaning rules, it changes the fingerprint of every CleanAbstract
+CLEAN_RULES_VERSION = 1
+
+logger = logging.getLogger(__name__)
 
 
 # class that clean the abstract
 class CleanAbstract:
-    def __init__(self, lemmatize: bool = False):
+    def __init__(
+        self,
+        lemmatize: bool = False,
+        lemma_cache_size: int = 2**17,
+        custom_stop_words: list = CUSTOM_STOP_WORDS,
+    ):
         self.lemmatize = lemmatize
-        # Initialize NLTK resources
-        nltk.download("punkt")
-        nltk.download("stopwords")
-        if self.lemmatize:
-            # Initialize NLTK resources
-            nltk.download("wordnet")
+        self.lemma_cache_size = lemma_cache_size
+        self.custom_stop_words = list(custom_stop_words)
+        # the NLTK resources are read from the local data paths the first time they are
+        # used, see pipeline.resources
+        self.__stop_words = None
+        self.__lemmatize_word = None
+        self.__fingerprint = None
+
+    def __getstate__(self):
+        # the loaded resources are not sent to other processes, they load their own
+        state = self.__dict__.copy()
+        state["_CleanAbstract__stop_words"] = None
+        state["_CleanAbstract__lemmatize_word"] = None
+        return state
+
+    def fingerprint(self) -> str:
+        """
+        Get a hash of everything that changes the output of clean_abstract: the
+        cleaning rules, the lemmatize flag, the stop words, and the versions of NLTK and
+        of the WordNet data when lemmatizing
+
+        Returns:
+            A string with the hexadecimal hash of the configuration.
+        """
+        if self.__fingerprint is None:
+            configuration = {
+                "rules": CLEAN_RULES_VERSION,
+                "lemmatize": self.lemmatize,
+                "stop_words": sorted(self.stop_words),
+                **resources.nltk_versions(self.lemmatize),
+            }
+            self.__fingerprint = hashlib.sha256(
+                json.dumps(configuration).encode("utf-8")
+            ).hexdigest()
+        return self.__fingerprint
 
     def clean_abstract(self, abstract: str) -> str:
         """
@@ -38,39 +97,86 @@ class CleanAbstract:
         Returns:
             A string with the abstract cleaned.
         """
+        return " ".join(self.filter_words(self.tokenize(abstract)))
 
-        abstract = abstract.lower()
-        abstract = abstract.replace("&lt;br/&gt;", "")
-        abstract = re.sub(r"http\S+", "", abstract)
-        # removing the websites
-        abstract = re.sub(r"www\S+", "", abstract)
-        # drop the punctuation except the - character when appears between two words
-        abstract = re.sub(r"[^\w\s-]", "", abstract)
-        # reduce -- to -
-        abstract = re.sub(r"-+", "-", abstract)
-
-        # clean the hyphen words
-        words = word_tokenize(abstract)
-        words = [self.clean_hyphen_words(word) for word in words]
-        abstract = " ".join(words)
-
-        words = word_tokenize(abstract)
-        words = [word for word in words if word.isalnum()]
-        stop_words = set(stopwords.words("english"))
-        # add special stop words
-        stop_words.update(
-            ["project", "research", "using", "support", "impact", "student"]
-        )
-        if self.lemmatize:
-            lemmatizer = WordNetLemmatizer()
-            cleaned_abstract = [
-                lemmatizer.lemmatize(word)
-                for word in words
-                if word.isalnum() and lemmatizer.lemmatize(word) not in stop_words
-            ]
-        else:
-            cleaned_abstract = [word for word in words if word not in stop_words]
-        return " ".join(cleaned_abstract)
+    def clean_batch(self, abstracts) -> list:
+        """
+        Clean several abstracts, loading the stop words and the lemmatizer once
+
+        Arguments:
+            abstracts:
+                An iterable with the abstracts to clean.
+
+        Returns:
+            A list with the abstracts cleaned, in the same order.
+        """
+        tokenize, filter_words = self.tokenize, self.filter_words
+        return [" ".join(filter_words(tokenize(abstract))) for abstract in abstracts]
+
+    def tokenize(self, abstract: str) -> list:
+        """
+        Apply the first steps of clean_abstract (lowercase, &lt;br/&gt;, URLs,
+        punctuation and hyphen words) and split the abstract in words. The abstract is
+        tokenized once, only the words with hyphens are tokenized again after being
+        cleaned, which gives the same words as tokenizing the whole text twice.
+
+        Arguments:
+            abstract:
+                The abstract to tokenize.
+
+        Returns:
+            A list with the alphanumeric words of the abstract.
+        """
+        with instrumentation.timer("clean.tokenize"):
+            return self.__tokenize(abstract)
+
+    def filter_words(self, words: list, lemmatize: bool = None) -> list:
+        """
+        Apply the last steps of clean_abstract to the words given by tokenize: removing
+        the stop words and lemmatizing the words if lemmatize is True
+
+        Arguments:
+            words:
+                The words of the abstract.
+            lemmatize:
+                Overrides the lemmatize attribute, so the same words can be filtered
+                with and without lemmatizing.
+
+        Returns:
+            A list with the words that are kept.
+        """
+        stop_words = self.stop_words
+        if self.lemmatize if lemmatize is None else lemmatize:
+            lemmatize_word = self.lemmatize_word
+            with instrumentation.timer("clean.lemmatize"):
+                words = [lemmatize_word(word) for word in words]
+        with instrumentation.timer("clean.stop_words"):
+            kept_words = [word for word in words if word not in stop_words]
+        instrumentation.count("tokens_in", len(words))
+        instrumentation.count("tokens_out", len(kept_words))
+        return kept_words
+
+    @property
+    def stop_words(self) -> set:
+        """
+        The english stop words plus the custom stop words, loaded once
+        """
+        if self.__stop_words is None:
+            self.__stop_words = set(resources.english_stop_words())
+            # add special stop words
+            self.__stop_words.update(self.custom_stop_words)
+        return self.__stop_words
+
+    @property
+    def lemmatize_word(self):
+        """
+        The WordNet lemmatizer of a word, memoized in a cache of lemma_cache_size words
+        """
+        if self.__lemmatize_word is None:
+            self.__lemmatize_word = lru_cache(maxsize=self.lemma_cache_size)(
+                resources.wordnet_lemmatizer().lemmatize
+            )
+        return self.__lemmatize_word
 
     @staticmethod
     def clean_hyphen_words(word: str) -> str:
@@ -104,30 +210,307 @@ class CleanAbstract:
         )
         return word
 
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __tokenize(self, abstract: str) -> list:
+        abstract = abstract.lower()
+        abstract = abstract.replace("&lt;br/&gt;", "")
+        abstract = URLS_PATTERN.sub("", abstract)
+        # removing the websites
+        abstract = WEBSITES_PATTERN.sub("", abstract)
+        # drop the punctuation except the - character when appears between two words
+        abstract = PUNCTUATION_PATTERN.sub("", abstract)
+        # reduce -- to -
+        abstract = HYPHENS_PATTERN.sub("-", abstract)
+
+        # clean the hyphen words, the other words are not changed by the cleaning. A
+        # cleaned word only has letters, digits and spaces, so it is a single sentence
+        # and the word tokenizer can be applied without splitting sentences
+        words = []
+        word_tokenizer = resources.word_tokenizer()
+        for word in resources.word_tokenize(abstract):
+            if "-" in word:
+                words.extend(word_tokenizer.tokenize(self.clean_hyphen_words(word)))
+            else:
+                words.append(word)
+        return [word for word in words if word.isalnum()]
+
 
 # class that will be used to load the dataset
 class AbstractNarrationDataset:
-    def __init__(self, dataset_folder: str, clean: CleanAbstract = CleanAbstract()):
+    def __init__(
+        self,
+        dataset_folder: str,
+        clean: CleanAbstract = CleanAbstract(),
+        cache_path: str = None,
+        num_workers: int = 1,
+        chunk_size: int = 64,
+        prefetch: int = 0,
+        io_workers: int = 8,
+        clean_cache: "CleanedAbstractCache" = None,
+    ):
         self.dataset_folder = dataset_folder
-        # get the list of files in the dataset folder that ends with .xml
-        self.files = [f for f in os.listdir(dataset_folder) if f.endswith(".xml")]
+        # the folder, zip archive or list of them where the XML files are read from
+        self.source = open_source(dataset_folder)
+        # in this process the files are read ahead by io_workers threads when prefetch
+        # is the amount of files to read ahead, which hides the latency of the storage
+        self.reader = self.source
+        if prefetch:
+            self.reader = PrefetchingSource(self.source, prefetch, io_workers)
+        # index of the last abstract read, the files are read ahead only when the
+        # abstracts are read in order
+        self.__last_idx = -1
+        # parsing and cleaning run in a process pool when num_workers > 1
+        self.num_workers = num_workers
+        self.chunk_size = chunk_size
+        # errors found reading the files, the files with errors are excluded
+        self.errors = {}
+        # only the fields used by the dataset are read from the XML files
+        self.record_extractor = StreamingAwardExtractor(RECORD_FIELDS)
+        self.abstract_extractor = StreamingAwardExtractor(["AbstractNarration"])
+        self.metadata_extractor = StreamingAwardExtractor(METADATA_FIELDS)
+        # get the list of files in the dataset source that ends with .xml
+        with instrumentation.timer("discovery"):
+            self.files = self.source.list_files()
+        instrumentation.count("files_scanned", len(self.files))
+        # keep the extracted fields of every file in the columnar cache
+        self.cache = None
+        if cache_path:
+            from pipeline.cache import AwardRecordCache
+
+            self.cache = AwardRecordCache(cache_path)
+            self.cache.sync(self.source, self.files, self.__read_award_records)
         # exclude from the dataset the files that do not have the AbstractNarration
-        self.__exclude_files_without_abstract_narration()
+        with instrumentation.timer("exclusion_scan"):
+            self.__exclude_files_without_abstract_narration()
         self.clean = clean
+        # the cleaned abstracts are read from this cache when they were cleaned before
+        # with the same configuration of the cleaner
+        self.clean_cache = clean_cache
+        # table with the metadata of the awards, built the first time it is used
+        self.__metadata = None
 
     def __len__(self):
         return len(self.files)
 
+    def __iter__(self):
+        yield from self.map(self.__clean_function())
+
     def __getitem__(self, idx):
-        file_name = self.files[idx]
-        file_path = os.path.join(self.dataset_folder, file_name)
-        file_dict = self.get_xml_as_dict(file_path)
-        award_info = self.get_award_info_from_dict(file_dict)
-        abstract = award_info["AbstractNarration"]
+        abstract = self.get_abstract(idx)
         if self.clean:
-            abstract = self.clean.clean_abstract(abstract)
+            abstract = self.__clean_function()(abstract)
         return abstract
 
+    def map(self, function=None):
+        """
+        Apply a function to the abstract (without cleaning) of every file, in the order
+        of the files. The function runs in the process pool when num_workers > 1, so it
+        must be picklable in that case.
+
+        Arguments:
+            function:
+                The function that receives the abstract, None yields the abstracts.
+
+        Returns:
+            A generator with the result of the function for every file.
+
+        Raises:
+            FileProcessingError: If a file cannot be read or the function fails.
+        """
+        if self.num_workers <= 1:
+            # the errors are raised as in the process pool, whatever num_workers is
+            for idx, file_name in enumerate(self.files):
+                try:
+                    abstract = self.get_abstract(idx)
+                    result = function(abstract) if function else abstract
+                except Exception as error:
+                    message = f"{type(error).__name__}: {error}"
+                    raise FileProcessingError(file_name, message) from error
+                yield result
+            return
+        if self.cache is not None:
+            # the abstracts are already in memory, only the function goes to the pool
+            items = (self.cache.get(f, "AbstractNarration") for f in self.files)
+            if not function:
+                yield from items
+                return
+        else:
+            items = self.files
+            function = partial(
+                _read_abstract, self.abstract_extractor, self.source, function
+            )
+        results = map_in_chunks(function, items, self.num_workers, self.chunk_size)
+        for file_name, (result, error) in zip(self.files, results):
+            if error is not None:
+                raise FileProcessingError(file_name, error)
+            yield result
+
+    def get_abstract(self, idx: int) -> str:
+        """
+        Get the AbstractNarration of a file of the dataset without cleaning it
+
+        Arguments:
+            idx:
+                The index of the file in the dataset.
+
+        Returns:
+            A string with the abstract as it is in the XML file.
+        """
+        file_name = self.files[idx]
+        if self.cache is not None:
+            return self.cache.get(file_name, "AbstractNarration")
+        if self.reader is not self.source:
+            # the next files are read ahead when the access is sequential, e.g. in
+            # iteration, a random access does not read files that are not used
+            start = idx if idx >= 0 else len(self) + idx
+            if start == self.__last_idx + 1:
+                self.reader.schedule(self.files[start : start + self.reader.read_ahead])
+            self.__last_idx = start
+        return self.read_abstract(file_name)
+
+    def get_award_record(self, idx: int) -> dict:
+        """
+        Get the award record of a file of the dataset, from the cache when it is enabled
+
+        Arguments:
+            idx:
+                The index of the file in the dataset.
+
+        Returns:
+            A dictionary with the fields in RECORD_FIELDS.
+        """
+        file_name = self.files[idx]
+        if self.cache is not None:
+            return self.cache.get_record(file_name)
+        return self.read_award_record(file_name)
+
+    @property
+    def metadata(self) -> "pd.DataFrame":
+        """
+        The table with the metadata of the awards of the dataset (codes and names of
+        the organization, directorate, division and program elements, dates and
+        amounts), indexed by file and built the first time it is used. It is built from
+        the cache when it is enabled, otherwise every file is parsed again (without its
+        abstract) on top of the exclusion scan of the initialization.
+        """
+        if self.__metadata is None:
+            from pipeline.metadata import build_metadata_table
+
+            self.__metadata = build_metadata_table(
+                self.files, self.__read_metadata_rows()
+            )
+        return self.__metadata
+
+    def where(
+        self,
+        directorate=None,
+        division=None,
+        program_element=None,
+        organization_code=None,
+        year=None,
+        start_date=None,
+        end_date=None,
+        min_amount: float = None,
+        max_amount: float = None,
+    ) -> "AbstractNarrationDataset":
+        """
+        Get the subset of the dataset with the awards that match every predicate, e.g.
+        dataset.where(directorate="GEO", year=2020). The predicates are evaluated on
+        the metadata table, so no abstract is cleaned to select the subset. Without the
+        cache, building the table parses every file of the dataset once more.
+
+        Arguments:
+            directorate:
+                The abbreviation (e.g. GEO) or the long name of the directorate, or a
+                list of them.
+            division:
+                The abbreviation or the long name of the division, or a list of them.
+            program_element:
+                The code of a ProgramElement of the award, or a list of codes.
+            organization_code:
+                The code of the organization, or a list of codes.
+            year:
+                The year of the AwardEffectiveDate, or a list of years.
+            start_date:
+                The first AwardEffectiveDate included, e.g. "2020-01-01".
+            end_date:
+                The last AwardEffectiveDate included.
+            min_amount:
+                The minimum AwardAmount included.
+            max_amount:
+                The maximum AwardAmount included.
+
+        Returns:
+            An AbstractNarrationDataset with the files of the subset, in the same order.
+        """
+        from pipeline.metadata import metadata_mask
+
+        mask = metadata_mask(
+            self.metadata,
+            directorate=directorate,
+            division=division,
+            program_element=program_element,
+            organization_code=organization_code,
+            year=year,
+            start_date=start_date,
+            end_date=end_date,
+            min_amount=min_amount,
+            max_amount=max_amount,
+        )
+        return self.subset([idx for idx, selected in enumerate(mask) if selected])
+
+    def subset(self, indices) -> "AbstractNarrationDataset":
+        """
+        Get a dataset with some files of this one, sharing its source, cache and
+        cleaner
+
+        Arguments:
+            indices:
+                The indices of the files in this dataset.
+
+        Returns:
+            An AbstractNarrationDataset with the files selected, in the order given.
+        """
+        indices = list(indices)
+        dataset = copy.copy(self)
+        dataset.files = [self.files[idx] for idx in indices]
+        dataset.errors = dict(self.errors)
+        dataset.__last_idx = -1
+        if self.__metadata is not None:
+            dataset.__metadata = self.__metadata.iloc[indices]
+        return dataset
+
+    def read_abstract(self, file_name: str) -> str:
+        """
+        Read an XML file of the source and return its AbstractNarration, stopping the
+        reading as soon as the abstract was found
+
+        Arguments:
+            file_name:
+                The name of the XML file in the dataset source.
+
+        Returns:
+            A string with the abstract, or None if the award does not have it.
+        """
+        return _read_abstract(self.abstract_extractor, self.reader, None, file_name)
+
+    def read_award_record(self, file_name: str) -> dict:
+        """
+        Read an XML file of the source and return the award record with the fields in
+        RECORD_FIELDS
+
+        Arguments:
+            file_name:
+                The name of the XML file in the dataset source.
+
+        Returns:
+            A dictionary with the fields in RECORD_FIELDS.
+        """
+        return _read_award_record(self.record_extractor, self.reader, file_name)
+
     # function that reads the XML file and returns a dictionary
     @staticmethod
     def get_xml_as_dict(file_path: str) -> dict:
@@ -142,6 +525,8 @@ class AbstractNarrationDataset:
             A dictionary with the data from the XML file. If the file is not found, it
             returns FileNotFoundError
         """
+        import xmltodict
+
         try:
             # open the file
             with open(file_path, "r") as file:
@@ -151,7 +536,7 @@ class AbstractNarrationDataset:
                 return xmltodict.parse(data)
         # manage error in case the file is not found
         except FileNotFoundError:
-            print(f"File not found: {file_path}")
+            logger.warning("File not found: %s", file_path)
             return None
 
     @staticmethod
@@ -171,23 +556,150 @@ class AbstractNarrationDataset:
             if "Award" in xml_dict["rootTag"]:
                 return xml_dict["rootTag"]["Award"]
             else:
-                print("Award not found")
+                logger.warning("Award not found")
                 return {}
         else:
-            print("rootTag not found")
+            logger.warning("rootTag not found")
             return {}
 
+    @staticmethod
+    def get_award_record_from_dict(award_info: dict) -> dict:
+        """
+        Get the award record from the information about the award. The fields
+        Organization and ProgramElement are kept as JSON strings so both the dict and
+        the list variants of the XML are preserved.
+
+        Arguments:
+            award_info:
+                The dictionary with the information about the award.
+
+        Returns:
+            A dictionary with the fields in RECORD_FIELDS, where the missing fields are
+            None.
+        """
+        record = {}
+        for field in RECORD_FIELDS:
+            value = award_info.get(field)
+            if value is not None and not isinstance(value, str):
+                value = json.dumps(value)
+            record[field] = value
+        return record
+
     ################################
     #       PRIVATE METHODS        #
     ################################
 
     # exclude from the dataset the files that do not have the AbstractNarration
     def __exclude_files_without_abstract_narration(self):
-        self.files = [
-            f
-            for f in self.files
-            if self.get_award_info_from_dict(
-                self.get_xml_as_dict(os.path.join(self.dataset_folder, f))
-            )["AbstractNarration"]
-            is not None
-        ]
+        n_files = len(self.files)
+        if self.cache is not None:
+            self.files = [
+                f
+                for f in self.files
+                if self.cache.get(f, "AbstractNarration") is not None
+            ]
+            instrumentation.count("files_excluded", n_files - len(self.files))
+            return
+        source = self.__scan_source(self.files)
+        function = partial(_read_abstract, self.abstract_extractor, source, None)
+        results = map_in_chunks(function, self.files, self.num_workers, self.chunk_size)
+        files = []
+        for file_name, (abstract, error) in zip(self.files, results):
+            if error is not None:
+                self.__add_error(file_name, error)
+            elif abstract is not None:
+                files.append(file_name)
+        self.files = files
+        instrumentation.count("files_excluded", n_files - len(self.files))
+
+    # read the award records of a list of files, the files with errors get empty records
+    def __read_award_records(self, file_names: list) -> list:
+        function = partial(
+            _read_award_record, self.record_extractor, self.__scan_source(file_names)
+        )
+        results = map_in_chunks(function, file_names, self.num_workers, self.chunk_size)
+        records = []
+        for file_name, (record, error) in zip(file_names, results):
+            if error is not None:
+                self.__add_error(file_name, error)
+                record = dict.fromkeys(RECORD_FIELDS)
+            records.append(record)
+        return records
+
+    # read the rows of the metadata table of the files of the dataset
+    def __read_metadata_rows(self) -> list:
+        from pipeline.metadata import award_metadata_row
+
+        if self.cache is not None:
+            return [award_metadata_row(self.cache.get_record(f)) for f in self.files]
+        function = partial(
+            _read_metadata_row, self.metadata_extractor, self.__scan_source(self.files)
+        )
+        results = map_in_chunks(function, self.files, self.num_workers, self.chunk_size)
+        rows = []
+        for file_name, (row, error) in zip(self.files, results):
+            if error is not None:
+                raise FileProcessingError(file_name, error)
+            rows.append(row)
+        return rows
+
+    # get the function that cleans an abstract, through the cache when it is enabled
+    def __clean_function(self):
+        if not self.clean:
+            return None
+        if self.clean_cache is not None:
+            from pipeline.clean_cache import CachedCleanAbstract
+
+            return CachedCleanAbstract(self.clean, self.clean_cache).clean_abstract
+        return self.clean.clean_abstract
+
+    # get the source used to read the files of a scan; the worker processes read from
+    # the source directly, while this process reads ahead the files of the scan
+    def __scan_source(self, file_names: list):
+        if self.num_workers > 1 or self.reader is self.source:
+            return self.source
+        self.reader.schedule(file_names)
+        return self.reader
+
+    def __add_error(self, file_name: str, error: str):
+        logger.warning("Error reading %s: %s", file_name, error)
+        instrumentation.count("files_with_errors")
+        self.errors[file_name] = error
+
+
+# functions that read one file of the dataset, they are sent to the worker processes
+def _read_award_info(
+    extractor: StreamingAwardExtractor, source, file_name: str
+) -> dict:
+    with source.open(file_name) as file:
+        award_info = extractor.extract(file)
+    if award_info is None:
+        logger.warning("Award not found: %s", file_name)
+        instrumentation.count("awards_not_found")
+        return {}
+    return award_info
+
+
+def _read_abstract(
+    extractor: StreamingAwardExtractor, source, function, file_name: str
+):
+    abstract = _read_award_info(extractor, source, file_name).get("AbstractNarration")
+    if function and abstract is not None:
+        return function(abstract)
+    return abstract
+
+
+def _read_award_record(
+    extractor: StreamingAwardExtractor, source, file_name: str
+) -> dict:
+    return AbstractNarrationDataset.get_award_record_from_dict(
+        _read_award_info(extractor, source, file_name)
+    )
+
+
+def _read_metadata_row(
+    extractor: StreamingAwardExtractor, source, file_name: str
+) -> dict:
+    from pipeline.metadata import award_metadata_row
+
+    return award_metadata_row(_read_award_info(extractor, source, file_name))
@@ -0,0 +1,387 @@
+"""Module to find near-duplicate abstracts with MinHash signatures and LSH banding."""
+
+import zlib
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from pipeline.parallel import chunked
+
+# amount of texts whose shingles are hashed at once by MinHasher.signatures
+SIGNATURE_BATCH_SIZE = 64
+# value of the signature of a text without shingles
+EMPTY_HASH = np.iinfo(np.uint32).max
+
+
+# class that computes the MinHash signatures of texts from their word shingles
+class MinHasher:
+    def __init__(self, num_perm: int = 128, shingle_size: int = 3, seed: int = 0):
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.seed = seed
+        rng = np.random.default_rng(seed)
+        # the coefficients of the multiply-shift hash functions (a * x + b) >> 32, one
+        # per permutation, the products wrap around 64 bits; a is odd
+        self.a = rng.integers(0, 2**63, num_perm, dtype=np.uint64) * 2 + 1
+        self.b = rng.integers(0, 2**63, num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> np.ndarray:
+        """
+        Get the hashes of the shingles of a text: the sequences of shingle_size words.
+        CRC-32 is used instead of hash, so the hashes are the same in every process.
+
+        Arguments:
+            text:
+                The text, e.g. a cleaned abstract.
+
+        Returns:
+            An array with the unique 32-bit hashes of the shingles, a text shorter
+            than a shingle has the hash of the whole text.
+        """
+        words = text.split()
+        size = self.shingle_size
+        shingles = [
+            " ".join(words[idx : idx + size])
+            for idx in range(max(len(words) - size + 1, 1))
+        ]
+        return np.unique(
+            np.fromiter(
+                (zlib.crc32(shingle.encode("utf-8")) for shingle in shingles),
+                dtype=np.uint64,
+                count=len(shingles),
+            )
+        )
+
+    def signature(self, shingles: np.ndarray) -> np.ndarray:
+        """
+        Get the MinHash signature of a set of shingles: the minimum of every hash
+        function over the shingles
+
+        Arguments:
+            shingles:
+                The hashes of the shingles given by shingles.
+
+        Returns:
+            An array of num_perm unsigned integers, the ones of an empty set are the
+            largest value.
+        """
+        return self.__signatures([np.asarray(shingles, dtype=np.uint64)])[0]
+
+    def signatures(self, texts, max_shingle_df: float = None) -> np.ndarray:
+        """
+        Get the MinHash signatures of several texts, the shingles of
+        SIGNATURE_BATCH_SIZE texts are hashed together. The shingles of all the texts
+        are kept in memory only when max_shingle_df needs their frequencies.
+
+        Arguments:
+            texts:
+                An iterable with the texts, e.g. the cleaned abstracts of a dataset.
+            max_shingle_df:
+                If given, the shingles that appear in more than this fraction of the
+                texts are ignored, e.g. the NSF boilerplate at the end of the
+                abstracts, so they do not make different texts look alike.
+
+        Returns:
+            An array with shape (texts, num_perm).
+        """
+        if max_shingle_df is None:
+            signatures = [
+                self.__signatures([self.shingles(text) for text in batch])
+                for batch in chunked(texts, SIGNATURE_BATCH_SIZE)
+            ]
+            if not signatures:
+                return np.empty((0, self.num_perm), dtype=np.uint32)
+            return np.concatenate(signatures)
+        shingle_sets = [self.shingles(text) for text in texts]
+        if shingle_sets:
+            values, counts = np.unique(np.concatenate(shingle_sets), return_counts=True)
+            common = values[counts > max_shingle_df * len(shingle_sets)]
+            if len(common):
+                shingle_sets = [
+                    shingles[~np.isin(shingles, common, assume_unique=True)]
+                    for shingles in shingle_sets
+                ]
+        return self.__signatures(shingle_sets)
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __signatures(self, shingle_sets: list) -> np.ndarray:
+        signatures = np.full((len(shingle_sets), self.num_perm), EMPTY_HASH, np.uint32)
+        for start in range(0, len(shingle_sets), SIGNATURE_BATCH_SIZE):
+            end = min(start + SIGNATURE_BATCH_SIZE, len(shingle_sets))
+            rows = [idx for idx in range(start, end) if len(shingle_sets[idx])]
+            if not rows:
+                continue
+            batch = [shingle_sets[idx] for idx in rows]
+            shingles = np.concatenate(batch)
+            hashes = (np.outer(self.a, shingles) + self.b[:, np.newaxis]) >> 32
+            offsets = np.cumsum([0] + [len(shingles) for shingles in batch[:-1]])
+            # the minimum of every hash function over the shingles of every text
+            signatures[rows] = np.minimum.reduceat(hashes, offsets, axis=1).T
+        return signatures
+
+
+# class with the clusters of near-duplicate documents, every document points to the
+# representative of its cluster: its first document
+class DuplicateClusters:
+    def __init__(self, representative_of: np.ndarray):
+        # the index of the representative of every document
+        self.representative_of = np.asarray(representative_of, dtype=np.int64)
+        # the indices of the representatives, in the order of the documents
+        self.representatives = np.flatnonzero(
+            self.representative_of == np.arange(len(self.representative_of))
+        )
+        # the position of the representative of every document in representatives
+        self.position_of = np.searchsorted(self.representatives, self.representative_of)
+
+    def __len__(self):
+        return len(self.representative_of)
+
+    @property
+    def n_duplicates(self) -> int:
+        """
+        The amount of documents that are not representatives
+        """
+        return len(self) - len(self.representatives)
+
+    def clusters(self, min_size: int = 2) -> list:
+        """
+        Get the documents of every cluster
+
+        Arguments:
+            min_size:
+                The minimum amount of documents of the clusters returned, 1 includes
+                the documents without duplicates.
+
+        Returns:
+            A list with an array of indices per cluster, the representative first.
+        """
+        order = np.argsort(self.position_of, kind="stable")
+        boundaries = np.flatnonzero(np.diff(self.position_of[order])) + 1
+        return [
+            cluster
+            for cluster in np.split(order, boundaries)
+            if len(cluster) >= min_size
+        ]
+
+    def expand(self, values):
+        """
+        Give every document the value computed for its representative, e.g. the topic
+        distribution of the representatives given by a model
+
+        Arguments:
+            values:
+                An array with a row per representative, in the order of
+                representatives.
+
+        Returns:
+            An array with a row per document.
+        """
+        return np.asarray(values)[self.position_of]
+
+    def to_dict(self) -> dict:
+        """
+        Get a summary of the clusters, e.g. to store it in a manifest
+
+        Returns:
+            A dictionary with the amount of documents, representatives and clusters.
+        """
+        return {
+            "documents": len(self),
+            "representatives": len(self.representatives),
+            "duplicates": self.n_duplicates,
+            "clusters": len(self.clusters()),
+        }
+
+
+def optimal_bands(
+    threshold: float, num_perm: int, false_positive_weight: float = 0.1
+) -> tuple:
+    """
+    Choose the bands and rows of the LSH that minimize the weighted sum of the
+    probabilities of a false positive below the threshold and of a false negative
+    above it. The candidates are checked with their signatures, so a false positive
+    only costs a comparison and the false negatives weigh more by default.
+
+    Arguments:
+        threshold:
+            The Jaccard similarity from which two documents are duplicates.
+        num_perm:
+            The length of the signatures.
+        false_positive_weight:
+            The weight of the false positives, the false negatives weigh one minus it.
+
+    Returns:
+        A tuple (bands, rows) with bands * rows <= num_perm.
+    """
+    similarity = np.linspace(0, 1, 1001)
+    below = similarity <= threshold
+    best, best_error = (1, num_perm), np.inf
+    for bands in range(1, num_perm + 1):
+        rows = num_perm // bands
+        # the probability that two documents share at least a band
+        candidate = 1 - (1 - similarity**rows) ** bands
+        false_positives = _trapezoid(np.where(below, candidate, 0), similarity)
+        false_negatives = _trapezoid(np.where(below, 0, 1 - candidate), similarity)
+        error = (
+            false_positive_weight * false_positives
+            + (1 - false_positive_weight) * false_negatives
+        )
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+def detection_probability(
+    similarity, threshold: float = 0.8, num_perm: int = 128, bands: int = None
+) -> np.ndarray:
+    """
+    Get the expected recall of find_duplicate_clusters for pairs of documents with
+    some Jaccard similarity: the probability that they share a band times the
+    probability that their signatures agree in at least the threshold fraction of
+    their values. The pairs near the threshold are missed about half of the times,
+    since the agreement of the signatures is an estimate of the similarity.
+
+    Arguments:
+        similarity:
+            The Jaccard similarity of the pairs, a number or an array.
+        threshold:
+            The threshold of find_duplicate_clusters.
+        num_perm:
+            The length of the signatures.
+        bands:
+            The amount of bands, by default the one of optimal_bands.
+
+    Returns:
+        An array with the probability of every similarity.
+    """
+    from scipy.stats import binom
+
+    if bands is None:
+        bands, rows = optimal_bands(threshold, num_perm)
+    else:
+        rows = num_perm // bands
+    similarity = np.asarray(similarity, dtype=float)
+    candidate = 1 - (1 - similarity**rows) ** bands
+    agreement = binom.sf(np.ceil(threshold * num_perm) - 1, num_perm, similarity)
+    return candidate * agreement
+
+
+def find_duplicate_clusters(
+    signatures: np.ndarray, threshold: float = 0.8, bands: int = None
+) -> DuplicateClusters:
+    """
+    Group the documents whose signatures agree in at least the threshold fraction of
+    their values. Only the documents that share a band of the signature are compared,
+    and each one only with the first document of the band, so the time is about
+    linear in the amount of documents.
+
+    Arguments:
+        signatures:
+            The MinHash signatures, an array with shape (documents, num_perm).
+        threshold:
+            The estimated Jaccard similarity from which two documents are duplicates.
+        bands:
+            The amount of bands of the LSH, by default the one of optimal_bands.
+
+    Returns:
+        A DuplicateClusters with the first document of every cluster as its
+        representative.
+    """
+    n_documents, num_perm = signatures.shape
+    if bands is None:
+        bands, rows = optimal_bands(threshold, num_perm)
+    else:
+        rows = num_perm // bands
+    documents = np.arange(n_documents)
+    pairs = []
+    for band in range(bands):
+        values = np.ascontiguousarray(signatures[:, band * rows : (band + 1) * rows])
+        keys = values.view(np.dtype((np.void, values.dtype.itemsize * rows))).ravel()
+        _, bucket = np.unique(keys, return_inverse=True)
+        # the first document of every bucket, the others are compared with it
+        first = np.full(bucket.max() + 1 if n_documents else 0, n_documents)
+        np.minimum.at(first, bucket, documents)
+        first = first[bucket]
+        candidates = np.flatnonzero(first != documents)
+        agreement = (signatures[candidates] == signatures[first[candidates]]).mean(1)
+        similar = candidates[agreement >= threshold]
+        pairs.append(np.stack([similar, first[similar]]))
+    pairs = np.concatenate(pairs, axis=1) if pairs else np.empty((2, 0), np.int64)
+    graph = sparse.coo_matrix(
+        (np.ones(pairs.shape[1]), (pairs[0], pairs[1])),
+        shape=(n_documents, n_documents),
+    )
+    _, labels = connected_components(graph, directed=False)
+    # the representative of every cluster is its first document
+    first_of_label = np.full(labels.max() + 1 if n_documents else 0, n_documents)
+    np.minimum.at(first_of_label, labels, documents)
+    return DuplicateClusters(first_of_label[labels])
+
+
+def deduplicate(
+    abstracts,
+    threshold: float = 0.8,
+    num_perm: int = 128,
+    shingle_size: int = 3,
+    max_shingle_df: float = None,
+    seed: int = 0,
+) -> DuplicateClusters:
+    """
+    Find the clusters of near-duplicate abstracts
+
+    Arguments:
+        abstracts:
+            An iterable with the cleaned abstracts.
+        threshold:
+            The estimated Jaccard similarity of the shingles from which two abstracts
+            are duplicates.
+        num_perm:
+            The length of the MinHash signatures.
+        shingle_size:
+            The amount of words of every shingle.
+        max_shingle_df:
+            The shingles in more than this fraction of the abstracts are ignored, see
+            MinHasher.signatures.
+        seed:
+            The seed of the hash functions.
+
+    Returns:
+        A DuplicateClusters with a representative per cluster.
+    """
+    hasher = MinHasher(num_perm, shingle_size, seed)
+    signatures = hasher.signatures(abstracts, max_shingle_df)
+    return find_duplicate_clusters(signatures, threshold)
+
+
+def deduplicate_dataset(dataset, abstracts: list = None, **kwargs) -> tuple:
+    """
+    Keep only the representative of every cluster of near-duplicate abstracts of a
+    dataset, e.g. the collaborative awards that share the abstract
+
+    Arguments:
+        dataset:
+            The AbstractNarrationDataset, its abstracts are cleaned with its clean
+            attribute.
+        abstracts:
+            The cleaned abstracts of the dataset when they were already read, so they
+            are not cleaned again, e.g. to train a model with the representatives.
+        **kwargs:
+            The arguments of deduplicate.
+
+    Returns:
+        A tuple (subset, clusters) with the AbstractNarrationDataset of the
+        representatives and the DuplicateClusters that maps every file of the dataset
+        to its representative.
+    """
+    clusters = deduplicate(dataset if abstracts is None else abstracts, **kwargs)
+    return dataset.subset(clusters.representatives), clusters
+
+
+def _trapezoid(y: np.ndarray, x: np.ndarray) -> float:
+    # the trapezoidal rule, np.trapezoid only exists from NumPy 2.0 and np.trapz was
+    # removed after it
+    return float(np.sum((y[1:] + y[:-1]) * np.diff(x)) / 2)
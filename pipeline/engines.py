@@ -0,0 +1,389 @@
+"""Module with the engines that find the topics of a document-term matrix.
+
+Every engine has the same interface, used by TopicModelArtifact: fit and transform a
+matrix of word counts, components_ with the weight of every word in every topic,
+get_params and arrays with what is saved in the artifact, scores with the measures
+stored in the manifest, and restore to rebuild a fitted engine from them.
+"""
+
+import numpy as np
+from scipy import sparse
+from scipy.special import psi
+from sklearn.decomposition import LatentDirichletAllocation
+
+# parameters of the model needed to transform new documents
+LDA_PARAMS = (
+    "n_components",
+    "doc_topic_prior",
+    "topic_word_prior",
+    "learning_method",
+    "learning_decay",
+    "learning_offset",
+    "max_iter",
+    "batch_size",
+    "mean_change_tol",
+    "max_doc_update_iter",
+    "random_state",
+)
+
+
+# class with the LDA model of the notebook, fitted with the online variational Bayes
+# of scikit-learn
+class LdaEngine:
+    name = "lda"
+
+    def __init__(self, model: LatentDirichletAllocation = None, **params):
+        # a model can be given, e.g. one trained with partial_fit
+        self.model = model or LatentDirichletAllocation(
+            **{"learning_method": "online", **params}
+        )
+
+    @property
+    def components_(self) -> np.ndarray:
+        """
+        The weight of every word in every topic, with shape (topics, words)
+        """
+        return self.model.components_
+
+    def fit(self, document_term_matrix) -> "LdaEngine":
+        """
+        Fit the model
+
+        Arguments:
+            document_term_matrix:
+                The word counts of the abstracts.
+
+        Returns:
+            The engine.
+        """
+        self.model.fit(document_term_matrix)
+        return self
+
+    def transform(self, document_term_matrix) -> np.ndarray:
+        """
+        Get the topic distribution of some abstracts
+
+        Arguments:
+            document_term_matrix:
+                The word counts of the abstracts.
+
+        Returns:
+            An array with shape (abstracts, topics) whose rows add up to 1.
+        """
+        return self.model.transform(document_term_matrix)
+
+    def get_params(self) -> dict:
+        """
+        Get the parameters saved in the manifest
+
+        Returns:
+            A dictionary with the parameters of LDA_PARAMS.
+        """
+        return {name: self.model.get_params()[name] for name in LDA_PARAMS}
+
+    def arrays(self) -> dict:
+        """
+        Get the arrays saved in the artifact besides components_
+
+        Returns:
+            An empty dictionary, the components are enough to transform.
+        """
+        return {}
+
+    def scores(self, document_term_matrix) -> dict:
+        """
+        Get the measures of the fit stored in the manifest
+
+        Arguments:
+            document_term_matrix:
+                The word counts the engine was fitted with.
+
+        Returns:
+            A dictionary with the perplexity.
+        """
+        return {"perplexity": float(self.model.perplexity(document_term_matrix))}
+
+    @classmethod
+    def restore(cls, params: dict, components: np.ndarray, arrays: dict):
+        """
+        Rebuild a fitted engine from what save stored, without training anything
+
+        Arguments:
+            params:
+                The parameters returned by get_params.
+            components:
+                The components_ of the engine.
+            arrays:
+                The arrays returned by arrays.
+
+        Returns:
+            An LdaEngine ready to transform.
+        """
+        # the attributes that LatentDirichletAllocation.transform reads after fit
+        model = LatentDirichletAllocation(**params)
+        n_topics = components.shape[0]
+        model.components_ = components
+        model.exp_dirichlet_component_ = np.exp(
+            psi(components) - psi(components.sum(axis=1))[:, np.newaxis]
+        )
+        for name in ("doc_topic_prior", "topic_word_prior"):
+            prior = params[name]
+            setattr(model, f"{name}_", 1.0 / n_topics if prior is None else prior)
+        model.n_features_in_ = components.shape[1]
+        model.n_batch_iter_ = 1
+        model.n_iter_ = 0
+        return cls(model)
+
+
+# class that clusters the abstracts by their meaning: TF-IDF vectors reduced with a
+# randomized truncated SVD (LSA) and grouped with MiniBatchKMeans, the words of every
+# cluster are ranked with c-TF-IDF. The fit takes a fraction of the time of LDA and
+# every abstract gets a soft assignment to the clusters.
+class KMeansEngine:
+    name = "kmeans"
+
+    def __init__(
+        self,
+        n_components: int = 9,
+        svd_components: int = 100,
+        batch_size: int = 4096,
+        n_init: int = 3,
+        temperature: float = 0.05,
+        random_state: int = 0,
+    ):
+        self.n_components = n_components
+        self.svd_components = svd_components
+        self.batch_size = batch_size
+        self.n_init = n_init
+        # the lower it is, the closer the distributions are to the nearest cluster
+        self.temperature = temperature
+        self.random_state = random_state
+        self.idf = None
+        self.svd_components_ = None
+        self.cluster_centers_ = None
+        self.components_ = None
+        self.inertia_ = None
+
+    def fit(self, document_term_matrix) -> "KMeansEngine":
+        """
+        Fit the SVD and the clusters, and rank the words of every cluster
+
+        Arguments:
+            document_term_matrix:
+                The word counts of the abstracts.
+
+        Returns:
+            The engine.
+        """
+        from sklearn.cluster import MiniBatchKMeans
+        from sklearn.decomposition import TruncatedSVD
+
+        document_term_matrix = sparse.csr_matrix(document_term_matrix)
+        n_documents, n_words = document_term_matrix.shape
+        document_frequency = np.bincount(
+            document_term_matrix.indices, minlength=n_words
+        )
+        # the smooth idf of TfidfVectorizer
+        self.idf = np.log((1 + n_documents) / (1 + document_frequency)) + 1
+        tfidf = self.__tfidf(document_term_matrix)
+        svd = TruncatedSVD(
+            max(1, min(self.svd_components, n_words - 1)),
+            algorithm="randomized",
+            random_state=self.random_state,
+        )
+        svd.fit(tfidf)
+        self.svd_components_ = svd.components_.astype(np.float32)
+        reduced = self.__reduce(tfidf)
+        kmeans = MiniBatchKMeans(
+            self.n_components,
+            batch_size=self.batch_size,
+            n_init=self.n_init,
+            random_state=self.random_state,
+        )
+        labels = kmeans.fit_predict(reduced)
+        self.inertia_ = float(kmeans.inertia_)
+        self.cluster_centers_ = _normalize(kmeans.cluster_centers_).astype(np.float32)
+        self.components_ = class_tfidf(document_term_matrix, labels, self.n_components)
+        return self
+
+    def transform(self, document_term_matrix) -> np.ndarray:
+        """
+        Get the soft assignment of some abstracts to the clusters, a softmax of their
+        cosine similarity to the centers
+
+        Arguments:
+            document_term_matrix:
+                The word counts of the abstracts.
+
+        Returns:
+            An array with shape (abstracts, topics) whose rows add up to 1.
+        """
+        reduced = self.__reduce(self.__tfidf(sparse.csr_matrix(document_term_matrix)))
+        logits = (reduced @ self.cluster_centers_.T) / self.temperature
+        logits -= logits.max(axis=1, keepdims=True)
+        weights = np.exp(logits)
+        return weights / weights.sum(axis=1, keepdims=True)
+
+    def get_params(self) -> dict:
+        """
+        Get the parameters saved in the manifest
+
+        Returns:
+            A dictionary with the arguments of the engine.
+        """
+        return {
+            "n_components": self.n_components,
+            "svd_components": self.svd_components,
+            "batch_size": self.batch_size,
+            "n_init": self.n_init,
+            "temperature": self.temperature,
+            "random_state": self.random_state,
+        }
+
+    def arrays(self) -> dict:
+        """
+        Get the arrays saved in the artifact besides components_
+
+        Returns:
+            A dictionary with the idf, the SVD components and the cluster centers.
+        """
+        return {
+            "idf": self.idf,
+            "svd_components": self.svd_components_,
+            "cluster_centers": self.cluster_centers_,
+        }
+
+    def scores(self, document_term_matrix) -> dict:
+        """
+        Get the measures of the fit stored in the manifest
+
+        Arguments:
+            document_term_matrix:
+                The word counts the engine was fitted with.
+
+        Returns:
+            A dictionary with the inertia of the clusters.
+        """
+        return {"inertia": self.inertia_}
+
+    @classmethod
+    def restore(cls, params: dict, components: np.ndarray, arrays: dict):
+        """
+        Rebuild a fitted engine from what save stored, without training anything
+
+        Arguments:
+            params:
+                The parameters returned by get_params.
+            components:
+                The components_ of the engine.
+            arrays:
+                The arrays returned by arrays.
+
+        Returns:
+            A KMeansEngine ready to transform.
+        """
+        engine = cls(**params)
+        engine.components_ = components
+        engine.idf = arrays["idf"]
+        engine.svd_components_ = arrays["svd_components"]
+        engine.cluster_centers_ = arrays["cluster_centers"]
+        return engine
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __tfidf(self, document_term_matrix: sparse.csr_matrix) -> sparse.csr_matrix:
+        # sublinear term frequencies, so the repeated words weigh less
+        tfidf = document_term_matrix.astype(np.float32)
+        tfidf.data = np.log1p(tfidf.data)
+        tfidf = tfidf @ sparse.diags(self.idf.astype(np.float32))
+        return sparse.csr_matrix(_normalize(tfidf))
+
+    def __reduce(self, tfidf: sparse.csr_matrix) -> np.ndarray:
+        return _normalize(np.asarray(tfidf @ self.svd_components_.T))
+
+
+# engines by name, the name is stored in the manifest of the artifact
+ENGINES = {LdaEngine.name: LdaEngine, KMeansEngine.name: KMeansEngine}
+
+
+def make_engine(name: str, n_topics: int = 9, random_state: int = 0, **params):
+    """
+    Create an engine that is not fitted
+
+    Arguments:
+        name:
+            The name of the engine, a key of ENGINES.
+        n_topics:
+            The amount of topics.
+        random_state:
+            The seed of the engine.
+        **params:
+            Other arguments of the engine.
+
+    Returns:
+        An LdaEngine or KMeansEngine.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown topic engine {name}, use {', '.join(ENGINES)}")
+    return ENGINES[name](n_components=n_topics, random_state=random_state, **params)
+
+
+def restore_engine(name: str, params: dict, components: np.ndarray, arrays: dict):
+    """
+    Rebuild a fitted engine saved in an artifact
+
+    Arguments:
+        name:
+            The name of the engine, a key of ENGINES.
+        params:
+            The parameters of the engine.
+        components:
+            The components_ of the engine.
+        arrays:
+            The other arrays of the engine.
+
+    Returns:
+        An LdaEngine or KMeansEngine ready to transform.
+    """
+    if name not in ENGINES:
+        raise ValueError(f"Unknown topic engine {name}, use {', '.join(ENGINES)}")
+    return ENGINES[name].restore(params, components, arrays)
+
+
+def class_tfidf(document_term_matrix, labels: np.ndarray, n_classes: int) -> np.ndarray:
+    """
+    Rank the words of every class with c-TF-IDF: the documents of a class are joined
+    in a single document, and the frequency of every word in the class is weighted by
+    log(1 + average words per class / frequency of the word in all the classes)
+
+    Arguments:
+        document_term_matrix:
+            The word counts of the documents.
+        labels:
+            The class of every document.
+        n_classes:
+            The amount of classes.
+
+    Returns:
+        An array with shape (classes, words) with the weight of every word.
+    """
+    membership = sparse.csr_matrix(
+        (np.ones(len(labels)), (labels, np.arange(len(labels)))),
+        shape=(n_classes, len(labels)),
+    )
+    class_term = np.asarray((membership @ document_term_matrix).todense(), float)
+    words_per_class = class_term.sum(axis=1, keepdims=True)
+    frequency = class_term / np.maximum(words_per_class, 1)
+    idf = np.log(1 + words_per_class.mean() / np.maximum(class_term.sum(axis=0), 1))
+    return frequency * idf
+
+
+def _normalize(matrix):
+    # rows with a norm of 1, the empty rows are kept
+    if sparse.issparse(matrix):
+        norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+        return sparse.diags(1 / np.maximum(norms, 1e-12)) @ matrix
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
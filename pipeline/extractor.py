@@ -0,0 +1,209 @@
+"""Module with the streaming extractor of fields from the award XML files."""
+
+import logging
+from xml.parsers import expat
+
+from pipeline import instrumentation
+
+logger = logging.getLogger(__name__)
+
+# fields of the award that are extracted from every XML file and stored in the cache
+RECORD_FIELDS = (
+    "AwardID",
+    "AbstractNarration",
+    "AwardEffectiveDate",
+    "AwardExpirationDate",
+    "AwardAmount",
+    "AwardTotalIntnAmount",
+    "Organization",
+    "ProgramElement",
+)
+# fields of the award record that describe the award, all of them but the abstract
+METADATA_FIELDS = tuple(
+    field for field in RECORD_FIELDS if field != "AbstractNarration"
+)
+
+
+class _StopParsing(Exception):
+    """Raised inside the expat handlers to stop reading the file."""
+
+
+# class that extracts a set of fields of rootTag/Award without parsing the whole file
+class StreamingAwardExtractor:
+    def __init__(self, fields: list = RECORD_FIELDS, chunk_size: int = 16384):
+        self.fields = tuple(fields)
+        self.chunk_size = chunk_size
+
+    def extract(self, file) -> dict:
+        """
+        Read the XML of an award and return the fields selected, with the same
+        structure that xmltodict produces for them (text elements as strings, empty
+        elements as None, nested elements as dictionaries and repeated elements as
+        lists). The file is read in chunks and the reading stops once every field was
+        captured.
+
+        Arguments:
+            file:
+                The path to the XML file, or a binary file object.
+
+        Returns:
+            A dictionary with the fields found under rootTag/Award, or None if the file
+            does not have the rootTag/Award elements.
+        """
+        return self.__parse(file, False).award_info
+
+    def extract_with_keys(self, file) -> tuple:
+        """
+        Read the XML of an award like extract, and also get the names of all the
+        elements of rootTag/Award. The whole award is read to find them.
+
+        Arguments:
+            file:
+                The path to the XML file, or a binary file object.
+
+        Returns:
+            A tuple with the dictionary of the fields found (None if the file does not
+            have the rootTag/Award elements) and a list with the names of the elements
+            of the award, without repetitions and in the order they appear.
+        """
+        state = self.__parse(file, True)
+        return state.award_info, list(state.keys)
+
+    def get_xml_as_dict(self, file_path: str) -> dict:
+        """
+        Drop-in replacement of AbstractNarrationDataset.get_xml_as_dict that only
+        contains the fields selected
+
+        Arguments:
+            file_path:
+                The path to the XML file to read.
+
+        Returns:
+            A dictionary like {"rootTag": {"Award": {...}}} with the fields selected. If
+            the file is not found, it returns None.
+        """
+        try:
+            award_info = self.extract(file_path)
+        # manage error in case the file is not found
+        except FileNotFoundError:
+            logger.warning("File not found: %s", file_path)
+            return None
+        if award_info is None:
+            return {}
+        return {"rootTag": {"Award": award_info}}
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __parse(self, file, collect_keys: bool) -> "_ExtractionState":
+        if isinstance(file, str):
+            with open(file, "rb") as file_object:
+                return self.__parse(file_object, collect_keys)
+
+        state = _ExtractionState(self.fields, collect_keys)
+        parser = expat.ParserCreate()
+        parser.buffer_text = True
+        parser.StartElementHandler = state.start_element
+        parser.EndElementHandler = state.end_element
+        parser.CharacterDataHandler = state.characters
+        bytes_read = 0
+        with instrumentation.timer("parse"):
+            try:
+                while True:
+                    chunk = file.read(self.chunk_size)
+                    if not chunk:
+                        parser.Parse(b"", True)
+                        break
+                    bytes_read += len(chunk)
+                    parser.Parse(chunk, False)
+            except _StopParsing:
+                pass
+        instrumentation.count("files_parsed")
+        instrumentation.count("bytes_read", bytes_read)
+        return state
+
+
+# class that keeps the state of the expat handlers while a file is parsed
+class _ExtractionState:
+    def __init__(self, fields: tuple, collect_keys: bool = False):
+        self.fields = frozenset(fields)
+        self.collect_keys = collect_keys
+        self.keys = {}
+        self.award_info = None
+        self.path = []
+        # stack of (item, data) of the elements being captured, as xmltodict does
+        self.stack = []
+        self.item = None
+        self.data = []
+        self.seen = set()
+        self.last_field = None
+        self.capturing = False
+
+    def start_element(self, name: str, attrs: dict):
+        depth = len(self.path)
+        self.path.append(name)
+        if depth == 1 and self.path == ["rootTag", "Award"]:
+            self.award_info = {}
+        elif depth == 2 and self.award_info is not None:
+            self.keys[name] = None
+            # the selected fields are contiguous, so once all of them were captured
+            # the next different element means there is nothing more to read
+            if (
+                name != self.last_field
+                and len(self.seen) == len(self.fields)
+                and not self.collect_keys
+            ):
+                raise _StopParsing()
+            if name in self.fields:
+                self.seen.add(name)
+                self.last_field = name
+                self.item, self.data = None, []
+        self.capturing = depth >= 2 and self.last_field == self.path[2]
+        if self.capturing:
+            if depth > 2:
+                self.stack.append((self.item, self.data))
+                self.item, self.data = None, []
+            if attrs:
+                self.item = {f"@{key}": value for key, value in attrs.items()}
+
+    def characters(self, data: str):
+        if self.capturing:
+            self.data.append(data)
+
+    def end_element(self, name: str):
+        depth = len(self.path) - 1
+        if depth == 1 and self.award_info is not None:
+            raise _StopParsing()
+        if depth >= 2 and self.last_field == self.path[2]:
+            item, data = self.item, "".join(self.data).strip() or None
+            if depth > 2:
+                self.item, self.data = self.stack.pop()
+                self.item = _push_data(self.item, name, _element_value(item, data))
+            else:
+                _push_data(self.award_info, name, _element_value(item, data))
+                self.item, self.data = None, []
+        self.path.pop()
+        self.capturing = len(self.path) > 2 and self.last_field == self.path[2]
+
+
+def _element_value(item: dict, data: str):
+    if item is None:
+        return data
+    if data:
+        item["#text"] = data
+    return item
+
+
+def _push_data(item: dict, key: str, data) -> dict:
+    if item is None:
+        item = {}
+    if key in item:
+        value = item[key]
+        if isinstance(value, list):
+            value.append(data)
+        else:
+            item[key] = [value, data]
+    else:
+        item[key] = data
+    return item
@@ -0,0 +1,261 @@
+"""Module with the timers and counters of the stages of the pipeline.
+
+The instrumentation is disabled by default and then every timer and counter returns
+at once. It is enabled with enable() or with the environment variable
+NFS_PIPELINE_METRICS=1, and the metrics are exported with to_json or to_prometheus.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+
+# prefix of the names of the metrics in the Prometheus format
+PROMETHEUS_PREFIX = "nfs_pipeline"
+
+
+# class with the context manager returned by timer when the instrumentation is
+# disabled, it does nothing
+class _NullTimer:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+# class that measures the time of a block and adds it to the metrics of a stage
+class _StageTimer:
+    def __init__(self, metrics: "PipelineMetrics", stage: str):
+        self.metrics = metrics
+        self.stage = stage
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+# class that accumulates the time of every stage and the counters of the pipeline
+class PipelineMetrics:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        # function called with (stage, seconds) every time a stage finishes
+        self.profile_hook = None
+        # seconds, calls and maximum seconds of every stage
+        self.stages = {}
+        self.counters = {}
+        self.__lock = threading.Lock()
+
+    def timer(self, stage: str):
+        """
+        Get a context manager that adds the time of its block to a stage
+
+        Arguments:
+            stage:
+                The name of the stage, e.g. "parse" or "clean.tokenize".
+
+        Returns:
+            A context manager, it does nothing when the metrics are disabled.
+        """
+        if not self.enabled:
+            return _NULL_TIMER
+        return _StageTimer(self, stage)
+
+    def add_time(self, stage: str, seconds: float, calls: int = 1):
+        """
+        Add the time of some calls to a stage
+
+        Arguments:
+            stage:
+                The name of the stage.
+            seconds:
+                The time of the calls.
+            calls:
+                The amount of calls.
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            total, count, maximum = self.stages.get(stage, (0.0, 0, 0.0))
+            self.stages[stage] = (total + seconds, count + calls, max(maximum, seconds))
+        if self.profile_hook is not None:
+            self.profile_hook(stage, seconds)
+
+    def count(self, name: str, value: int = 1):
+        """
+        Add a value to a counter
+
+        Arguments:
+            name:
+                The name of the counter, e.g. "files_scanned".
+            value:
+                The value to add.
+        """
+        if not self.enabled:
+            return
+        with self.__lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def snapshot(self) -> dict:
+        """
+        Get a copy of the metrics
+
+        Returns:
+            A dictionary with the stages (seconds, calls and max_seconds of each) and
+            the counters.
+        """
+        with self.__lock:
+            return {
+                "stages": {
+                    stage: {"seconds": total, "calls": count, "max_seconds": maximum}
+                    for stage, (total, count, maximum) in sorted(self.stages.items())
+                },
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+    def merge(self, snapshot: dict):
+        """
+        Add the metrics of a snapshot, e.g. the ones measured in a worker process
+
+        Arguments:
+            snapshot:
+                A dictionary returned by snapshot.
+        """
+        with self.__lock:
+            for stage, values in snapshot["stages"].items():
+                total, count, maximum = self.stages.get(stage, (0.0, 0, 0.0))
+                self.stages[stage] = (
+                    total + values["seconds"],
+                    count + values["calls"],
+                    max(maximum, values["max_seconds"]),
+                )
+            for name, value in snapshot["counters"].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+
+    def reset(self):
+        """
+        Remove every measure
+        """
+        with self.__lock:
+            self.stages = {}
+            self.counters = {}
+
+    def to_json(self) -> str:
+        """
+        Export the metrics as JSON
+
+        Returns:
+            A string with the JSON of snapshot.
+        """
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self, prefix: str = PROMETHEUS_PREFIX) -> str:
+        """
+        Export the metrics in the text format of Prometheus
+
+        Arguments:
+            prefix:
+                The prefix of the names of the metrics.
+
+        Returns:
+            A string with a counter per metric, the stages are a label.
+        """
+        snapshot = self.snapshot()
+        lines = []
+        for metric, key, help_text in (
+            ("stage_seconds_total", "seconds", "Time spent in every stage"),
+            ("stage_calls_total", "calls", "Times every stage ran"),
+            ("stage_max_seconds", "max_seconds", "Longest run of every stage"),
+        ):
+            metric_type = "gauge" if metric == "stage_max_seconds" else "counter"
+            lines += [
+                f"# HELP {prefix}_{metric} {help_text}",
+                f"# TYPE {prefix}_{metric} {metric_type}",
+            ]
+            for stage, values in snapshot["stages"].items():
+                lines.append(f'{prefix}_{metric}{{stage="{stage}"}} {values[key]}')
+        for name, value in snapshot["counters"].items():
+            metric = f"{prefix}_{_metric_name(name)}_total"
+            lines += [f"# TYPE {metric} counter", f"{metric} {value}"]
+        return "\n".join(lines) + "\n"
+
+
+# the metrics of this process, used by every module of the pipeline
+METRICS = PipelineMetrics(os.environ.get("NFS_PIPELINE_METRICS", "") not in ("", "0"))
+
+
+def enable(profile_hook=None):
+    """
+    Start measuring the stages of the pipeline
+
+    Arguments:
+        profile_hook:
+            Optional function called with (stage, seconds) every time a stage
+            finishes, e.g. to send the spans to a tracer or to log the slow ones.
+    """
+    METRICS.enabled = True
+    METRICS.profile_hook = profile_hook
+
+
+def disable():
+    """
+    Stop measuring the stages of the pipeline, the metrics are kept
+    """
+    METRICS.enabled = False
+    METRICS.profile_hook = None
+
+
+def timer(stage: str):
+    """
+    Get a context manager that adds the time of its block to a stage of METRICS
+
+    Arguments:
+        stage:
+            The name of the stage.
+
+    Returns:
+        A context manager, it does nothing when the metrics are disabled.
+    """
+    return METRICS.timer(stage)
+
+
+def count(name: str, value: int = 1):
+    """
+    Add a value to a counter of METRICS
+
+    Arguments:
+        name:
+            The name of the counter.
+        value:
+            The value to add.
+    """
+    METRICS.count(name, value)
+
+
+def write_metrics(path: str):
+    """
+    Write METRICS to a file, in the Prometheus format when the path ends with .prom
+    and as JSON otherwise
+
+    Arguments:
+        path:
+            The path of the file.
+    """
+    with open(path, "w") as file:
+        if path.endswith(".prom"):
+            file.write(METRICS.to_prometheus())
+        else:
+            file.write(METRICS.to_json())
+
+
+def _metric_name(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
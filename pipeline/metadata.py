@@ -0,0 +1,182 @@
+"""Module with the table of award metadata used to select subsets of the dataset."""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+from pipeline.aggregate import as_list
+
+# columns of the metadata table, one row per file of the dataset
+METADATA_COLUMNS = (
+    "award_id",
+    "organization_code",
+    "directorate",
+    "directorate_name",
+    "division",
+    "division_name",
+    "program_element_codes",
+    "program_element_names",
+    "effective_date",
+    "expiration_date",
+    "amount",
+    "total_intn_amount",
+)
+# format of the dates of the XML files, e.g. 04/15/2020
+DATE_FORMAT = "%m/%d/%Y"
+
+
+def award_metadata_row(award_info: dict) -> dict:
+    """
+    Get the row of the metadata table of an award
+
+    Arguments:
+        award_info:
+            The fields of the award, either as extracted from the XML file or as an
+            award record, where Organization and ProgramElement are JSON strings.
+
+    Returns:
+        A dictionary with the values of METADATA_COLUMNS, the dates and amounts are
+        still strings.
+    """
+    organizations = as_list(_decode(award_info.get("Organization")))
+    organization = organizations[0] if organizations else {}
+    directorate = organization.get("Directorate") or {}
+    division = organization.get("Division") or {}
+    program_elements = as_list(_decode(award_info.get("ProgramElement")))
+    return {
+        "award_id": award_info.get("AwardID"),
+        "organization_code": organization.get("Code"),
+        "directorate": directorate.get("Abbreviation"),
+        "directorate_name": directorate.get("LongName"),
+        "division": division.get("Abbreviation"),
+        "division_name": division.get("LongName"),
+        "program_element_codes": tuple(
+            element["Code"] for element in program_elements if element.get("Code")
+        ),
+        "program_element_names": tuple(
+            element["Text"] for element in program_elements if element.get("Text")
+        ),
+        "effective_date": award_info.get("AwardEffectiveDate"),
+        "expiration_date": award_info.get("AwardExpirationDate"),
+        "amount": award_info.get("AwardAmount"),
+        "total_intn_amount": award_info.get("AwardTotalIntnAmount"),
+    }
+
+
+def build_metadata_table(files: list, rows: list) -> pd.DataFrame:
+    """
+    Build the metadata table of the files of a dataset, with typed columns: the codes
+    and names as categories, the dates as datetimes and the amounts as numbers
+
+    Arguments:
+        files:
+            The names of the files, they are the index of the table.
+        rows:
+            The rows given by award_metadata_row, in the order of the files.
+
+    Returns:
+        A DataFrame with the columns in METADATA_COLUMNS.
+    """
+    table = pd.DataFrame(
+        rows, index=pd.Index(files, name="file"), columns=list(METADATA_COLUMNS)
+    )
+    for column in ("directorate", "directorate_name", "division", "division_name"):
+        table[column] = table[column].astype("category")
+    for column in ("effective_date", "expiration_date"):
+        table[column] = pd.to_datetime(
+            table[column], format=DATE_FORMAT, errors="coerce"
+        )
+    for column in ("amount", "total_intn_amount"):
+        table[column] = pd.to_numeric(table[column], errors="coerce")
+    return table
+
+
+def metadata_mask(
+    table: pd.DataFrame,
+    directorate=None,
+    division=None,
+    program_element=None,
+    organization_code=None,
+    year=None,
+    start_date=None,
+    end_date=None,
+    min_amount: float = None,
+    max_amount: float = None,
+) -> np.ndarray:
+    """
+    Evaluate the predicates of a subset on the metadata table. The predicates that are
+    None are not applied, and the ones that accept several values match any of them.
+
+    Arguments:
+        table:
+            The table given by build_metadata_table.
+        directorate:
+            The abbreviation (e.g. GEO) or the long name of the directorate, or a list
+            of them.
+        division:
+            The abbreviation or the long name of the division, or a list of them.
+        program_element:
+            The code of a ProgramElement of the award, or a list of codes.
+        organization_code:
+            The code of the organization, or a list of codes.
+        year:
+            The year of the AwardEffectiveDate, or a list of years.
+        start_date:
+            The first AwardEffectiveDate included, e.g. "2020-01-01".
+        end_date:
+            The last AwardEffectiveDate included.
+        min_amount:
+            The minimum AwardAmount included.
+        max_amount:
+            The maximum AwardAmount included.
+
+    Returns:
+        A boolean array with the rows of the table that match every predicate.
+    """
+    mask = np.ones(len(table), dtype=bool)
+    if directorate is not None:
+        values = _as_values(directorate)
+        mask &= (
+            table["directorate"].isin(values) | table["directorate_name"].isin(values)
+        ).to_numpy()
+    if division is not None:
+        values = _as_values(division)
+        mask &= (
+            table["division"].isin(values) | table["division_name"].isin(values)
+        ).to_numpy()
+    if program_element is not None:
+        values = set(_as_values(program_element))
+        mask &= np.fromiter(
+            (not values.isdisjoint(codes) for codes in table["program_element_codes"]),
+            dtype=bool,
+            count=len(table),
+        )
+    if organization_code is not None:
+        values = _as_values(organization_code)
+        mask &= table["organization_code"].isin(values).to_numpy()
+    if year is not None:
+        years = [int(value) for value in _as_values(year)]
+        mask &= table["effective_date"].dt.year.isin(years).to_numpy()
+    if start_date is not None:
+        mask &= (table["effective_date"] >= pd.Timestamp(start_date)).to_numpy()
+    if end_date is not None:
+        mask &= (table["effective_date"] <= pd.Timestamp(end_date)).to_numpy()
+    if min_amount is not None:
+        mask &= (table["amount"] >= min_amount).to_numpy()
+    if max_amount is not None:
+        mask &= (table["amount"] <= max_amount).to_numpy()
+    return mask
+
+
+def _decode(value):
+    # the award records keep the nested elements as JSON strings
+    if isinstance(value, str):
+        return json.loads(value)
+    return value
+
+
+def _as_values(value) -> list:
+    if isinstance(value, (list, tuple, set)):
+        return [str(item) for item in value]
+    return [str(value)]
@@ -0,0 +1,242 @@
+"""Module with the packed corpus file and the dataset that memory-maps it."""
+
+import json
+import mmap
+import os
+
+import numpy as np
+
+from pipeline.cache import StringColumn
+from pipeline.extractor import METADATA_FIELDS, RECORD_FIELDS
+from pipeline.parallel import map_in_chunks
+
+MAGIC = b"NSFPACK1"
+
+
+def export_packed_corpus(dataset, path: str, variants: dict = None) -> int:
+    """
+    Pack the abstracts of a dataset, their cleaned variants and the metadata of the
+    awards into a single binary file with an offset index, so it can be read with
+    PackedCorpusDataset without parsing or cleaning again.
+
+    Arguments:
+        dataset:
+            The AbstractNarrationDataset to pack, its clean attribute is not used.
+        path:
+            The path of the file to write.
+        variants:
+            A dictionary with the name of every cleaned variant and the CleanAbstract
+            that produces it, e.g. {"clean": CleanAbstract()}. The abstract without
+            cleaning is always stored in the column raw.
+
+    Returns:
+        The amount of abstracts packed.
+    """
+    variants = variants or {}
+    records = [dataset.get_award_record(idx) for idx in range(len(dataset))]
+    raw_abstracts = [record["AbstractNarration"] for record in records]
+    columns = {
+        "file": StringColumn.from_values(dataset.files),
+        "raw": StringColumn.from_values(raw_abstracts),
+    }
+    for name, clean in variants.items():
+        results = map_in_chunks(
+            clean.clean_abstract, raw_abstracts, dataset.num_workers, dataset.chunk_size
+        )
+        cleaned_abstracts = []
+        for file_name, (abstract, error) in zip(dataset.files, results):
+            if error is not None:
+                raise ValueError(f"Error cleaning {file_name}: {error}")
+            cleaned_abstracts.append(abstract)
+        columns[name] = StringColumn.from_values(cleaned_abstracts)
+    # the fields of the award record are stored as metadata, the abstract is raw
+    for field in METADATA_FIELDS:
+        columns[field] = StringColumn.from_values([record[field] for record in records])
+    write_packed_file(path, columns)
+    return len(records)
+
+
+def write_packed_file(path: str, columns: dict):
+    """
+    Write string columns to a packed file. The file has the magic bytes, the length of
+    a JSON header, the header with the position of every array, and the arrays aligned
+    to 8 bytes.
+
+    Arguments:
+        path:
+            The path of the file to write.
+        columns:
+            A dictionary with the name and the StringColumn of every column, all of
+            them with the same amount of rows.
+    """
+    arrays = []
+    header = {"rows": None, "columns": {}}
+    position = 0
+    for name, column in columns.items():
+        header["rows"] = len(column)
+        header["columns"][name] = {}
+        for key in ("offsets", "valid", "data"):
+            array = np.ascontiguousarray(getattr(column, key))
+            header["columns"][name][key] = [position, len(array)]
+            arrays.append(array)
+            position = _align(position + array.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(len(header_bytes).to_bytes(8, "little"))
+        file.write(header_bytes)
+        file.write(b"\0" * (_align(file.tell()) - file.tell()))
+        for array in arrays:
+            file.write(array.tobytes())
+            file.write(b"\0" * (_align(array.nbytes) - array.nbytes))
+    os.replace(temporary_path, path)
+
+
+# class that reads a packed corpus through a read-only memory map
+class PackedCorpusDataset:
+    def __init__(self, path: str, column: str = "raw"):
+        self.path = path
+        self.column = column
+        self.__open()
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.batch(range(*idx.indices(len(self))))
+        if idx < 0:
+            idx += len(self)
+        return self.columns[self.column][idx]
+
+    def __iter__(self):
+        column = self.columns[self.column]
+        for idx in range(len(self)):
+            yield column[idx]
+
+    def __getstate__(self):
+        # the memory map is opened again in other processes, sharing the same pages
+        return {"path": self.path, "column": self.column}
+
+    def __setstate__(self, state: dict):
+        self.path = state["path"]
+        self.column = state["column"]
+        self.__open()
+
+    @property
+    def files(self) -> list:
+        """
+        The names of the files the abstracts were read from
+        """
+        column = self.columns["file"]
+        return [column[idx] for idx in range(len(self))]
+
+    @property
+    def metadata(self) -> "pd.DataFrame":
+        """
+        The table with the metadata of the awards, built from the metadata columns of
+        the file the first time it is used, see AbstractNarrationDataset.metadata
+        """
+        if self.__metadata is None:
+            from pipeline.metadata import award_metadata_row, build_metadata_table
+
+            rows = [
+                award_metadata_row(self.get_award_record(idx))
+                for idx in range(len(self))
+            ]
+            self.__metadata = build_metadata_table(self.files, rows)
+        return self.__metadata
+
+    def batch(self, indices) -> list:
+        """
+        Get the abstracts of several rows
+
+        Arguments:
+            indices:
+                The indices of the rows.
+
+        Returns:
+            A list with the abstracts of the column selected.
+        """
+        column = self.columns[self.column]
+        return [column[idx] for idx in indices]
+
+    def get_bytes(self, idx: int, column: str = None) -> memoryview:
+        """
+        Get the UTF-8 bytes of a value without copying them out of the memory map
+
+        Arguments:
+            idx:
+                The index of the row.
+            column:
+                The column to read, by default the column of the dataset.
+
+        Returns:
+            A memoryview over the mapped file, or None for a missing value.
+        """
+        return self.columns[column or self.column].get_bytes(idx)
+
+    def get_award_record(self, idx: int) -> dict:
+        """
+        Get the award record of a row
+
+        Arguments:
+            idx:
+                The index of the row.
+
+        Returns:
+            A dictionary with the fields in RECORD_FIELDS.
+        """
+        record = {field: self.columns[field][idx] for field in METADATA_FIELDS}
+        record["AbstractNarration"] = self.columns["raw"][idx]
+        return {field: record[field] for field in RECORD_FIELDS}
+
+    def with_column(self, column: str) -> "PackedCorpusDataset":
+        """
+        Get a dataset over another column of the same file, sharing the memory map
+
+        Arguments:
+            column:
+                The name of the column, e.g. raw or the name of a cleaned variant.
+
+        Returns:
+            A PackedCorpusDataset that returns the values of the column.
+        """
+        if column not in self.columns:
+            raise KeyError(f"Column not found in {self.path}: {column}")
+        dataset = object.__new__(PackedCorpusDataset)
+        dataset.__dict__.update(self.__dict__)
+        dataset.column = column
+        return dataset
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __open(self):
+        self.__metadata = None
+        with open(self.path, "rb") as file:
+            self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.__mmap[: len(MAGIC)] != MAGIC:
+            raise ValueError(f"Not a packed corpus file: {self.path}")
+        header_length = int.from_bytes(self.__mmap[8:16], "little")
+        header = json.loads(self.__mmap[16 : 16 + header_length])
+        data_start = _align(16 + header_length)
+        self.rows = header["rows"] or 0
+        self.columns = {}
+        dtypes = {"offsets": np.int64, "valid": bool, "data": np.uint8}
+        for name, positions in header["columns"].items():
+            arrays = {}
+            for key, (position, count) in positions.items():
+                arrays[key] = np.frombuffer(
+                    self.__mmap, dtypes[key], count, data_start + position
+                )
+            self.columns[name] = StringColumn(**arrays)
+        if self.column not in self.columns:
+            raise KeyError(f"Column not found in {self.path}: {self.column}")
+
+
+def _align(position: int) -> int:
+    return (position + 7) // 8 * 8
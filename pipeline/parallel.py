@@ -0,0 +1,110 @@
+"""Module with the helpers to spread the work of the pipeline over a process pool."""
+
+from collections import deque
+from functools import partial
+from itertools import islice
+
+from pipeline import instrumentation
+
+
+# exception raised when a file of the dataset can not be processed
+class FileProcessingError(Exception):
+    def __init__(self, file_name: str, error: str):
+        super().__init__(f"{file_name}: {error}")
+        self.file_name = file_name
+        self.error = error
+
+
+def chunked(items, chunk_size: int):
+    """
+    Split an iterable in lists of chunk_size elements
+
+    Arguments:
+        items:
+            The iterable to split.
+        chunk_size:
+            The amount of elements of every chunk (the last one can be smaller).
+
+    Returns:
+        A generator of lists with the elements of the iterable.
+    """
+    iterator = iter(items)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def map_in_chunks(function, items, num_workers: int = 1, chunk_size: int = 64):
+    """
+    Apply a function to every element of an iterable, in a process pool when
+    num_workers is greater than one. The elements are sent to the workers in chunks and
+    at most a few chunks per worker are in flight, so the memory does not grow with the
+    amount of elements. The results come back in the same order of the elements.
+
+    Arguments:
+        function:
+            The function to apply. It must be picklable when num_workers > 1.
+        items:
+            The elements to process.
+        num_workers:
+            The amount of processes to use, 1 runs everything in this process.
+        chunk_size:
+            The amount of elements sent to a worker at once.
+
+    Returns:
+        A generator of tuples (result, error) for every element, where error is None
+        when the function succeeded and a string with the error otherwise.
+    """
+    if num_workers <= 1:
+        for item in items:
+            yield from _apply_to_chunk(function, [item])
+        return
+
+    # the process pool is only imported when it is used, it takes longer than the rest
+    from concurrent.futures import ProcessPoolExecutor
+
+    # the workers send back the metrics of every chunk when they are enabled
+    measured = instrumentation.METRICS.enabled
+    apply_to_chunk = partial(
+        _apply_to_measured_chunk if measured else _apply_to_chunk, function
+    )
+    with ProcessPoolExecutor(num_workers) as executor:
+        pending = deque()
+        try:
+            for chunk in chunked(items, chunk_size):
+                pending.append(executor.submit(apply_to_chunk, chunk))
+                if len(pending) >= 4 * num_workers:
+                    yield from _chunk_results(pending.popleft(), measured)
+            while pending:
+                yield from _chunk_results(pending.popleft(), measured)
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _chunk_results(future, measured: bool) -> list:
+    if not measured:
+        return future.result()
+    results, snapshot = future.result()
+    instrumentation.METRICS.merge(snapshot)
+    return results
+
+
+def _apply_to_measured_chunk(function, chunk: list) -> tuple:
+    # the metrics of the worker are reset after every chunk, so none is sent twice
+    metrics = instrumentation.METRICS
+    metrics.enabled = True
+    metrics.reset()
+    results = _apply_to_chunk(function, chunk)
+    snapshot = metrics.snapshot()
+    metrics.reset()
+    return results, snapshot
+
+
+def _apply_to_chunk(function, chunk: list) -> list:
+    results = []
+    for item in chunk:
+        try:
+            results.append((function(item), None))
+        except Exception as error:
+            results.append((None, f"{type(error).__name__}: {error}"))
+    return results
@@ -0,0 +1,102 @@
+"""Module with the prefetching reader that hides the latency of the storage."""
+
+import io
+from itertools import islice
+
+
+# class that wraps a source and reads ahead the files that are going to be opened
+class PrefetchingSource:
+    def __init__(self, source, read_ahead: int = 32, io_workers: int = 8):
+        self.source = source
+        self.read_ahead = read_ahead
+        self.io_workers = io_workers
+        self.__executor = None
+        self.__futures = {}
+        self.__upcoming = iter(())
+
+    def list_files(self) -> list:
+        """
+        Get the names of the XML files of the wrapped source
+
+        Returns:
+            A list with the names of the files.
+        """
+        return self.source.list_files()
+
+    def stat(self, file_name: str) -> tuple:
+        """
+        Get the stamp and size of a file of the wrapped source
+
+        Arguments:
+            file_name:
+                The name of the file in the source.
+
+        Returns:
+            A tuple (stamp, size) given by the wrapped source.
+        """
+        return self.source.stat(file_name)
+
+    def schedule(self, file_names):
+        """
+        Announce the files that are going to be opened next, in order. The first
+        read_ahead files start to be read in background threads and the rest are read
+        as the previous ones are opened. Files read ahead that are not in the new
+        window are discarded, so the memory stays bounded.
+
+        Arguments:
+            file_names:
+                An iterable with the names of the files, it is consumed lazily.
+        """
+        self.__upcoming = iter(file_names)
+        window = list(islice(self.__upcoming, self.read_ahead))
+        futures = {}
+        for file_name in window:
+            future = self.__futures.pop(file_name, None)
+            futures[file_name] = future or self.__submit(file_name)
+        for future in self.__futures.values():
+            future.cancel()
+        self.__futures = futures
+
+    def open(self, file_name: str):
+        """
+        Open a file of the source, using the data read ahead when it was scheduled
+
+        Arguments:
+            file_name:
+                The name of the file in the source.
+
+        Returns:
+            A binary file object with the content of the file.
+        """
+        future = self.__futures.pop(file_name, None)
+        data = future.result() if future else _read_bytes(self.source, file_name)
+        for next_file_name in islice(
+            self.__upcoming, max(self.read_ahead - len(self.__futures), 0)
+        ):
+            if next_file_name not in self.__futures:
+                self.__futures[next_file_name] = self.__submit(next_file_name)
+        return io.BytesIO(data)
+
+    def close(self):
+        """
+        Stop the background threads and discard the data read ahead
+        """
+        for future in self.__futures.values():
+            future.cancel()
+        self.__futures = {}
+        self.__upcoming = iter(())
+        if self.__executor is not None:
+            self.__executor.shutdown(wait=False)
+            self.__executor = None
+
+    def __submit(self, file_name: str):
+        if self.__executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.__executor = ThreadPoolExecutor(self.io_workers)
+        return self.__executor.submit(_read_bytes, self.source, file_name)
+
+
+def _read_bytes(source, file_name: str) -> bytes:
+    with source.open(file_name) as file:
+        return file.read()
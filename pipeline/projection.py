@@ -0,0 +1,387 @@
+"""Module to project the topic distributions of the abstracts to a 2D topic map.
+
+The vectors are reduced first, then t-SNE (Barnes-Hut) places at most
+max_tsne_points abstracts, sampled in proportion to their topics, and the other
+abstracts are placed next to their nearest sampled neighbours. The coordinates are
+cached next to the model, keyed by its version, so the map is drawn again in seconds.
+"""
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+# folder of the model where the coordinates are cached
+PROJECTIONS_FOLDER = "projections"
+# version of the projection, it changes when the coordinates of the same inputs change
+PROJECTION_VERSION = 1
+
+
+def reduce_dimensions(
+    vectors: np.ndarray, n_components: int = 50, random_state: int = 0
+) -> np.ndarray:
+    """
+    Prepare the vectors for t-SNE: the square root of the topic distributions, so
+    the euclidean distance is the Hellinger distance, reduced with PCA when they have
+    more than n_components dimensions
+
+    Arguments:
+        vectors:
+            An array with shape (documents, topics).
+        n_components:
+            The maximum dimensions of the result.
+        random_state:
+            The seed of the randomized PCA.
+
+    Returns:
+        An array of float32 with shape (documents, min(topics, n_components)).
+    """
+    reduced = np.sqrt(np.clip(np.asarray(vectors, dtype=np.float32), 0, None))
+    if reduced.shape[1] > n_components:
+        from sklearn.decomposition import PCA
+
+        pca = PCA(n_components, svd_solver="randomized", random_state=random_state)
+        reduced = pca.fit_transform(reduced).astype(np.float32)
+    return reduced
+
+
+def stratified_sample(
+    strata: np.ndarray, size: int, min_per_stratum: int = 50, random_state: int = 0
+) -> np.ndarray:
+    """
+    Sample the documents in proportion to their strata, e.g. their main topic, with
+    at least min_per_stratum documents of the small strata. The floor is taken from
+    the size, so the sample never has more than size documents; when the floors do
+    not fit, the size is split among the strata in proportion to their floors.
+
+    Arguments:
+        strata:
+            The stratum of every document.
+        size:
+            The amount of documents of the sample.
+        min_per_stratum:
+            The minimum amount of documents of every stratum, or all of them.
+        random_state:
+            The seed of the sample.
+
+    Returns:
+        A sorted array with the indices of the sampled documents.
+    """
+    rng = np.random.default_rng(random_state)
+    if size >= len(strata):
+        return np.arange(len(strata))
+    values, counts = np.unique(strata, return_counts=True)
+    floors = np.minimum(counts, min_per_stratum)
+    if floors.sum() >= size:
+        quotas = _allocate(floors, size)
+    else:
+        quotas = floors + _allocate(counts - floors, size - floors.sum())
+    sample = [
+        rng.choice(np.flatnonzero(strata == value), quota, replace=False)
+        for value, quota in zip(values, quotas)
+    ]
+    return np.sort(np.concatenate(sample))
+
+
+def _allocate(weights: np.ndarray, total: int) -> np.ndarray:
+    # split total in proportion to the weights with the largest remainders, so the
+    # parts add up to total and none is larger than its weight
+    shares = weights * total / max(weights.sum(), 1)
+    parts = np.floor(shares).astype(np.int64)
+    remainders = np.argsort(parts - shares, kind="stable")[: total - parts.sum()]
+    parts[remainders] += 1
+    return parts
+
+
+def place_out_of_sample(
+    reduced: np.ndarray,
+    sample: np.ndarray,
+    sample_coordinates: np.ndarray,
+    n_neighbors: int = 10,
+    batch_size: int = 65536,
+) -> np.ndarray:
+    """
+    Place every document at the average of the coordinates of its nearest sampled
+    documents, weighted by the inverse of their distance
+
+    Arguments:
+        reduced:
+            The reduced vectors of all the documents.
+        sample:
+            The indices of the documents with coordinates.
+        sample_coordinates:
+            The coordinates of the sampled documents.
+        n_neighbors:
+            The amount of sampled neighbours of every document.
+        batch_size:
+            The amount of documents searched at once.
+
+    Returns:
+        An array with shape (documents, 2), the sampled documents keep their
+        coordinates.
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    coordinates = np.empty((len(reduced), 2), dtype=np.float32)
+    coordinates[sample] = sample_coordinates
+    others = np.setdiff1d(np.arange(len(reduced)), sample, assume_unique=True)
+    n_neighbors = min(n_neighbors, len(sample))
+    # the brute force search with matrix products is faster than the trees here
+    neighbors = NearestNeighbors(n_neighbors=n_neighbors, algorithm="brute")
+    neighbors.fit(reduced[sample])
+    for start in range(0, len(others), batch_size):
+        batch = others[start : start + batch_size]
+        distances, indices = neighbors.kneighbors(reduced[batch])
+        weights = 1 / np.maximum(distances, 1e-6)
+        weights /= weights.sum(axis=1, keepdims=True)
+        coordinates[batch] = np.einsum(
+            "ij,ijk->ik", weights, sample_coordinates[indices]
+        )
+    return coordinates
+
+
+def project(
+    vectors: np.ndarray,
+    max_tsne_points: int = 10000,
+    pca_components: int = 50,
+    perplexity: float = 30.0,
+    n_neighbors: int = 10,
+    random_state: int = 0,
+) -> tuple:
+    """
+    Get the 2D coordinates of the topic distributions of some documents
+
+    Arguments:
+        vectors:
+            An array with shape (documents, topics).
+        max_tsne_points:
+            The maximum amount of documents placed by t-SNE, the others are placed
+            with place_out_of_sample.
+        pca_components:
+            The dimensions kept by reduce_dimensions.
+        perplexity:
+            The perplexity of t-SNE.
+        n_neighbors:
+            The sampled neighbours used to place every other document.
+        random_state:
+            The seed of the sample and of t-SNE.
+
+    Returns:
+        A tuple (coordinates, sample) with an array with shape (documents, 2) and the
+        indices of the documents placed by t-SNE.
+    """
+    from sklearn.manifold import TSNE
+
+    vectors = np.asarray(vectors)
+    if not len(vectors):
+        return np.empty((0, 2), dtype=np.float32), np.empty(0, dtype=np.int64)
+    reduced = reduce_dimensions(vectors, pca_components, random_state)
+    sample = stratified_sample(
+        vectors.argmax(axis=1), max_tsne_points, random_state=random_state
+    )
+    tsne = TSNE(
+        2,
+        perplexity=min(perplexity, max(1.0, (len(sample) - 1) / 3)),
+        init="pca",
+        method="barnes_hut",
+        random_state=random_state,
+        n_jobs=-1,
+    )
+    sample_coordinates = tsne.fit_transform(reduced[sample]).astype(np.float32)
+    if len(sample) == len(vectors):
+        return sample_coordinates, sample
+    return place_out_of_sample(reduced, sample, sample_coordinates, n_neighbors), sample
+
+
+def projection_key(model_version: str, corpus_fingerprint: str, config: dict) -> str:
+    """
+    Get the key of the cached coordinates of a model, a corpus and a configuration
+
+    Arguments:
+        model_version:
+            The version of the model that gave the topic distributions.
+        corpus_fingerprint:
+            The fingerprint of the projected dataset.
+        config:
+            The arguments of project.
+
+    Returns:
+        A string with the hexadecimal hash.
+    """
+    digest = hashlib.sha256()
+    digest.update(
+        f"{PROJECTION_VERSION}\0{model_version}\0{corpus_fingerprint}\0".encode()
+    )
+    digest.update(json.dumps(config, sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()[:16]
+
+
+def load_projection(cache_dir: str, key: str) -> dict:
+    """
+    Read the cached coordinates of a projection, so a dataset that was projected
+    before does not need to be built nor transformed
+
+    Arguments:
+        cache_dir:
+            The folder of the cache.
+        key:
+            The key given by projection_key.
+
+    Returns:
+        The dictionary returned by project_dataset, or None if it was not cached.
+    """
+    path = os.path.join(cache_dir, f"{key}.npz")
+    if not os.path.exists(path):
+        return None
+    with np.load(path) as arrays:
+        projection = {name: arrays[name] for name in arrays.files}
+    return {**projection, "seconds": 0.0, "cached": True}
+
+
+def project_dataset(
+    artifact,
+    dataset,
+    cache_dir: str,
+    batch_size: int = 1024,
+    fingerprint: str = None,
+    **kwargs,
+) -> dict:
+    """
+    Get the topic map of a dataset with a saved model, the coordinates are read from
+    the cache when they were already computed for the same model, files and arguments
+
+    Arguments:
+        artifact:
+            The TopicModelArtifact.
+        dataset:
+            The AbstractNarrationDataset, cleaned with the cleaner of the artifact.
+        cache_dir:
+            The folder of the cache, e.g. PROJECTIONS_FOLDER in the folder of the
+            model.
+        batch_size:
+            The amount of abstracts transformed at once.
+        fingerprint:
+            The fingerprint of the corpus in the key of the cache, e.g. of all the files
+            of the source so the cache is checked before the dataset is built. By
+            default the corpus_fingerprint of the dataset.
+        **kwargs:
+            The arguments of project.
+
+    Returns:
+        A dictionary with the coordinates, the main topic and the file of every
+        abstract, the sample placed by t-SNE, the seconds and whether it was cached.
+    """
+    from pipeline.artifact import corpus_fingerprint
+    from pipeline.parallel import chunked
+
+    fingerprint = fingerprint or corpus_fingerprint(dataset)
+    key = projection_key(artifact.version, fingerprint, kwargs)
+    cached = load_projection(cache_dir, key)
+    if cached is not None:
+        return cached
+
+    start = time.perf_counter()
+    matrices = [
+        artifact.transform(abstracts, cleaned=True)
+        for abstracts in chunked(dataset, batch_size)
+    ]
+    n_topics = artifact.model.components_.shape[0]
+    vectors = np.vstack(matrices) if matrices else np.empty((0, n_topics))
+    coordinates, sample = project(vectors, **kwargs)
+    projection = {
+        "coordinates": coordinates,
+        "topics": vectors.argmax(axis=1),
+        "files": np.asarray(dataset.files, dtype=str),
+        "sample": sample,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"{key}.npz")
+    with open(f"{path}.tmp", "wb") as file:
+        np.savez(file, **projection)
+    os.replace(f"{path}.tmp", path)
+    return {**projection, "seconds": time.perf_counter() - start, "cached": False}
+
+
+def plot_topic_map(
+    coordinates: np.ndarray,
+    topics: np.ndarray,
+    path: str,
+    topic_names: list = None,
+    max_points: int = 50000,
+    gridsize: int = 150,
+    random_state: int = 0,
+):
+    """
+    Draw the topic map: the density of the abstracts as a hexagonal histogram in a
+    log scale, the points of a sample colored by topic on top of it, and the name of
+    every topic at its median
+
+    Arguments:
+        coordinates:
+            An array with shape (documents, 2).
+        topics:
+            The main topic of every document.
+        path:
+            The image file, e.g. topic_map.png.
+        topic_names:
+            The name of every topic, e.g. its top words.
+        max_points:
+            The maximum amount of points drawn, the density includes all of them.
+        gridsize:
+            The amount of hexagons along the x axis.
+        random_state:
+            The seed of the sample of the points.
+    """
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+
+    rng = np.random.default_rng(random_state)
+    shown = np.arange(len(coordinates))
+    if len(shown) > max_points:
+        shown = rng.choice(shown, max_points, replace=False)
+    # the smaller and more transparent the points, the more of them are drawn
+    alpha = float(np.clip(2000 / max(len(shown), 1), 0.15, 0.8))
+    n_topics = int(topics.max()) + 1 if len(topics) else 0
+    colors = plt.get_cmap("tab20")(np.arange(n_topics) % 20)
+
+    fig, ax = plt.subplots(figsize=(12, 10))
+    ax.hexbin(
+        coordinates[:, 0],
+        coordinates[:, 1],
+        gridsize=gridsize,
+        bins="log",
+        cmap="Greys",
+        mincnt=1,
+        linewidths=0,
+    )
+    ax.scatter(
+        coordinates[shown, 0],
+        coordinates[shown, 1],
+        c=colors[topics[shown]],
+        s=2 if len(shown) > 5000 else 8,
+        alpha=alpha,
+        linewidths=0,
+    )
+    for topic in range(n_topics):
+        members = coordinates[topics == topic]
+        if not len(members):
+            continue
+        name = topic_names[topic] if topic_names is not None else ""
+        x, y = np.median(members, axis=0)
+        ax.annotate(
+            f"Topic {topic}\n{name}".strip(),
+            (x, y),
+            ha="center",
+            fontsize=8,
+            bbox={"boxstyle": "round", "facecolor": "white", "alpha": 0.7},
+        )
+    ax.set_title(f"Topic map of {len(coordinates)} abstracts")
+    ax.set_xticks([])
+    ax.set_yticks([])
+    fig.tight_layout()
+    fig.savefig(path, dpi=150)
+    plt.close(fig)
@@ -0,0 +1,165 @@
+"""Module that loads the NLTK resources from the local data paths, once per process.
+
+Nothing is downloaded while the pipeline runs. On a machine with network access the
+resources can be downloaded with:
+
+    python -m pipeline.resources [download_dir]
+
+and then copied to one of the NLTK data paths of the workers (e.g. the folder set in
+the environment variable NLTK_DATA).
+"""
+
+import sys
+from functools import lru_cache
+
+# locations of the resources inside the NLTK data paths, newer versions of NLTK read
+# the punkt tokenizer from punkt_tab
+NLTK_RESOURCES = {
+    "punkt": ("tokenizers/punkt_tab/english/", "tokenizers/punkt"),
+    "stopwords": ("corpora/stopwords",),
+    "wordnet": ("corpora/wordnet",),
+}
+
+
+def add_nltk_data_path(path: str):
+    """
+    Add a folder where the NLTK resources are looked for, before the default ones
+
+    Arguments:
+        path:
+            The folder with the NLTK data.
+    """
+    import nltk
+
+    if path not in nltk.data.path:
+        nltk.data.path.insert(0, path)
+    require_nltk_resource.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def require_nltk_resource(name: str):
+    """
+    Check that a NLTK resource is available in the local data paths
+
+    Arguments:
+        name:
+            The name of the resource, one of NLTK_RESOURCES.
+
+    Raises:
+        LookupError: if the resource is not found, without trying to download it.
+    """
+    import nltk
+
+    for location in NLTK_RESOURCES[name]:
+        try:
+            nltk.data.find(location)
+            return
+        except LookupError:
+            pass
+    raise LookupError(
+        f"The NLTK resource '{name}' was not found in {nltk.data.path}. Download it "
+        "with `python -m pipeline.resources` on a machine with network access and copy "
+        "it to one of those folders, or set NLTK_DATA to the folder that has it."
+    )
+
+
+@lru_cache(maxsize=None)
+def english_stop_words() -> frozenset:
+    """
+    The english stop words of NLTK
+
+    Returns:
+        A frozenset with the stop words.
+    """
+    require_nltk_resource("stopwords")
+    from nltk.corpus import stopwords
+
+    return frozenset(stopwords.words("english"))
+
+
+@lru_cache(maxsize=None)
+def word_tokenizer():
+    """
+    The tokenizer that word_tokenize applies to every sentence
+
+    Returns:
+        A NLTKWordTokenizer.
+    """
+    from nltk.tokenize import NLTKWordTokenizer
+
+    return NLTKWordTokenizer()
+
+
+def word_tokenize(text: str) -> list:
+    """
+    Split a text in sentences and words with nltk.word_tokenize
+
+    Arguments:
+        text:
+            The text to tokenize.
+
+    Returns:
+        A list with the words of the text.
+    """
+    require_nltk_resource("punkt")
+    from nltk.tokenize import word_tokenize
+
+    return word_tokenize(text)
+
+
+@lru_cache(maxsize=None)
+def wordnet_lemmatizer():
+    """
+    The WordNet lemmatizer, WordNet is read the first time a word is lemmatized
+
+    Returns:
+        A WordNetLemmatizer.
+    """
+    require_nltk_resource("wordnet")
+    from nltk.stem import WordNetLemmatizer
+
+    return WordNetLemmatizer()
+
+
+@lru_cache(maxsize=None)
+def nltk_versions(wordnet: bool = False) -> dict:
+    """
+    The versions of NLTK and of the WordNet data, they change the cleaned abstracts
+
+    Arguments:
+        wordnet:
+            If True, the version of WordNet is included.
+
+    Returns:
+        A dictionary with the versions.
+    """
+    import nltk
+
+    versions = {"nltk": nltk.__version__}
+    if wordnet:
+        require_nltk_resource("wordnet")
+        from nltk.corpus import wordnet as wordnet_corpus
+
+        versions["wordnet"] = wordnet_corpus.get_version()
+    return versions
+
+
+def download_nltk_resources(download_dir: str = None):
+    """
+    Download the NLTK resources used by the pipeline. This is the only function of the
+    pipeline that uses the network.
+
+    Arguments:
+        download_dir:
+            The folder where the resources are downloaded, by default the one chosen
+            by NLTK.
+    """
+    import nltk
+
+    for name in ("punkt", "punkt_tab", "stopwords", "wordnet"):
+        nltk.download(name, download_dir=download_dir)
+    require_nltk_resource.cache_clear()
+
+
+if __name__ == "__main__":
+    download_nltk_resources(sys.argv[1] if len(sys.argv) > 1 else None)
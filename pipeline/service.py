@@ -0,0 +1,318 @@
+"""Module with the local HTTP service that assigns topics to abstracts."""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from pipeline import instrumentation
+from pipeline.artifact import TopicModelArtifact
+
+# content type of the text format of Prometheus
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+# class that groups the items submitted by several threads in batches, so the
+# function is called once per batch instead of once per item
+class MicroBatcher:
+    def __init__(self, function, max_batch_size: int = 64, max_wait_ms: float = 5):
+        # function that receives a list of items and returns a list of results
+        self.function = function
+        self.max_batch_size = max_batch_size
+        # time that the first item of a batch waits for more items
+        self.max_wait = max_wait_ms / 1000
+        self.batch_sizes = deque(maxlen=10000)
+        self.__queue = queue.Queue()
+        # the items submitted after close would never be processed
+        self.__closed = False
+        self.__lock = threading.Lock()
+        self.__thread = threading.Thread(target=self.__run, daemon=True)
+        self.__thread.start()
+
+    def submit(self, item) -> Future:
+        """
+        Add an item to the next batch
+
+        Arguments:
+            item:
+                The item to process.
+
+        Returns:
+            A Future with the result of the item.
+
+        Raises:
+            RuntimeError: If the batcher was closed.
+        """
+        future = Future()
+        with self.__lock:
+            if self.__closed:
+                raise RuntimeError("The batcher is closed")
+            self.__queue.put((item, future))
+        return future
+
+    def close(self):
+        """
+        Process the pending items and stop the thread of the batches
+        """
+        with self.__lock:
+            if self.__closed:
+                return
+            self.__closed = True
+            self.__queue.put(None)
+        self.__thread.join()
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __run(self):
+        while True:
+            entry = self.__queue.get()
+            if entry is None:
+                return
+            batch = [entry]
+            deadline = time.perf_counter() + self.max_wait
+            closing = False
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.perf_counter()
+                try:
+                    entry = (
+                        self.__queue.get(timeout=timeout)
+                        if timeout > 0
+                        else self.__queue.get_nowait()
+                    )
+                except queue.Empty:
+                    break
+                if entry is None:
+                    closing = True
+                    break
+                batch.append(entry)
+            self.__process(batch)
+            if closing:
+                return
+
+    def __process(self, batch: list):
+        self.batch_sizes.append(len(batch))
+        items = [item for item, _ in batch]
+        try:
+            results = self.function(items)
+        except Exception as error:
+            for _, future in batch:
+                future.set_exception(error)
+            return
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+
+
+# class that keeps the latencies of the last requests
+class LatencyStats:
+    def __init__(self, window: int = 10000):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self.__lock = threading.Lock()
+
+    def add(self, seconds: float, error: bool = False):
+        """
+        Add the latency of a request
+
+        Arguments:
+            seconds:
+                The time the request took.
+            error:
+                If True, the request failed.
+        """
+        with self.__lock:
+            self.latencies.append(seconds)
+            self.requests += 1
+            self.errors += int(error)
+
+    def summary(self) -> dict:
+        """
+        Get the percentiles of the latencies of the last requests
+
+        Returns:
+            A dictionary with the amount of requests and errors, and the percentiles
+            50, 90, 99 and the maximum in milliseconds.
+        """
+        with self.__lock:
+            latencies = np.array(self.latencies) * 1000
+            summary = {"requests": self.requests, "errors": self.errors}
+        if len(latencies):
+            p50, p90, p99 = np.percentile(latencies, [50, 90, 99])
+            summary.update(
+                {
+                    "p50_ms": round(float(p50), 3),
+                    "p90_ms": round(float(p90), 3),
+                    "p99_ms": round(float(p99), 3),
+                    "max_ms": round(float(latencies.max()), 3),
+                }
+            )
+        return summary
+
+
+# class that assigns topics to abstracts with a model loaded once, batching the
+# abstracts of concurrent requests
+class TopicInferenceService:
+    def __init__(
+        self,
+        artifact: TopicModelArtifact,
+        max_batch_size: int = 64,
+        max_wait_ms: float = 5,
+        top_words: int = 10,
+    ):
+        self.artifact = artifact
+        self.topic_words = [" ".join(words) for words in artifact.top_words(top_words)]
+        self.batcher = MicroBatcher(self.__transform, max_batch_size, max_wait_ms)
+        self.latency = LatencyStats()
+
+    def predict(self, abstracts: list) -> list:
+        """
+        Get the topics of some abstracts, they are batched with the abstracts of the
+        other requests
+
+        Arguments:
+            abstracts:
+                The abstracts without cleaning.
+
+        Returns:
+            A list with a dictionary for every abstract with the topic, its top words
+            and the topic distribution.
+        """
+        start = time.perf_counter()
+        error = True
+        try:
+            futures = [self.batcher.submit(abstract) for abstract in abstracts]
+            distributions = [future.result() for future in futures]
+            error = False
+        finally:
+            self.latency.add(time.perf_counter() - start, error)
+        results = []
+        for distribution in distributions:
+            topic = int(np.argmax(distribution))
+            results.append(
+                {
+                    "topic": topic,
+                    "top_words": self.topic_words[topic],
+                    "distribution": [round(float(w), 6) for w in distribution],
+                }
+            )
+        return results
+
+    def stats(self) -> dict:
+        """
+        Get the statistics of the service: latencies of the requests and sizes of the
+        batches
+
+        Returns:
+            A dictionary with the statistics.
+        """
+        batch_sizes = np.array(self.batcher.batch_sizes)
+        stats = {"model_version": self.artifact.version, **self.latency.summary()}
+        if len(batch_sizes):
+            stats["batches"] = len(batch_sizes)
+            stats["mean_batch_size"] = round(float(batch_sizes.mean()), 3)
+            stats["max_batch_size"] = int(batch_sizes.max())
+        return stats
+
+    def close(self):
+        """
+        Stop the thread of the batches
+        """
+        self.batcher.close()
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __transform(self, abstracts: list) -> np.ndarray:
+        return self.artifact.transform(abstracts)
+
+
+def make_server(
+    service: TopicInferenceService, host: str = "127.0.0.1", port: int = 8080
+) -> ThreadingHTTPServer:
+    """
+    Create the HTTP server of a service. It answers:
+    - POST /predict with {"abstract": "..."} or {"abstracts": ["...", ...]}
+    - GET /stats with the latency percentiles and the batch sizes
+    - GET /health
+    - GET /metrics with the metrics of the pipeline in the Prometheus format
+
+    Arguments:
+        service:
+            The TopicInferenceService.
+        host:
+            The address to listen on.
+        port:
+            The port to listen on, 0 chooses a free one.
+
+    Returns:
+        A ThreadingHTTPServer, every request is handled in its own thread.
+    """
+
+    # class that handles the requests of the server
+    class TopicRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            if self.path == "/stats":
+                self.__send(200, service.stats())
+            elif self.path == "/health":
+                self.__send(200, {"status": "ok", "model": service.artifact.version})
+            elif self.path == "/metrics":
+                self.__send_text(200, instrumentation.METRICS.to_prometheus())
+            else:
+                self.__send(404, {"error": f"Not found: {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/predict":
+                self.__send(404, {"error": f"Not found: {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                if "abstracts" in body:
+                    abstracts = body["abstracts"]
+                    # a string is iterable, it would give an abstract per character
+                    if not isinstance(abstracts, list):
+                        raise ValueError("abstracts must be a list of strings")
+                else:
+                    abstracts = [body["abstract"]]
+                if not all(isinstance(abstract, str) for abstract in abstracts):
+                    raise ValueError("The abstracts must be strings")
+            except (KeyError, TypeError, ValueError) as error:
+                self.__send(400, {"error": f"Invalid request: {error}"})
+                return
+            try:
+                results = service.predict(abstracts)
+            except Exception as error:
+                self.__send(500, {"error": f"{type(error).__name__}: {error}"})
+                return
+            self.__send(
+                200, {"model_version": service.artifact.version, "results": results}
+            )
+
+        def log_message(self, format: str, *args):
+            # the latencies are in /stats, every request is not logged
+            pass
+
+        def __send(self, status: int, body: dict):
+            self.__send_text(status, json.dumps(body), "application/json")
+
+        def __send_text(
+            self, status: int, text: str, content_type: str = METRICS_CONTENT_TYPE
+        ):
+            data = text.encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return ThreadingHTTPServer((host, port), TopicRequestHandler)
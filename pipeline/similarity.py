@@ -0,0 +1,328 @@
+"""Module with the index to search the abstracts most similar to another one."""
+
+import json
+import os
+
+import numpy as np
+
+# file of the index saved next to a model artifact
+INDEX_FILE = "similarity.npz"
+# corpora up to this amount of documents are searched exactly by default
+EXACT_SEARCH_LIMIT = 200000
+
+
+# class that finds the documents with the highest cosine similarity to some query
+# vectors, exactly with blocked matrix products or approximately with random
+# projection LSH and an exact ranking of the candidates
+class SimilarityIndex:
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        labels=None,
+        method: str = "auto",
+        n_tables: int = 16,
+        n_bits: int = 14,
+        block_size: int = 65536,
+        seed: int = 0,
+        metadata: dict = None,
+    ):
+        if method not in ("auto", "exact", "lsh"):
+            raise ValueError(f"Unknown search method: {method}")
+        vectors = np.asarray(vectors, dtype=np.float32)
+        # the vectors are normalized, so the dot product is the cosine similarity
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+        # the name of every document, e.g. the file of the award
+        self.labels = None if labels is None else np.asarray(labels, dtype=str)
+        if method == "auto":
+            method = "exact" if len(vectors) <= EXACT_SEARCH_LIMIT else "lsh"
+        self.method = method
+        self.n_tables = n_tables
+        self.n_bits = n_bits
+        self.block_size = block_size
+        self.seed = seed
+        # information about the vectors, e.g. the version of the model that made them
+        self.metadata = metadata or {}
+        self.hyperplanes = None
+        self.codes = None
+        if method == "lsh":
+            rng = np.random.default_rng(seed)
+            self.hyperplanes = rng.standard_normal(
+                (n_tables, n_bits, self.vectors.shape[1])
+            ).astype(np.float32)
+            self.codes = np.stack(
+                [self.__hash(self.vectors, table) for table in range(n_tables)]
+            )
+        self.__build_tables()
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def query(self, vectors: np.ndarray, k: int = 20, probes: int = 0) -> tuple:
+        """
+        Find the k documents most similar to every query vector
+
+        Arguments:
+            vectors:
+                An array with shape (queries, dimensions), or a single vector.
+            k:
+                The amount of documents of every query.
+            probes:
+                With LSH, the buckets whose code differs in up to this amount of bits
+                (0 or 1) are also searched, more probes find more true neighbours.
+
+        Returns:
+            A tuple (indices, scores) of arrays with shape (queries, k), from the
+            most similar document to the least, the missing results are -1 and -inf.
+        """
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors = vectors / np.maximum(norms, np.finfo(np.float32).tiny)
+        k = min(k, len(self))
+        if k == 0:
+            empty = np.empty((len(vectors), 0))
+            return empty.astype(np.int64), empty.astype(np.float32)
+        if self.method == "exact":
+            return self.__exact_search(vectors, k)
+        indices = np.full((len(vectors), k), -1, dtype=np.int64)
+        scores = np.full((len(vectors), k), -np.inf, dtype=np.float32)
+        # the codes of the queries in every table are computed at once
+        codes = np.stack(
+            [self.__hash(vectors, table) for table in range(self.n_tables)]
+        )
+        for row, vector in enumerate(vectors):
+            candidates = self.__candidates(codes[:, row], probes)
+            candidate_scores = self.vectors[candidates] @ vector
+            found = _top_k(candidate_scores, k)
+            indices[row, : len(found)] = candidates[found]
+            scores[row, : len(found)] = candidate_scores[found]
+        return indices, scores
+
+    def query_documents(self, indices, k: int = 20, probes: int = 0) -> tuple:
+        """
+        Find the k documents most similar to some documents of the index, without
+        the documents themselves
+
+        Arguments:
+            indices:
+                The indices of the documents in the index.
+            k:
+                The amount of documents of every query.
+            probes:
+                See query.
+
+        Returns:
+            A tuple (indices, scores) of arrays with shape (queries, k).
+        """
+        indices = np.atleast_1d(np.asarray(indices, dtype=np.int64))
+        found, scores = self.query(self.vectors[indices], k + 1, probes)
+        # the document itself is removed from its results, or the last one if it
+        # was not found, e.g. because of a duplicate with the same score
+        keep = found != indices[:, np.newaxis]
+        keep[keep.all(axis=1), -1] = False
+        k = found.shape[1] - 1
+        return found[keep].reshape(-1, k), scores[keep].reshape(-1, k)
+
+    def save(self, path: str):
+        """
+        Save the index in a NumPy file that loads without unpickling any object
+
+        Arguments:
+            path:
+                The file, or the folder of a model artifact where INDEX_FILE is saved.
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, INDEX_FILE)
+        config = {
+            "method": self.method,
+            "n_tables": self.n_tables,
+            "n_bits": self.n_bits,
+            "block_size": self.block_size,
+            "seed": self.seed,
+            "metadata": self.metadata,
+        }
+        arrays = {"vectors": self.vectors, "config": np.array(json.dumps(config))}
+        if self.labels is not None:
+            arrays["labels"] = self.labels
+        if self.method == "lsh":
+            arrays["hyperplanes"] = self.hyperplanes
+            arrays["codes"] = self.codes
+        with open(f"{path}.tmp", "wb") as file:
+            np.savez(file, **arrays)
+        os.replace(f"{path}.tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> "SimilarityIndex":
+        """
+        Load an index saved with save, the LSH codes are not computed again
+
+        Arguments:
+            path:
+                The file, or the folder of a model artifact with INDEX_FILE.
+
+        Returns:
+            A SimilarityIndex.
+        """
+        if os.path.isdir(path):
+            path = os.path.join(path, INDEX_FILE)
+        with np.load(path) as arrays:
+            config = json.loads(str(arrays["config"]))
+            index = cls.__new__(cls)
+            index.vectors = arrays["vectors"]
+            index.labels = arrays["labels"] if "labels" in arrays else None
+            lsh = config["method"] == "lsh"
+            index.hyperplanes = arrays["hyperplanes"] if lsh else None
+            index.codes = arrays["codes"] if lsh else None
+        index.method = config["method"]
+        index.n_tables = config["n_tables"]
+        index.n_bits = config["n_bits"]
+        index.block_size = config["block_size"]
+        index.seed = config["seed"]
+        index.metadata = config["metadata"]
+        index.__build_tables()
+        return index
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __build_tables(self):
+        # the codes of every table are offset by the table, so the documents of all
+        # the tables are kept in one array sorted by code and the buckets of every
+        # probe of every table are found with a single binary search
+        self.__order = np.empty(0, dtype=np.int64)
+        self.__sorted_codes = np.empty(0, dtype=np.int64)
+        if self.method != "lsh":
+            return
+        codes = self.__table_offsets()[:, np.newaxis] + self.codes
+        order = np.argsort(codes, axis=None, kind="stable")
+        self.__order = order % len(self)
+        self.__sorted_codes = codes.ravel()[order]
+
+    def __table_offsets(self) -> np.ndarray:
+        return np.arange(self.n_tables, dtype=np.int64) << self.n_bits
+
+    def __hash(self, vectors: np.ndarray, table: int) -> np.ndarray:
+        # the side of every hyperplane of the table, as the bits of an integer
+        bits = (vectors @ self.hyperplanes[table].T) > 0
+        return bits.astype(np.int64) @ (1 << np.arange(self.n_bits, dtype=np.int64))
+
+    def __candidates(self, codes: np.ndarray, probes: int) -> np.ndarray:
+        # the documents in the buckets of the query, and in the ones that differ in a
+        # bit when probing, of every table
+        flips = np.zeros(1, dtype=np.int64)
+        if probes:
+            flips = np.concatenate([flips, 1 << np.arange(self.n_bits, dtype=np.int64)])
+        probe_codes = (self.__table_offsets() + codes)[:, np.newaxis] ^ flips
+        starts = np.searchsorted(self.__sorted_codes, probe_codes.ravel(), "left")
+        ends = np.searchsorted(self.__sorted_codes, probe_codes.ravel(), "right")
+        lengths = ends - starts
+        # the positions of all the buckets at once, without a loop over them
+        shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = shifts + np.arange(lengths.sum())
+        return np.unique(self.__order[positions])
+
+    def __exact_search(self, vectors: np.ndarray, k: int) -> tuple:
+        # the scores are computed for a block of documents at a time, and only the k
+        # best of the results so far and of the block are kept
+        best_indices = np.empty((len(vectors), 0), dtype=np.int64)
+        best_scores = np.empty((len(vectors), 0), dtype=np.float32)
+        for start in range(0, len(self), self.block_size):
+            block = self.vectors[start : start + self.block_size]
+            scores = np.concatenate([best_scores, vectors @ block.T], axis=1)
+            indices = np.concatenate(
+                [
+                    best_indices,
+                    np.broadcast_to(
+                        np.arange(start, start + len(block)), (len(vectors), len(block))
+                    ),
+                ],
+                axis=1,
+            )
+            top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_indices = np.take_along_axis(indices, top, axis=1)
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return (
+            np.take_along_axis(best_indices, order, axis=1),
+            np.take_along_axis(best_scores, order, axis=1),
+        )
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    # the positions of the k highest scores, from the highest to the lowest
+    k = min(k, len(scores))
+    if k == 0:
+        return np.empty(0, dtype=np.int64)
+    top = np.argpartition(-scores, k - 1)[:k]
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def build_topic_index(artifact, dataset, batch_size: int = 1024, **kwargs):
+    """
+    Build the index of a dataset with the topic distributions given by a model
+
+    Arguments:
+        artifact:
+            The TopicModelArtifact.
+        dataset:
+            The AbstractNarrationDataset, cleaned with the cleaner of the artifact.
+        batch_size:
+            The amount of abstracts transformed at once.
+        **kwargs:
+            The arguments of SimilarityIndex, e.g. method.
+
+    Returns:
+        A SimilarityIndex with the files of the dataset as labels and the version of
+        the model in its metadata.
+    """
+    from pipeline.parallel import chunked
+
+    matrices = [
+        artifact.transform(abstracts, cleaned=True)
+        for abstracts in chunked(dataset, batch_size)
+    ]
+    n_topics = artifact.model.components_.shape[0]
+    vectors = np.vstack(matrices) if matrices else np.empty((0, n_topics))
+    return SimilarityIndex(
+        vectors,
+        labels=dataset.files,
+        metadata={"vectors": "doc_topic", "model_version": artifact.version},
+        **kwargs,
+    )
+
+
+def build_lsa_index(
+    abstracts, labels=None, n_components: int = 100, random_state: int = 0, **kwargs
+):
+    """
+    Build the index of some abstracts with TF-IDF vectors reduced by LSA (a truncated
+    SVD), which keeps more detail than the topic distributions
+
+    Arguments:
+        abstracts:
+            The cleaned abstracts.
+        labels:
+            The name of every abstract, e.g. the files of the dataset.
+        n_components:
+            The dimensions of the vectors.
+        random_state:
+            The seed of the SVD.
+        **kwargs:
+            The arguments of SimilarityIndex, e.g. method.
+
+    Returns:
+        A SimilarityIndex.
+    """
+    from sklearn.decomposition import TruncatedSVD
+    from sklearn.feature_extraction.text import TfidfVectorizer
+
+    tfidf = TfidfVectorizer(sublinear_tf=True).fit_transform(abstracts)
+    n_components = max(1, min(n_components, tfidf.shape[1] - 1))
+    vectors = TruncatedSVD(n_components, random_state=random_state).fit_transform(tfidf)
+    return SimilarityIndex(
+        vectors,
+        labels=labels,
+        metadata={"vectors": "lsa", "n_components": n_components},
+        **kwargs,
+    )
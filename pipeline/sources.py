@@ -0,0 +1,182 @@
+"""Module with the sources of award XML files: folders and NSF yearly zip archives."""
+
+import os
+from functools import lru_cache
+
+
+# class that reads the XML files of a folder
+class FolderSource:
+    def __init__(self, path: str):
+        self.path = path
+
+    def list_files(self) -> list:
+        """
+        Get the names of the XML files of the source
+
+        Returns:
+            A list with the names of the files that end with .xml.
+        """
+        return [f for f in os.listdir(self.path) if f.endswith(".xml")]
+
+    def open(self, file_name: str):
+        """
+        Open a file of the source
+
+        Arguments:
+            file_name:
+                The name of the file, as returned by list_files.
+
+        Returns:
+            A binary file object.
+        """
+        return open(os.path.join(self.path, file_name), "rb")
+
+    def stat(self, file_name: str) -> tuple:
+        """
+        Get the values that change when a file of the source is modified
+
+        Arguments:
+            file_name:
+                The name of the file, as returned by list_files.
+
+        Returns:
+            A tuple (stamp, size), where stamp is the modification time in nanoseconds.
+        """
+        file_stat = os.stat(os.path.join(self.path, file_name))
+        return (file_stat.st_mtime_ns, file_stat.st_size)
+
+
+# class that reads the XML members of a zip archive without extracting it
+class ZipArchiveSource:
+    def __init__(self, path: str):
+        self.path = path
+
+    def list_files(self) -> list:
+        """
+        Get the names of the XML members of the archive
+
+        Returns:
+            A list with the names of the members that end with .xml.
+        """
+        return [
+            info.filename
+            for info in _open_archive(self.path).infolist()
+            if not info.is_dir() and info.filename.endswith(".xml")
+        ]
+
+    def open(self, file_name: str):
+        """
+        Open a member of the archive, it is decompressed while it is read
+
+        Arguments:
+            file_name:
+                The name of the member, as returned by list_files.
+
+        Returns:
+            A binary file object.
+        """
+        return _open_archive(self.path).open(file_name)
+
+    def stat(self, file_name: str) -> tuple:
+        """
+        Get the values that change when a member of the archive is modified
+
+        Arguments:
+            file_name:
+                The name of the member, as returned by list_files.
+
+        Returns:
+            A tuple (stamp, size), where stamp is the CRC-32 of the member.
+        """
+        info = _open_archive(self.path).getinfo(file_name)
+        return (info.CRC, info.file_size)
+
+
+# class that joins several sources, the files are named "<source name>/<file name>"
+class MultiSource:
+    def __init__(self, sources: list):
+        self.sources = {}
+        for source in sources:
+            name = os.path.basename(os.path.normpath(source.path))
+            if name in self.sources:
+                raise ValueError(f"Two sources have the same name: {name}")
+            self.sources[name] = source
+
+    def list_files(self) -> list:
+        """
+        Get the names of the XML files of all the sources
+
+        Returns:
+            A list with the names of the files prefixed by the name of their source.
+        """
+        return [
+            f"{name}/{file_name}"
+            for name, source in self.sources.items()
+            for file_name in source.list_files()
+        ]
+
+    def open(self, file_name: str):
+        """
+        Open a file of one of the sources
+
+        Arguments:
+            file_name:
+                The name of the file, as returned by list_files.
+
+        Returns:
+            A binary file object.
+        """
+        name, file_name = file_name.split("/", 1)
+        return self.sources[name].open(file_name)
+
+    def stat(self, file_name: str) -> tuple:
+        """
+        Get the values that change when a file of one of the sources is modified
+
+        Arguments:
+            file_name:
+                The name of the file, as returned by list_files.
+
+        Returns:
+            A tuple (stamp, size) given by the source of the file.
+        """
+        name, file_name = file_name.split("/", 1)
+        return self.sources[name].stat(file_name)
+
+
+def open_source(dataset_folder):
+    """
+    Get the source for a dataset folder, a zip archive or a list of them
+
+    Arguments:
+        dataset_folder:
+            The path to a folder with XML files, the path to a zip archive, or a list
+            of those paths.
+
+    Returns:
+        A FolderSource, ZipArchiveSource or MultiSource.
+    """
+    if isinstance(dataset_folder, (list, tuple)):
+        if len(dataset_folder) == 1:
+            return open_source(dataset_folder[0])
+        return MultiSource([open_source(path) for path in dataset_folder])
+    if os.path.isfile(dataset_folder):
+        import zipfile
+
+        if zipfile.is_zipfile(dataset_folder):
+            return ZipArchiveSource(dataset_folder)
+    return FolderSource(dataset_folder)
+
+
+def _open_archive(path: str) -> "zipfile.ZipFile":
+    # an archive opened before a fork shares the position of the file with the parent
+    # process, so every process opens its own
+    return _open_archive_in_process(path, os.getpid())
+
+
+# every process keeps the archives open, so the central directory is read only once
+@lru_cache(maxsize=None)
+def _open_archive_in_process(path: str, pid: int) -> "zipfile.ZipFile":
+    import zipfile
+
+    return zipfile.ZipFile(path)
@@ -0,0 +1,243 @@
+"""Module to compare topic models with different amounts of topics in parallel."""
+
+import itertools
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.decomposition import LatentDirichletAllocation
+from sklearn.feature_extraction.text import CountVectorizer
+
+from pipeline.coherence import COHERENCE_MEASURES, WordCooccurrence, model_coherence
+
+# the document-term matrix of the sweep in this process, in the workers it reads
+# the shared memory of _shared_blocks, which must outlive it
+_shared_matrix = None
+_shared_blocks = None
+
+
+# class that places the arrays of a CSR matrix in shared memory, so the processes
+# of a pool read the same matrix instead of receiving a copy each
+class SharedCsrMatrix:
+    def __init__(self, blocks: dict, descriptor: dict, owner: bool):
+        # shared memory block of every array: data, indices and indptr
+        self.blocks = blocks
+        # picklable description to attach the matrix from another process
+        self.descriptor = descriptor
+        self.owner = owner
+        self.matrix = sparse.csr_matrix(
+            tuple(self.__array(name) for name in ("data", "indices", "indptr")),
+            shape=descriptor["shape"],
+            copy=False,
+        )
+
+    @classmethod
+    def create(cls, matrix) -> "SharedCsrMatrix":
+        """
+        Copy a sparse matrix to shared memory
+
+        Arguments:
+            matrix:
+                The sparse matrix, it is converted to CSR if needed.
+
+        Returns:
+            A SharedCsrMatrix that owns the shared memory, it must be unlinked.
+        """
+        from multiprocessing import shared_memory
+
+        matrix = sparse.csr_matrix(matrix)
+        blocks = {}
+        descriptor = {"shape": matrix.shape, "arrays": {}}
+        for name in ("data", "indices", "indptr"):
+            array = getattr(matrix, name)
+            # a block can not be empty, e.g. the data of a matrix without words
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            np.ndarray(array.shape, array.dtype, buffer=block.buf)[:] = array
+            blocks[name] = block
+            descriptor["arrays"][name] = (block.name, array.shape, array.dtype.str)
+        return cls(blocks, descriptor, owner=True)
+
+    @classmethod
+    def attach(cls, descriptor: dict) -> "SharedCsrMatrix":
+        """
+        Attach a matrix created in another process, without copying it
+
+        Arguments:
+            descriptor:
+                The descriptor attribute of the SharedCsrMatrix that created it.
+
+        Returns:
+            A SharedCsrMatrix that reads the shared memory.
+        """
+        from multiprocessing import shared_memory
+
+        blocks = {
+            name: shared_memory.SharedMemory(name=block_name)
+            for name, (block_name, _, _) in descriptor["arrays"].items()
+        }
+        return cls(blocks, descriptor, owner=False)
+
+    def close(self):
+        """
+        Release the shared memory, it is also removed when this object created it
+        """
+        self.matrix = None
+        for block in self.blocks.values():
+            block.close()
+            if self.owner:
+                block.unlink()
+        self.blocks = {}
+
+    ################################
+    #       PRIVATE METHODS        #
+    ################################
+
+    def __array(self, name: str) -> np.ndarray:
+        _, shape, dtype = self.descriptor["arrays"][name]
+        return np.ndarray(shape, np.dtype(dtype), buffer=self.blocks[name].buf)
+
+
+def sweep_topics(
+    document_term_matrix,
+    n_components=(5, 9, 15, 20),
+    doc_topic_priors=(None,),
+    topic_word_priors=(None,),
+    num_workers: int = 1,
+    random_state: int = 0,
+    top_n: int = 10,
+) -> pd.DataFrame:
+    """
+    Fit a LDA model for every combination of amount of topics and priors on the same
+    document-term matrix. With num_workers > 1 the matrix is placed once in shared
+    memory and the models are fitted in a process pool, the largest ones first, so
+    the sweep takes about the time of its slowest fit.
+
+    Arguments:
+        document_term_matrix:
+            The sparse matrix of word counts, e.g. the output of a CountVectorizer.
+        n_components:
+            The amounts of topics to compare.
+        doc_topic_priors:
+            The values of doc_topic_prior to compare, None is 1 / topics.
+        topic_word_priors:
+            The values of topic_word_prior to compare, None is 1 / topics.
+        num_workers:
+            The amount of processes to use, 1 fits every model in this process.
+        random_state:
+            The seed of every model.
+        top_n:
+            The amount of top words of every topic used in the coherence.
+
+    Returns:
+        A DataFrame with a row per model: its parameters, the perplexity on the
+        matrix, the mean UMass, NPMI and C_v coherence of its topics and the
+        seconds of the fit.
+    """
+    candidates = [
+        {
+            "n_components": n_topics,
+            "doc_topic_prior": doc_topic_prior,
+            "topic_word_prior": topic_word_prior,
+            "random_state": random_state,
+        }
+        for n_topics, doc_topic_prior, topic_word_prior in itertools.product(
+            n_components, doc_topic_priors, topic_word_priors
+        )
+    ]
+    # the largest models take longer, they start first so none is left at the end
+    candidates.sort(key=lambda candidate: -candidate["n_components"])
+    global _shared_matrix
+    if num_workers <= 1:
+        previous = _shared_matrix
+        _shared_matrix = sparse.csr_matrix(document_term_matrix)
+        try:
+            results = [_fit_candidate(candidate) for candidate in candidates]
+        finally:
+            _shared_matrix = previous
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        shared = SharedCsrMatrix.create(document_term_matrix)
+        try:
+            with ProcessPoolExecutor(
+                min(num_workers, len(candidates)),
+                initializer=_attach_matrix,
+                initargs=(shared.descriptor,),
+            ) as executor:
+                results = list(executor.map(_fit_candidate, candidates))
+        finally:
+            shared.close()
+    # the counts of the pairs of words are computed once for the words of all models
+    cooccurrence = WordCooccurrence(document_term_matrix)
+    for result in results:
+        coherence = model_coherence(result.pop("components"), cooccurrence, top_n)
+        for measure, value in coherence.items():
+            result[f"coherence_{measure}"] = value
+    columns = [
+        "n_components",
+        "doc_topic_prior",
+        "topic_word_prior",
+        "perplexity",
+        *(f"coherence_{measure}" for measure in COHERENCE_MEASURES),
+        "fit_seconds",
+    ]
+    return (
+        pd.DataFrame(results, columns=columns)
+        .sort_values(["n_components", "doc_topic_prior", "topic_word_prior"])
+        .reset_index(drop=True)
+    )
+
+
+def sweep_dataset(
+    dataset, max_features: int = 800, **kwargs
+) -> tuple[pd.DataFrame, CountVectorizer]:
+    """
+    Vectorize the cleaned abstracts of a dataset once and sweep the topic models on
+    its document-term matrix
+
+    Arguments:
+        dataset:
+            An iterable with the cleaned abstracts, e.g. an AbstractNarrationDataset.
+        max_features:
+            The amount of words of the vocabulary.
+        **kwargs:
+            The arguments of sweep_topics.
+
+    Returns:
+        A tuple (results, vectorizer) with the DataFrame of sweep_topics and the
+        fitted vectorizer.
+    """
+    vectorizer = CountVectorizer(max_features=max_features)
+    document_term_matrix = vectorizer.fit_transform(dataset)
+    return sweep_topics(document_term_matrix, **kwargs), vectorizer
+
+
+def _attach_matrix(descriptor: dict):
+    # the initializer of the workers, the matrix is attached once per process
+    global _shared_matrix, _shared_blocks
+    _shared_blocks = SharedCsrMatrix.attach(descriptor)
+    _shared_matrix = _shared_blocks.matrix
+
+
+def _fit_candidate(candidate: dict) -> dict:
+    document_term_matrix = _shared_matrix
+    start = time.perf_counter()
+    model = LatentDirichletAllocation(
+        n_components=candidate["n_components"],
+        doc_topic_prior=candidate["doc_topic_prior"],
+        topic_word_prior=candidate["topic_word_prior"],
+        learning_method="online",
+        random_state=candidate["random_state"],
+    )
+    model.fit(document_term_matrix)
+    fit_seconds = time.perf_counter() - start
+    return {
+        "n_components": candidate["n_components"],
+        "doc_topic_prior": candidate["doc_topic_prior"],
+        "topic_word_prior": candidate["topic_word_prior"],
+        "perplexity": float(model.perplexity(document_term_matrix)),
+        "fit_seconds": round(fit_seconds, 3),
+        # the coherence is measured in the main process, with shared counts
+        "components": model.components_,
+    }
@@ -0,0 +1,255 @@
+"""Module to generate synthetic NSF award files with the layout of the dataset.
+
+Usage:
+    python -m pipeline.synthetic synthetic/1k --awards 1000
+    python -m pipeline.synthetic synthetic/10k.zip --awards 10000 --seed 1
+"""
+
+import argparse
+import os
+from xml.sax.saxutils import escape
+
+import numpy as np
+
+# organizations of the awards: code, directorate and division
+ORGANIZATIONS = (
+    ("06040300", ("GEO", "Directorate For Geosciences"), ("OCE", "Division Of Ocean")),
+    ("08010000", ("BIO", "Direct For Biological"), ("MCB", "Div Of Molecular")),
+    ("05010000", ("CSE", "Direct For Computer"), ("CCF", "Division of Computing")),
+    ("03040000", ("MPS", "Direct For Mathematical"), ("DMS", "Div Of Mathematics")),
+    ("11010000", ("EDU", "Directorate for STEM Education"), ("DGE", "Div Of Graduate")),
+    ("07020000", ("ENG", "Directorate For Engineering"), ("CBET", "Div Of Chemistry")),
+)
+# program elements of every directorate: code and text
+PROGRAM_ELEMENTS = {
+    "GEO": (("1650", "BIOLOGICAL OCEANOGRAPHY"), ("1680", "OCEAN TECH & INTERDISC")),
+    "BIO": (("1112", "Genetic Mechanisms"), ("1114", "Cellular Dynamics and Function")),
+    "CSE": (("7796", "Algorithmic Foundations"), ("7798", "Software & Hardware")),
+    "MPS": (("1281", "ANALYSIS PROGRAM"), ("1271", "COMPUTATIONAL MATHEMATICS")),
+    "EDU": (("1986", "Graduate Research Fellowship"), ("7908", "NSF Traineeship")),
+    "ENG": (("1403", "Proc Sys, Reac Eng & Mol Therm"), ("1440", "Environmental Eng")),
+}
+CROSSCUTTING_PROGRAM_ELEMENT = ("7222", "XC-Crosscutting")
+INSTRUMENTS = ("Standard Grant", "Continuing Grant", "Fellowship Award")
+FIRST_NAMES = ("Kyle", "Maria", "Wei", "Amina", "Jorge", "Sofia", "Daniel", "Priya")
+# words of the abstracts that the cleaner has to remove or fold
+STOP_WORDS = ("the", "of", "and", "to", "in", "a", "will", "this", "that", "with")
+BOILERPLATE = (
+    "This award reflects NSF's statutory mission and has been deemed worthy of "
+    "support through evaluation using the Foundation's intellectual merit and "
+    "broader impacts review criteria."
+)
+SYLLABLES = (
+    "ba", "co", "di", "fe", "ga", "hi", "jo", "ka", "li", "mo", "nu", "pe", "qui",
+    "ra", "si", "to", "ve", "xa", "yo", "ze", "tron", "gen", "bio", "geo", "phy",
+)  # fmt: skip
+
+
+# class that writes award files with the elements and variants of the real dataset:
+# one or several ProgramElement and Investigator (a dict or a list once parsed),
+# empty AbstractNarration, and abstracts drawn from a few topics of words
+class SyntheticAwardGenerator:
+    def __init__(
+        self,
+        seed: int = 0,
+        vocabulary_size: int = 5000,
+        n_topics: int = 12,
+        abstract_words: tuple = (80, 300),
+        missing_abstract_rate: float = 0.03,
+        multiple_program_elements_rate: float = 0.3,
+        multiple_investigators_rate: float = 0.4,
+    ):
+        self.seed = seed
+        self.abstract_words = abstract_words
+        self.missing_abstract_rate = missing_abstract_rate
+        self.multiple_program_elements_rate = multiple_program_elements_rate
+        self.multiple_investigators_rate = multiple_investigators_rate
+        rng = np.random.default_rng(seed)
+        self.vocabulary = _make_vocabulary(rng, vocabulary_size)
+        # every topic ranks the words in its own order with a Zipf distribution, the
+        # cumulative distributions are kept to draw the words with searchsorted
+        zipf = 1 / np.arange(1, vocabulary_size + 1)
+        self.topic_cumulative = np.empty((n_topics, vocabulary_size))
+        for topic in range(n_topics):
+            weights = np.empty(vocabulary_size)
+            weights[rng.permutation(vocabulary_size)] = zipf
+            self.topic_cumulative[topic] = np.cumsum(weights / weights.sum())
+
+    def award_xml(self, award_id: int) -> str:
+        """
+        Generate the XML of an award, the same award_id always gives the same file
+
+        Arguments:
+            award_id:
+                The id of the award.
+
+        Returns:
+            A string with the XML document.
+        """
+        rng = np.random.default_rng([self.seed, award_id])
+        organization = ORGANIZATIONS[rng.integers(len(ORGANIZATIONS))]
+        code, (directorate, directorate_name), (division, division_name) = organization
+        year = int(rng.integers(2000, 2023))
+        amount = int(rng.integers(10, 2000)) * 1000
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            "<rootTag>",
+            "<Award>",
+            f"<AwardTitle>Synthetic award {award_id}</AwardTitle>",
+            "<AGENCY>NSF</AGENCY>",
+            f"<AwardEffectiveDate>{_date(rng, year)}</AwardEffectiveDate>",
+            f"<AwardExpirationDate>{_date(rng, year + 3)}</AwardExpirationDate>",
+            f"<AwardTotalIntnAmount>{amount}.00</AwardTotalIntnAmount>",
+            f"<AwardAmount>{amount}</AwardAmount>",
+            "<AwardInstrument>",
+            f"<Value>{INSTRUMENTS[rng.integers(len(INSTRUMENTS))]}</Value>",
+            "</AwardInstrument>",
+            "<Organization>",
+            f"<Code>{code}</Code>",
+            "<Directorate>",
+            f"<Abbreviation>{directorate}</Abbreviation>",
+            f"<LongName>{escape(directorate_name)}</LongName>",
+            "</Directorate>",
+            "<Division>",
+            f"<Abbreviation>{division}</Abbreviation>",
+            f"<LongName>{escape(division_name)}</LongName>",
+            "</Division>",
+            "</Organization>",
+            "<ProgramOfficer>",
+            f"<SignBlockName>{FIRST_NAMES[rng.integers(len(FIRST_NAMES))]}"
+            "</SignBlockName>",
+            "</ProgramOfficer>",
+        ]
+        if rng.random() < self.missing_abstract_rate:
+            lines.append("<AbstractNarration/>")
+        else:
+            abstract = escape(self.abstract(rng))
+            lines.append(f"<AbstractNarration>{abstract}</AbstractNarration>")
+        lines += [
+            f"<MinAmdLetterDate>{_date(rng, year)}</MinAmdLetterDate>",
+            "<ARRAAmount/>",
+            f"<AwardID>{award_id}</AwardID>",
+        ]
+        n_investigators = 1 + (rng.random() < self.multiple_investigators_rate)
+        for _ in range(n_investigators):
+            first_name = FIRST_NAMES[rng.integers(len(FIRST_NAMES))]
+            lines += ["<Investigator>", f"<FirstName>{first_name}</FirstName>"]
+            lines.append("</Investigator>")
+        program_elements = [PROGRAM_ELEMENTS[directorate][rng.integers(2)]]
+        if rng.random() < self.multiple_program_elements_rate:
+            program_elements.append(CROSSCUTTING_PROGRAM_ELEMENT)
+        for element_code, text in program_elements:
+            lines += [
+                "<ProgramElement>",
+                f"<Code>{element_code}</Code>",
+                f"<Text>{escape(text)}</Text>",
+                "</ProgramElement>",
+            ]
+        lines += ["</Award>", "</rootTag>", ""]
+        return "\n".join(lines)
+
+    def abstract(self, rng: np.random.Generator) -> str:
+        """
+        Generate an abstract from one or two topics, with stop words, plurals, a
+        hyphenated word, a URL, the line breaks and the NSF boilerplate of the real
+        abstracts
+
+        Arguments:
+            rng:
+                The random generator of the award.
+
+        Returns:
+            A string with the abstract, without escaping.
+        """
+        n_words = int(rng.integers(*self.abstract_words))
+        topics = rng.choice(len(self.topic_cumulative), 2, replace=False)
+        share = rng.random()
+        from_first = rng.random(n_words) < share
+        draws = rng.random(n_words)
+        columns = np.where(
+            from_first,
+            np.searchsorted(self.topic_cumulative[topics[0]], draws),
+            np.searchsorted(self.topic_cumulative[topics[1]], draws),
+        )
+        columns = np.minimum(columns, len(self.vocabulary) - 1)
+        words = self.vocabulary[columns].tolist()
+        for position in np.flatnonzero(rng.random(n_words) < 0.3):
+            stop_word = STOP_WORDS[position % len(STOP_WORDS)]
+            words[position] = f"{stop_word} {words[position]}"
+        for position in np.flatnonzero(rng.random(n_words) < 0.1):
+            words[position] += "s"
+        words[0] = words[0].capitalize()
+        if n_words > 2:
+            words[1] = f"{words[1]}-{words[2]}"
+        middle = n_words // 2
+        return (
+            " ".join(words[:middle])
+            + f". More at https://www.nsf.gov/{words[middle]}.&lt;br/&gt;&lt;br/&gt;"
+            + " ".join(words[middle:])
+            + ".&lt;br/&gt;&lt;br/&gt;"
+            + BOILERPLATE
+        )
+
+    def write(self, path: str, n_awards: int, first_award_id: int = 2000000) -> list:
+        """
+        Write the files of n_awards awards in a folder, or in a zip archive when the
+        path ends with .zip
+
+        Arguments:
+            path:
+                The folder or the zip archive, it is created if needed.
+            n_awards:
+                The amount of award files.
+            first_award_id:
+                The id of the first award, the next ones are consecutive.
+
+        Returns:
+            A list with the names of the files.
+        """
+        award_ids = range(first_award_id, first_award_id + n_awards)
+        file_names = [f"{award_id}.xml" for award_id in award_ids]
+        if path.endswith(".zip"):
+            import zipfile
+
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+                for award_id, file_name in zip(award_ids, file_names):
+                    archive.writestr(file_name, self.award_xml(award_id))
+        else:
+            os.makedirs(path, exist_ok=True)
+            for award_id, file_name in zip(award_ids, file_names):
+                with open(os.path.join(path, file_name), "w", encoding="utf-8") as file:
+                    file.write(self.award_xml(award_id))
+        return file_names
+
+
+def _make_vocabulary(rng: np.random.Generator, size: int) -> np.ndarray:
+    # pronounceable made-up words, unique and without the stop words
+    words = set()
+    while len(words) < size:
+        n_syllables = rng.integers(2, 5, size)
+        for count in n_syllables:
+            syllables = rng.integers(len(SYLLABLES), size=count)
+            words.add("".join(SYLLABLES[idx] for idx in syllables))
+            if len(words) == size:
+                break
+    return np.array(sorted(words))
+
+
+def _date(rng: np.random.Generator, year: int) -> str:
+    return f"{rng.integers(1, 13):02d}/{rng.integers(1, 29):02d}/{year}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path", help="folder, or zip archive when it ends with .zip")
+    parser.add_argument("--awards", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--first-award-id", type=int, default=2000000)
+    args = parser.parse_args()
+    generator = SyntheticAwardGenerator(seed=args.seed)
+    generator.write(args.path, args.awards, args.first_award_id)
+
+
+if __name__ == "__main__":
+    main()
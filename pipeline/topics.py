@@ -0,0 +1,224 @@
+"""Module to describe the topics of a model with their most relevant words."""
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def topic_indicator_matrix(keys, n_topics: int = None) -> sparse.csr_matrix:
+    """
+    Build the sparse matrix that has a 1 in the topic of every document, so its product
+    with a document-term matrix sums the rows of each topic in a single operation
+
+    Arguments:
+        keys:
+            The topic of every document, e.g. the argmax of the document-topic matrix.
+        n_topics:
+            The amount of topics, by default the largest key plus one.
+
+    Returns:
+        A CSR matrix with shape (n_topics, documents).
+    """
+    keys = np.asarray(keys, dtype=np.int64)
+    if n_topics is None:
+        n_topics = int(keys.max()) + 1 if len(keys) else 0
+    return sparse.csr_matrix(
+        (np.ones(len(keys), dtype=np.int64), (keys, np.arange(len(keys)))),
+        shape=(n_topics, len(keys)),
+    )
+
+
+def topic_word_counts(
+    keys, document_term_matrix, n_topics: int = None
+) -> np.ndarray:
+    """
+    Sum the word counts of the documents of every topic
+
+    Arguments:
+        keys:
+            The topic of every document.
+        document_term_matrix:
+            The sparse matrix with the word counts of every document, e.g. the output
+            of CountVectorizer.
+        n_topics:
+            The amount of topics, by default the largest key plus one.
+
+    Returns:
+        An array with shape (n_topics, words) with the counts of every topic.
+    """
+    indicator = topic_indicator_matrix(keys, n_topics)
+    counts = indicator @ sparse.csr_matrix(document_term_matrix)
+    return counts.toarray()
+
+
+def top_word_indices(scores: np.ndarray, n: int) -> np.ndarray:
+    """
+    Get the columns with the n highest scores of every row, without sorting the whole
+    rows
+
+    Arguments:
+        scores:
+            An array with shape (topics, words).
+        n:
+            The amount of words of every topic.
+
+    Returns:
+        An array with shape (topics, n) with the indices of the words, from the
+        highest score to the lowest.
+    """
+    scores = np.asarray(scores)
+    n = min(n, scores.shape[1])
+    if n == 0:
+        return np.empty((scores.shape[0], 0), dtype=np.int64)
+    indices = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+    top_scores = np.take_along_axis(scores, indices, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind="stable")
+    return np.take_along_axis(indices, order, axis=1)
+
+
+def vocabulary_array(count_vectorizer) -> np.ndarray:
+    """
+    Get the words of a fitted vectorizer ordered by their column in the matrix
+
+    Arguments:
+        count_vectorizer:
+            The fitted CountVectorizer (or TfidfVectorizer).
+
+    Returns:
+        An array with the word of every column.
+    """
+    return np.asarray(count_vectorizer.get_feature_names_out())
+
+
+def top_words(
+    keys,
+    document_term_matrix,
+    vocabulary: np.ndarray,
+    n: int = 10,
+    n_topics: int = None,
+) -> np.ndarray:
+    """
+    Get the most frequent words of the documents assigned to every topic. The counts of
+    a topic without documents are 0, so its words are arbitrary.
+
+    Arguments:
+        keys:
+            The topic of every document.
+        document_term_matrix:
+            The sparse matrix with the word counts of every document.
+        vocabulary:
+            The word of every column of the matrix, see vocabulary_array.
+        n:
+            The amount of words of every topic.
+        n_topics:
+            The amount of topics, by default the largest key plus one.
+
+    Returns:
+        An array with shape (topics, n) with the words of every topic, from the most
+        frequent to the least.
+    """
+    counts = topic_word_counts(keys, document_term_matrix, n_topics)
+    return np.asarray(vocabulary)[top_word_indices(counts, n)]
+
+
+def top_words_from_components(
+    components: np.ndarray, vocabulary: np.ndarray, n: int = 10
+) -> np.ndarray:
+    """
+    Get the words with the highest weight in every topic of a model, e.g. the
+    components_ of LatentDirichletAllocation, without going through the documents
+
+    Arguments:
+        components:
+            An array with shape (topics, words) with the weight of every word.
+        vocabulary:
+            The word of every column of the components, see vocabulary_array.
+        n:
+            The amount of words of every topic.
+
+    Returns:
+        An array with shape (topics, n) with the words of every topic, from the
+        highest weight to the lowest.
+    """
+    return np.asarray(vocabulary)[top_word_indices(components, n)]
+
+
+def topic_exemplar_indices(doc_topic_matrix: np.ndarray, k: int = 5) -> np.ndarray:
+    """
+    Get the documents with the highest weight in every topic. Every topic is selected
+    with argpartition over its column, so the memory used does not grow with the
+    amount of topics.
+
+    Arguments:
+        doc_topic_matrix:
+            An array with shape (documents, topics), e.g. the output of
+            LatentDirichletAllocation.transform.
+        k:
+            The amount of documents of every topic.
+
+    Returns:
+        An array with shape (topics, k) with the indices of the documents, from the
+        highest weight to the lowest.
+    """
+    doc_topic_matrix = np.asarray(doc_topic_matrix)
+    n_documents, n_topics = doc_topic_matrix.shape
+    k = min(k, n_documents)
+    indices = np.empty((n_topics, k), dtype=np.int64)
+    for topic in range(n_topics):
+        weights = doc_topic_matrix[:, topic]
+        if k == 0:
+            continue
+        top = np.argpartition(-weights, k - 1)[:k]
+        indices[topic] = top[np.argsort(-weights[top], kind="stable")]
+    return indices
+
+
+def topic_exemplars(
+    doc_topic_matrix: np.ndarray, dataset, k: int = 5, abstracts: bool = True
+) -> pd.DataFrame:
+    """
+    Get the most representative documents of every topic with the metadata of their
+    awards, only the award records of those documents are read
+
+    Arguments:
+        doc_topic_matrix:
+            An array with shape (documents, topics), in the order of the dataset.
+        dataset:
+            The AbstractNarrationDataset or PackedCorpusDataset of the documents.
+        k:
+            The amount of documents of every topic.
+        abstracts:
+            If True, the abstract of every document is included, as returned by
+            indexing the dataset. It is taken from the award record already read.
+
+    Returns:
+        A DataFrame with one row per topic and rank, with the columns topic, rank,
+        index, weight, the metadata columns and abstract.
+    """
+    doc_topic_matrix = np.asarray(doc_topic_matrix)
+    indices = topic_exemplar_indices(doc_topic_matrix, k)
+    n_topics, k = indices.shape
+    topics = np.repeat(np.arange(n_topics), k)
+    flat_indices = indices.ravel()
+    # only the records of the exemplars are read, the metadata table of the whole
+    # dataset would read every file when the dataset has no cache
+    from pipeline.metadata import award_metadata_row, build_metadata_table
+
+    records = [dataset.get_award_record(int(idx)) for idx in flat_indices]
+    rows = [award_metadata_row(record) for record in records]
+    files = [dataset.files[idx] for idx in flat_indices]
+    exemplars = build_metadata_table(files, rows).reset_index()
+    exemplars.insert(0, "topic", topics)
+    exemplars.insert(1, "rank", np.tile(np.arange(k), n_topics))
+    exemplars.insert(2, "index", flat_indices)
+    exemplars.insert(3, "weight", doc_topic_matrix[flat_indices, topics])
+    if abstracts and hasattr(dataset, "clean"):
+        # the abstracts of the records already read, cleaned as the dataset does
+        texts = [record["AbstractNarration"] for record in records]
+        if dataset.clean:
+            texts = dataset.clean.clean_batch(texts)
+        exemplars["abstract"] = texts
+    elif abstracts:
+        # a packed corpus keeps its abstracts in memory
+        exemplars["abstract"] = [dataset[int(idx)] for idx in flat_indices]
+    return exemplars
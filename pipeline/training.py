@@ -0,0 +1,121 @@
+"""Module to train the topic model streaming mini-batches of abstracts."""
+
+import time
+from collections import Counter
+
+import numpy as np
+from sklearn.decomposition import LatentDirichletAllocation
+from sklearn.feature_extraction.text import CountVectorizer
+
+from pipeline import instrumentation
+from pipeline.artifact import TopicModelArtifact, corpus_manifest
+from pipeline.dataloader import CleanAbstract
+from pipeline.engines import LdaEngine
+from pipeline.parallel import chunked
+
+
+def scan_vocabulary(
+    abstracts, max_features: int = 800, min_df: int = 1, analyzer=None
+) -> dict:
+    """
+    Select the vocabulary in one pass over the abstracts, keeping only the counts of
+    every word instead of the document-term matrix. The words are selected like
+    CountVectorizer(max_features=...) does: the ones with the largest total count.
+
+    Arguments:
+        abstracts:
+            An iterable with the cleaned abstracts, e.g. the dataset.
+        max_features:
+            The amount of words of the vocabulary, None keeps all of them.
+        min_df:
+            The minimum amount of abstracts where a word must appear.
+        analyzer:
+            The function that splits an abstract in words, by default the one of
+            CountVectorizer().
+
+    Returns:
+        A dictionary with every word and its column, in alphabetical order.
+    """
+    analyzer = analyzer or CountVectorizer().build_analyzer()
+    term_frequency = Counter()
+    document_frequency = Counter()
+    for abstract in abstracts:
+        words = analyzer(abstract)
+        term_frequency.update(words)
+        document_frequency.update(set(words))
+    words = sorted(w for w, df in document_frequency.items() if df >= min_df)
+    if max_features is not None and len(words) > max_features:
+        frequencies = np.array([term_frequency[word] for word in words])
+        # the same selection of CountVectorizer over the words in alphabetical order
+        selected = np.sort((-frequencies).argsort()[:max_features])
+        words = [words[idx] for idx in selected]
+    return {word: idx for idx, word in enumerate(words)}
+
+
+def train_streaming_lda(
+    dataset,
+    n_topics: int = 9,
+    vocabulary: dict = None,
+    max_features: int = 800,
+    batch_size: int = 1024,
+    passes: int = 10,
+    random_state: int = 0,
+    clean: CleanAbstract = None,
+) -> TopicModelArtifact:
+    """
+    Train the LDA model with partial_fit over mini-batches of abstracts read from the
+    dataset, so the document-term matrix of the whole corpus is never built and the
+    memory does not grow with the size of the corpus. Every pass iterates the dataset
+    again, so a dataset with a clean cache or a packed column of cleaned abstracts
+    avoids cleaning them in every pass.
+
+    Arguments:
+        dataset:
+            An iterable with the cleaned abstracts that can be iterated several times
+            and has len, e.g. an AbstractNarrationDataset or a PackedCorpusDataset.
+        n_topics:
+            The amount of topics.
+        vocabulary:
+            The word of every column, e.g. the vocabulary_ of a previous vectorizer.
+            When it is None it is selected with scan_vocabulary in an extra pass.
+        max_features:
+            The amount of words when the vocabulary is scanned.
+        batch_size:
+            The amount of abstracts of every mini-batch.
+        passes:
+            The amount of passes over the dataset.
+        random_state:
+            The seed of the model.
+        clean:
+            The cleaner of the abstracts saved in the artifact, by default the clean
+            attribute of the dataset.
+
+    Returns:
+        A TopicModelArtifact with the vectorizer and the model.
+    """
+    start = time.perf_counter()
+    if vocabulary is None:
+        vocabulary = scan_vocabulary(dataset, max_features)
+    vectorizer = CountVectorizer(vocabulary=vocabulary)
+    model = LatentDirichletAllocation(
+        n_components=n_topics,
+        learning_method="online",
+        batch_size=batch_size,
+        total_samples=len(dataset),
+        random_state=random_state,
+    )
+    for _ in range(passes):
+        # every batch is a list, read from the dataset before the timer, so the
+        # parsing and the cleaning are not counted as vectorization
+        for abstracts in chunked(dataset, batch_size):
+            with instrumentation.timer("vectorize"):
+                document_term_matrix = vectorizer.transform(abstracts)
+            with instrumentation.timer("lda.partial_fit"):
+                model.partial_fit(document_term_matrix)
+    manifest = {
+        "corpus": corpus_manifest(dataset),
+        "training_seconds": round(time.perf_counter() - start, 3),
+        "streaming": {"batch_size": batch_size, "passes": passes},
+    }
+    clean = clean or getattr(dataset, "clean", None) or CleanAbstract()
+    return TopicModelArtifact(clean, vectorizer, LdaEngine(model), manifest)
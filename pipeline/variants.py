@@ -0,0 +1,119 @@
+"""Module to clean the abstracts in several variants and collect their statistics."""
+
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from pipeline.dataloader import CleanAbstract
+
+# variants of the abstracts: without cleaning, cleaned, and cleaned and lemmatized
+VARIANTS = ("raw", "clean", "lemmatized")
+
+
+# class that produces the cleaning variants of an abstract from a single tokenization
+class MultiVariantCleaner:
+    def __init__(self, variants: list = VARIANTS, clean: CleanAbstract = None):
+        unknown = set(variants) - set(VARIANTS)
+        if unknown:
+            raise ValueError(f"Unknown variants: {sorted(unknown)}")
+        self.variants = tuple(variants)
+        # the lemmatize attribute of the cleaner is overridden for every variant
+        self.clean = clean or CleanAbstract()
+
+    def clean_variants(self, abstract: str) -> dict:
+        """
+        Clean an abstract in every variant, tokenizing it only once
+
+        Arguments:
+            abstract:
+                The abstract to clean.
+
+        Returns:
+            A dictionary with the abstract of every variant.
+        """
+        result = {}
+        if "raw" in self.variants:
+            result["raw"] = abstract
+        if "clean" in self.variants or "lemmatized" in self.variants:
+            words = self.clean.tokenize(abstract)
+            if "clean" in self.variants:
+                result["clean"] = " ".join(self.clean.filter_words(words, False))
+            if "lemmatized" in self.variants:
+                result["lemmatized"] = " ".join(self.clean.filter_words(words, True))
+        return result
+
+
+# class that accumulates the lengths and word frequencies of every variant
+class VariantStatistics:
+    def __init__(self, variants: list = VARIANTS):
+        self.variants = tuple(variants)
+        self.lengths = {variant: [] for variant in self.variants}
+        self.frequencies = {variant: Counter() for variant in self.variants}
+
+    def update(self, abstracts: dict):
+        """
+        Add the variants of an abstract to the statistics
+
+        Arguments:
+            abstracts:
+                A dictionary with the abstract of every variant.
+        """
+        for variant in self.variants:
+            words = abstracts[variant].split()
+            self.lengths[variant].append(len(words))
+            self.frequencies[variant].update(words)
+
+    def length_array(self, variant: str) -> np.ndarray:
+        """
+        Get the amount of words of every abstract of a variant
+
+        Arguments:
+            variant:
+                The name of the variant.
+
+        Returns:
+            An array with the lengths in the order of the dataset.
+        """
+        return np.array(self.lengths[variant], dtype=np.int64)
+
+    def frequency_frame(self, variant: str) -> pd.DataFrame:
+        """
+        Get the frequency of the words of a variant
+
+        Arguments:
+            variant:
+                The name of the variant.
+
+        Returns:
+            A DataFrame with the columns word and frequency, sorted by frequency.
+        """
+        return pd.DataFrame(
+            self.frequencies[variant].most_common(), columns=["word", "frequency"]
+        )
+
+
+def collect_variant_statistics(
+    dataset, variants: list = VARIANTS, clean: CleanAbstract = None
+) -> VariantStatistics:
+    """
+    Clean every abstract of the dataset in all the variants and collect the lengths
+    and word frequencies of each variant, parsing and tokenizing every file once. The
+    dataset uses its process pool, prefetching and cache as when it is iterated.
+
+    Arguments:
+        dataset:
+            The AbstractNarrationDataset, its clean attribute is not used.
+        variants:
+            The variants to produce, a subset of VARIANTS.
+        clean:
+            The CleanAbstract used to tokenize and filter the words.
+
+    Returns:
+        A VariantStatistics with the statistics of every variant.
+    """
+    cleaner = MultiVariantCleaner(variants, clean)
+    statistics = VariantStatistics(variants)
+    for abstracts in dataset.map(cleaner.clean_variants):
+        statistics.update(abstracts)
+    return statistics
@@ -0,0 +1,15 @@
+"""Tests of the near-duplicate detection."""
+
+import numpy as np
+
+from pipeline.dedup import detection_probability, optimal_bands
+
+
+def test_optimal_bands_without_numpy_2(monkeypatch):
+    """The bands are chosen with the NumPy 1.26 of poetry.lock, without trapezoid."""
+    monkeypatch.delattr(np, "trapezoid", raising=False)
+    bands, rows = optimal_bands(0.8, 128)
+    assert 1 <= bands * rows <= 128
+    probability = detection_probability([0.5, 0.8, 0.9, 1.0], 0.8, 128)
+    assert np.all(np.diff(probability) > 0)
+    assert probability[-1] == 1.0